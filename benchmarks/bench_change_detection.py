@@ -0,0 +1,59 @@
+"""
+Benchmark: classifying fetched tasks as new, changed or unchanged by content
+hash, as the sync plan does, against each history store.
+
+The history holds every task of a synthetic library with its hash; 1% of the
+tasks are then edited and 1% are new. The pass hashes each task and looks it
+up once, so the time per task should stay flat as the library grows. Run from
+the repository root:
+
+    uv run python -m benchmarks.bench_change_detection [task counts, default 10000 50000 100000]
+"""
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from history_manager import CompactHistoryManager, HistoryManager, SQLiteHistoryManager, content_hash
+from things_database import ThingsDatabaseProvider
+from things_fixture import generate_library
+
+DEFAULT_SIZES = [10_000, 50_000, 100_000]
+STORES = [
+    ("json", lambda directory: HistoryManager(os.path.join(directory, "history.json"))),
+    ("sqlite", lambda directory: SQLiteHistoryManager(os.path.join(directory, "history.sqlite"), json_path=None)),
+    ("compact", lambda directory: CompactHistoryManager(os.path.join(directory, "history.idx"), json_path=None)),
+]
+
+
+def classify_all(history, tasks):
+    return Counter(history.classify(task['uuid'], content_hash(task)) for task in tasks)
+
+
+def main(sizes):
+    print(f"{'tasks':>8} {'store':<8} {'classify (s)':>13} {'µs/task':>8}  outcome")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "main.sqlite")
+            generate_library(path, size)
+            tasks = list(ThingsDatabaseProvider(path).get_all_tasks())
+            synced = tasks[len(tasks) // 100:]
+            edited = [dict(task, title=task['title'] + " (edited)") if i % 100 == 0 else task
+                      for i, task in enumerate(tasks)]
+            for name, open_store in STORES:
+                history = open_store(directory)
+                history.mark_many((task['uuid'] for task in synced),
+                                  {task['uuid']: content_hash(task) for task in synced})
+                history = open_store(directory)
+                start = time.perf_counter()
+                outcome = classify_all(history, edited)
+                elapsed = time.perf_counter() - start
+                print(f"{len(tasks):>8,} {name:<8} {elapsed:>13.2f} {elapsed / len(tasks) * 1e6:>8.1f}  "
+                      f"{', '.join(f'{count:,} {state}' for state, count in sorted(outcome.items()))}")
+                if hasattr(history, "close"):
+                    history.close()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
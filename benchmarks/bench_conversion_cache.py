@@ -0,0 +1,94 @@
+"""
+Benchmark: converting tasks with and without the conversion cache.
+
+For a synthetic library, times the clipboard path (Tana Paste for every task)
+and the API path (Input API JSON for every task, its content hash already
+known from the sync plan) three ways: no cache, a cold cache that is filled
+as it goes, and a warm cache reloaded from disk, as on the next run. The
+clipboard path still hashes every task to look it up, which bounds its gain.
+Run from the repository root:
+
+    uv run python -m benchmarks.bench_conversion_cache [task counts, default 10000 50000]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from conversion_cache import ConversionCache
+from history_manager import content_hash
+from models import task_to_node
+from payload_encoder import EncodedNode, encode_node
+from tana_formatter import node_to_paste, to_tana_paste
+from things_database import ThingsDatabaseProvider
+from things_fixture import generate_library
+from things_to_tana import convert_task_to_node, paste_fragment
+
+DEFAULT_SIZES = [10_000, 50_000]
+CACHE_BYTES = 256 * 1024 * 1024
+
+
+def paste_uncached(tasks, cache):
+    return to_tana_paste([node_to_paste(convert_task_to_node(task)) for task in tasks])
+
+
+def paste_cached(tasks, cache):
+    return to_tana_paste([paste_fragment(task, cache) for task in tasks])
+
+
+def api_node(task):
+    return task_to_node(task, supertags=(), tags=False, dates=False, status=False)
+
+
+def api_uncached(tasks, cache):
+    return [encode_node(api_node(task)) for task in tasks]
+
+
+def api_cached(tasks, cache):
+    encoded = []
+    for task in tasks:
+        key = cache.key(task['uuid'], task['content_hash'], "api")
+        cached = cache.get(key)
+        if cached is not None:
+            encoded.append(EncodedNode(cached[0].encode("utf-8"), cached[1]))
+        else:
+            node = encode_node(api_node(task))
+            cache.put(key, node.json.decode("utf-8"), node.node_count)
+            encoded.append(node)
+    return encoded
+
+
+def timed(function, tasks, cache):
+    start = time.perf_counter()
+    result = function(tasks, cache)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'tasks':>8} {'path':<6} {'run':<9} {'time (s)':>9} {'µs/task':>8}  hits")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "main.sqlite")
+            generate_library(path, size)
+            tasks = list(ThingsDatabaseProvider(path).get_all_tasks())
+            for task in tasks:
+                task['content_hash'] = content_hash(task)
+            for name, uncached, cached in [("paste", paste_uncached, paste_cached), ("api", api_uncached, api_cached)]:
+                cache_path = os.path.join(directory, f"{name}-cache.json")
+                baseline, elapsed = timed(uncached, tasks, None)
+                runs = [("no cache", elapsed, 0)]
+                cache = ConversionCache(cache_path, CACHE_BYTES)
+                cold, elapsed = timed(cached, tasks, cache)
+                runs.append(("cold", elapsed, cache.hits))
+                cache.save()
+                cache = ConversionCache(cache_path, CACHE_BYTES)
+                warm, elapsed = timed(cached, tasks, cache)
+                runs.append(("warm", elapsed, cache.hits))
+                assert baseline == cold == warm
+                for run, elapsed, hits in runs:
+                    print(f"{len(tasks):>8,} {name:<6} {run:<9} {elapsed:>9.2f} "
+                          f"{elapsed / len(tasks) * 1e6:>8.1f}  {hits:,}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
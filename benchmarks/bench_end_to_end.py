@@ -0,0 +1,221 @@
+"""
+Benchmark: every stage of a sync, end to end, with results as JSON.
+
+Generates a synthetic Things library per size (shaped with the
+LibraryProfile options below), then times each stage on its own:
+
+    fetch          read the active to-dos of Inbox, Today, Anytime and Someday in one query
+    convert_paste  task dicts to TanaNodes, clipboard settings
+    render_paste   TanaNodes to Tana Paste text
+    convert_api    task dicts to TanaNodes, API settings
+    serialize      API nodes to batched request bodies
+    hash           content hash of every task
+    history_commit record every task and its hash in a new history
+    history_lookup classify every task against that history, reopened
+    send           POST every body to a local fake Tana server (rate limit lifted)
+    sync           a first SyncService.sync_scopes() of the same scopes, against the fake server
+
+Each stage is timed --repeat times and the best run is kept. The table goes
+to stderr and the JSON document (environment, commit, profile, results) to
+stdout or --json FILE; --compare OLD.json prints the change per stage
+against an earlier run. Run from the repository root:
+
+    uv run python -m benchmarks.bench_end_to_end [task counts, default 1000 10000 100000] > results.json
+    uv run python -m benchmarks.bench_end_to_end 10000 --note-words 20 --projects 50 --compare results.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_tana_server import FakeTanaServer
+from history_manager import create_history_manager, content_hash
+from resilience import RetryPolicy, TokenBucket
+from sync_service import SyncService
+from tana_client import TanaClient
+from tana_formatter import to_tana_paste
+from things_database import ThingsDatabaseProvider
+from things_fixture import LibraryProfile, generate_library
+from things_to_tana import convert_task_to_node
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+SCOPES = ["inbox", "today", "anytime", "someday"]
+STAGES = [
+    "fetch", "convert_paste", "render_paste", "convert_api", "serialize",
+    "hash", "history_commit", "history_lookup", "send", "sync",
+]
+# --compare flags stages that got this much slower
+REGRESSION_RATIO = 1.2
+
+
+def _client(server) -> TanaClient:
+    return TanaClient(
+        "token",
+        endpoint=server.url,
+        rate_limiter=TokenBucket(rate=1e6, capacity=1e6),
+        retry_policy=RetryPolicy(0, base_delay=0.001, max_delay=0.001),
+    )
+
+
+def _service(db_path, client, history_backend) -> SyncService:
+    # SyncService keeps its state files in the working directory
+    with contextlib.redirect_stdout(io.StringIO()):
+        service = SyncService(full=True)
+    service.things_provider = ThingsDatabaseProvider(db_path)
+    service.tana_client = client
+    service.history_manager = create_history_manager(history_backend)
+    return service
+
+
+@contextlib.contextmanager
+def _in_new_directory():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            yield directory
+        finally:
+            os.chdir(cwd)
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run_stages(db_path, server, history_backend):
+    """Runs every stage once; returns {stage: seconds} and the number of tasks fetched."""
+    seconds = {}
+    provider = ThingsDatabaseProvider(db_path)
+    tasks, seconds["fetch"] = _timed(lambda: list(provider.get_tasks_in_scopes(dict.fromkeys(SCOPES))))
+    paste_nodes, seconds["convert_paste"] = _timed(lambda: [convert_task_to_node(task) for task in tasks])
+    _, seconds["render_paste"] = _timed(to_tana_paste, paste_nodes)
+
+    client = _client(server)
+    with _in_new_directory():
+        service = _service(db_path, client, history_backend)
+        api_nodes, seconds["convert_api"] = _timed(lambda: [service._convert_task_to_node(task) for task in tasks])
+        bodies, seconds["serialize"] = _timed(lambda: [body for _, body in client.batches(api_nodes) if body])
+        hashes, seconds["hash"] = _timed(lambda: {task['uuid']: content_hash(task) for task in tasks})
+        history = create_history_manager(history_backend)
+        _, seconds["history_commit"] = _timed(history.mark_many, list(hashes), hashes)
+        if hasattr(history, "close"):
+            history.close()
+        history = create_history_manager(history_backend)
+        _, seconds["history_lookup"] = _timed(lambda: [history.classify(uuid, h) for uuid, h in hashes.items()])
+        if hasattr(history, "close"):
+            history.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, seconds["send"] = _timed(lambda: [client.post(body) for body in bodies])
+
+    with _in_new_directory():
+        service = _service(db_path, client, history_backend)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, seconds["sync"] = _timed(service.sync_scopes, SCOPES)
+        if hasattr(service.history_manager, "close"):
+            service.history_manager.close()
+    return seconds, len(tasks)
+
+
+def _commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def run(sizes, profile, repeat, history_backend):
+    commit, dirty = _commit()
+    document = {
+        "benchmark": "end_to_end",
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "history_backend": history_backend,
+        "profile": profile.to_dict(),
+        "results": [],
+    }
+    print(f"{'tasks':>8} {'fetched':>8} {'stage':<15} {'best (s)':>9} {'µs/task':>8}", file=sys.stderr)
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory, FakeTanaServer() as server:
+            db_path = os.path.join(directory, "main.sqlite")
+            generate_library(db_path, size, profile=profile)
+            runs = []
+            for _ in range(repeat):
+                seconds, fetched = run_stages(db_path, server, history_backend)
+                runs.append(seconds)
+        for stage in STAGES:
+            best = min(seconds[stage] for seconds in runs)
+            per_task = best / max(fetched, 1) * 1e6
+            document["results"].append(
+                {"tasks": size, "fetched": fetched, "stage": stage, "seconds": round(best, 6),
+                 "us_per_task": round(per_task, 3)}
+            )
+            print(f"{size:>8,} {fetched:>8,} {stage:<15} {best:>9.3f} {per_task:>8.1f}", file=sys.stderr)
+    return document
+
+
+def compare(document, baseline):
+    """Prints each stage's time against the same stage and size in an earlier run."""
+    before = {(r["tasks"], r["stage"]): r["seconds"] for r in baseline["results"]}
+    print(f"\nAgainst {(baseline.get('commit') or 'unknown')[:12]} ({baseline.get('created')}):", file=sys.stderr)
+    for setting in ("profile", "history_backend", "repeat"):
+        if baseline.get(setting) != document[setting]:
+            print(f"Note: {setting} differs ({baseline.get(setting)} before)", file=sys.stderr)
+    print(f"{'tasks':>8} {'stage':<15} {'before (s)':>11} {'after (s)':>10} {'ratio':>6}", file=sys.stderr)
+    for result in document["results"]:
+        old = before.get((result["tasks"], result["stage"]))
+        if old is None:
+            continue
+        ratio = result["seconds"] / old if old else float("inf")
+        flag = "  slower" if ratio >= REGRESSION_RATIO else ""
+        print(f"{result['tasks']:>8,} {result['stage']:<15} {old:>11.3f} {result['seconds']:>10.3f} {ratio:>6.2f}{flag}",
+              file=sys.stderr)
+
+
+def parse_args(argv=None):
+    defaults = LibraryProfile()
+    parser = argparse.ArgumentParser(description="Time each sync stage on generated Things libraries.")
+    parser.add_argument("sizes", nargs="*", type=int, default=DEFAULT_SIZES, help="Task counts")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the best is kept (default: 3)")
+    parser.add_argument("--history", default="json", choices=["json", "sqlite", "compact"],
+                        help="History store to time (default: json)")
+    parser.add_argument("--json", metavar="FILE", help="Write the results here instead of stdout")
+    parser.add_argument("--compare", metavar="FILE", help="An earlier results file to compare with")
+    for field, value in defaults.to_dict().items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value,
+                            help=f"Library profile (default: {value})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profile = LibraryProfile(**{field: getattr(args, field) for field in LibraryProfile().to_dict()})
+    document = run(args.sizes, profile, args.repeat, args.history)
+    text = json.dumps(document, indent=2)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(document, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
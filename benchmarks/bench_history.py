@@ -0,0 +1,60 @@
+"""
+Benchmark: cost of recording synced tasks as the history grows.
+
+Compares one write per task (mark_as_synced outside a batch) with one write
+per batch (mark_many), for the JSON store and the SQLite store. Run from the
+repository root:
+
+    uv run python -m benchmarks.bench_history
+"""
+import os
+import tempfile
+import time
+import uuid
+
+from history_manager import HistoryManager, SQLiteHistoryManager
+
+HISTORY_SIZES = [1_000, 10_000, 50_000, 100_000]
+BATCH_SIZE = 50
+
+
+def _seeded_manager(directory: str, size: int) -> HistoryManager:
+    path = os.path.join(directory, f"history-{size}.json")
+    manager = HistoryManager(path)
+    manager.mark_many(str(uuid.uuid4()) for _ in range(size))
+    return HistoryManager(path)
+
+
+def _seeded_sqlite_manager(directory: str, size: int) -> SQLiteHistoryManager:
+    path = os.path.join(directory, f"history-{size}.sqlite")
+    manager = SQLiteHistoryManager(path, json_path=None)
+    manager.mark_many(str(uuid.uuid4()) for _ in range(size))
+    return manager
+
+
+def _per_task_us(mark) -> float:
+    new_ids = [str(uuid.uuid4()) for _ in range(BATCH_SIZE)]
+    start = time.perf_counter()
+    mark(new_ids)
+    return (time.perf_counter() - start) / BATCH_SIZE * 1e6
+
+
+def main():
+    print(f"{'history size':>12} {'json per-task (µs/task)':>24} {'json mark_many (µs/task)':>25}"
+          f" {'sqlite mark_many (µs/task)':>27}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in HISTORY_SIZES:
+            manager = _seeded_manager(directory, size)
+
+            def per_task(ids):
+                for task_id in ids:
+                    manager.mark_as_synced(task_id)
+
+            unbatched = _per_task_us(per_task)
+            batched = _per_task_us(manager.mark_many)
+            sqlite_batched = _per_task_us(_seeded_sqlite_manager(directory, size).mark_many)
+            print(f"{size:>12,} {unbatched:>24.1f} {batched:>25.1f} {sqlite_batched:>27.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: seeding the sync history from a large Tana JSON export.
+
+Writes a synthetic workspace export (task nodes matching a generated Things
+library, tagged with the sync supertag through a metanode and tag tuple,
+among many more unrelated nodes with children and other props),
+then streams it through history_import and records the matches in a JSON
+history. Throughput should stay flat and peak memory bounded by the Things
+library, not the export, as the export grows. For the smaller exports the
+same pass over json.load() of the whole file is shown for comparison. Run
+from the repository root:
+
+    uv run python -m benchmarks.bench_history_import [doc counts, default 250000 1000000 2000000]
+"""
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from history_import import export_doc_fingerprint, import_file, import_history, tag_ids, tagged_metanodes
+from history_manager import HistoryManager
+from things_database import ThingsDatabaseProvider
+from things_fixture import generate_library
+
+DEFAULT_SIZES = [250_000, 1_000_000, 2_000_000]
+LIBRARY_SIZE = 20_000
+# Largest export also loaded whole with json.load() for comparison
+JSON_LOAD_LIMIT = 250_000
+WORDS = "plan call review draft buy email fix book write read send check update".split()
+# The sync supertag's node ID
+TAG_ID = "TASKTAG"
+
+
+def write_export(path, doc_count, tasks, seed=0):
+    rng = random.Random(seed)
+    task_every = max(doc_count // len(tasks), 1)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"formatVersion":1,"editors":[["someone@example.com",0]],"docs":[')
+        for i in range(doc_count):
+            node_id = f"node{i:09d}"
+            props = {"created": 1_700_000_000_000 + i, "_ownerId": f"node{i // 10:09d}"}
+            docs = []
+            if i % task_every == 0 and i // task_every < len(tasks):
+                props["name"] = tasks[i // task_every]['title']
+                # The sync supertag, as Tana exports it: a metanode holding a [SYS_A13, tag] tuple
+                props["_metaNodeId"] = f"meta{i:09d}"
+                docs.append({"id": f"meta{i:09d}", "props": {"_docType": "metanode", "_ownerId": node_id},
+                             "children": [f"tuple{i:09d}"]})
+                docs.append({"id": f"tuple{i:09d}", "props": {"_docType": "tuple", "_ownerId": f"meta{i:09d}"},
+                             "children": ["SYS_A13", TAG_ID]})
+            else:
+                name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 8)))
+                if rng.random() < 0.1:
+                    day = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+                    name += f' <span data-inlineref-date="{{&quot;dateTimeString&quot;:&quot;{day}&quot;}}"></span>'
+                props["name"] = name
+            docs.append({"id": node_id, "props": props,
+                         "children": [f"node{i * 3 + k:09d}" for k in range(rng.randint(0, 3))]})
+            f.write(("," if i else "") + ",".join(json.dumps(doc, separators=(",", ":")) for doc in docs))
+        f.write('],"lastTxid":1}')
+
+
+def load_whole(path, tasks, history):
+    # Every doc in memory at once, then the same matching
+    with open(path, encoding="utf-8") as f:
+        docs = json.load(f)["docs"]
+    metanodes = tagged_metanodes(docs, tag_ids(docs, {TAG_ID}))
+    fingerprints = (export_doc_fingerprint(doc, metanodes) for doc in docs)
+    return import_history((fingerprint for fingerprint in fingerprints if fingerprint is not None), tasks, history)
+
+
+def measure(function):
+    gc.collect()
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as directory:
+        library = os.path.join(directory, "main.sqlite")
+        generate_library(library, LIBRARY_SIZE)
+        tasks = list(ThingsDatabaseProvider(library).get_all_tasks())
+        print(f"{len(tasks):,} Things tasks")
+        print(f"{'docs':>10} {'export MB':>10} {'reader':<10} {'time (s)':>9} {'MB/s':>6} {'peak MB':>8}  matched")
+        for size in sizes:
+            path = os.path.join(directory, f"export-{size}.json")
+            write_export(path, size, tasks)
+            megabytes = os.path.getsize(path) / 1e6
+            readers = [("streaming", lambda: import_file(path, tasks, HistoryManager(os.path.join(directory, "h.json")), {TAG_ID}))]
+            if size <= JSON_LOAD_LIMIT:
+                readers.append(("json.load", lambda: load_whole(path, tasks, HistoryManager(os.path.join(directory, "h.json")))))
+            for name, reader in readers:
+                result, elapsed, peak = measure(reader)
+                print(f"{size:>10,} {megabytes:>10.1f} {name:<10} {elapsed:>9.2f} {megabytes / elapsed:>6.1f} "
+                      f"{peak:>8.1f}  {result.matched:,}")
+                os.remove(os.path.join(directory, "h.json"))
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
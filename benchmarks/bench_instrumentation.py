@@ -0,0 +1,80 @@
+"""
+Benchmark: the cost of the instrumentation layer, off and on.
+
+First the cost of a single span, timer, count and timed iteration while
+recording is off (what every run pays) and on (--profile). Then every stage
+of bench_end_to_end on a generated library, with recording off and on (best
+of a few runs each). Off, the per-stage times should be indistinguishable
+from noise. Run from the repository root:
+
+    uv run python -m benchmarks.bench_instrumentation [task count, default 10000]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+import instrumentation
+from benchmarks.bench_end_to_end import STAGES, run_stages
+from fake_tana_server import FakeTanaServer
+from things_fixture import generate_library
+
+CALLS = 200_000
+RUNS = 3
+
+
+def _span():
+    with instrumentation.span("a", bytes=1):
+        pass
+
+
+def _timer():
+    with instrumentation.timer("a"):
+        pass
+
+
+def _count():
+    instrumentation.count("a")
+
+
+def _timed():
+    for _ in instrumentation.timed("a", range(100)):
+        pass
+
+
+def bench_calls():
+    print(f"{'call':<10} {'off (ns)':>9} {'on (ns)':>9}")
+    for name, function, per in [("span", _span, 1), ("timer", _timer, 1), ("count", _count, 1), ("timed", _timed, 100)]:
+        costs = []
+        for enabled in (False, True):
+            if enabled:
+                instrumentation.enable()
+            seconds = min(timeit.repeat(function, number=CALLS // per, repeat=RUNS))
+            instrumentation.disable()
+            costs.append(seconds / CALLS * 1e9)
+        print(f"{name:<10} {costs[0]:>9.0f} {costs[1]:>9.0f}")
+
+
+def bench_stages(size):
+    with tempfile.TemporaryDirectory() as directory, FakeTanaServer() as server:
+        db_path = os.path.join(directory, "main.sqlite")
+        generate_library(db_path, size)
+        best = {}
+        for enabled in (False, True):
+            runs = []
+            for _ in range(RUNS):
+                if enabled:
+                    instrumentation.enable()
+                runs.append(run_stages(db_path, server, "json")[0])
+                instrumentation.disable()
+            best[enabled] = {stage: min(run[stage] for run in runs) for stage in STAGES}
+    print(f"\n{size:,} tasks")
+    print(f"{'stage':<15} {'off (s)':>8} {'on (s)':>8} {'on/off':>7}")
+    for stage in STAGES:
+        off, on = best[False][stage], best[True][stage]
+        print(f"{stage:<15} {off:>8.3f} {on:>8.3f} {on / off if off else 0:>7.2f}")
+
+
+if __name__ == "__main__":
+    bench_calls()
+    bench_stages(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
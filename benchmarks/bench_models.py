@@ -0,0 +1,149 @@
+"""
+Benchmark: building and emitting node trees for a synthetic library, with the
+slotted TanaNode and the dataclass nodes it replaced.
+
+Converts every task of a generated library to a node tree (as clipboard sync
+does), then emits it as Tana Paste and as API payloads. The dataclass baseline
+is a copy of the old model: dict-backed instances and a list of supertags
+checked with `tag not in list`, rendered by recursive string joins. Then
+compares the peak memory of rendering the whole export to a string with
+streaming it to a file as the tasks are converted. Run from the repository root:
+
+    uv run python -m benchmarks.bench_models [task counts, default 100000]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from models import api_payload, task_to_node
+from tana_formatter import tana_tag, to_tana_paste, to_tana_paste_stream
+from things_database import ThingsDatabaseProvider
+from things_fixture import generate_library
+
+DEFAULT_SIZES = [100_000]
+
+
+@dataclass
+class DataclassNode:
+    name: str
+    children: List['DataclassNode'] = field(default_factory=list)
+    supertags: List[str] = field(default_factory=list)
+    checked: Optional[bool] = None
+
+    def add_supertag(self, tag: str):
+        if tag not in self.supertags:
+            self.supertags.append(tag)
+
+
+def dataclass_convert(task) -> DataclassNode:
+    node = DataclassNode(task['title'], checked=task['status'] != 'incomplete')
+    node.add_supertag("task")
+    for tag in task['tags']:
+        node.add_supertag(tag)
+    for line in task['notes'].split('\n'):
+        if line.strip():
+            node.children.append(DataclassNode(line))
+    for item in task['checklist']:
+        node.children.append(DataclassNode(item['title'], checked=item['status'] == 'completed'))
+    return node
+
+
+def dataclass_paste(node: DataclassNode, indent_level: int = 0) -> str:
+    parts = []
+    if node.checked is not None:
+        parts.append("[x]" if node.checked else "[ ]")
+    parts.append(node.name)
+    parts.extend(tana_tag(tag) for tag in node.supertags)
+    lines = ["  " * indent_level + "- " + " ".join(parts)]
+    lines.extend(dataclass_paste(child, indent_level + 1) for child in node.children)
+    return "\n".join(lines)
+
+
+def dataclass_payload(node: DataclassNode):
+    payload = {"name": node.name}
+    if node.supertags:
+        payload["supertags"] = [{"id": tag} for tag in node.supertags]
+    if node.children:
+        payload["children"] = [dataclass_payload(child) for child in node.children]
+    return payload
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def _build(convert, tasks):
+    # Timed without tracemalloc, which slows allocation-heavy code down unevenly
+    gc.collect()
+    nodes, elapsed = _timed(lambda: [convert(task) for task in tasks])
+    del nodes
+    gc.collect()
+    tracemalloc.start()
+    nodes = [convert(task) for task in tasks]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return nodes, elapsed, size / 1e6
+
+
+def _peak(function):
+    gc.collect()
+    tracemalloc.start()
+    _, elapsed = _timed(function)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def bench_streaming(tasks):
+    convert = lambda task: task_to_node(task, supertags=["task"])  # noqa: E731
+    print(f"\n{'paste export':<36} {'time (s)':>9} {'peak MB':>8}")
+    renders = [
+        ("string, recursive joins (before)", lambda: "\n".join(
+            ["%%tana%%"] + [dataclass_paste(node) for node in [dataclass_convert(task) for task in tasks]])),
+        ("string, to_tana_paste()", lambda: to_tana_paste([convert(task) for task in tasks])),
+        ("file, to_tana_paste_stream()", lambda: _stream_to_devnull(convert(task) for task in tasks)),
+    ]
+    for name, render in renders:
+        elapsed, peak = _peak(render)
+        print(f"{name:<36} {elapsed:>9.2f} {peak:>8.1f}")
+
+
+def _stream_to_devnull(nodes):
+    with open(os.devnull, "w") as f:
+        to_tana_paste_stream(nodes, f)
+
+
+def main(sizes):
+    print(f"{'tasks':>8} {'model':<10} {'build (s)':>10} {'tree MB':>8} {'paste (s)':>10} {'payload (s)':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"main-{size}.sqlite")
+            generate_library(path, size)
+            tasks = list(ThingsDatabaseProvider(path).get_all_tasks())
+            models = [
+                ("dataclass", dataclass_convert,
+                 lambda nodes: "\n".join(["%%tana%%"] + [dataclass_paste(node) for node in nodes]),
+                 lambda nodes: [dataclass_payload(node) for node in nodes]),
+                ("slots", lambda task: task_to_node(task, supertags=["task"]),
+                 to_tana_paste,
+                 lambda nodes: [api_payload(node) for node in nodes]),
+            ]
+            for name, convert, paste, payloads in models:
+                nodes, build, megabytes = _build(convert, tasks)
+                _, paste_time = _timed(paste, nodes)
+                _, payload_time = _timed(payloads, nodes)
+                print(f"{len(tasks):>8,} {name:<10} {build:>10.2f} {megabytes:>8.1f} "
+                      f"{paste_time:>10.2f} {payload_time:>12.2f}")
+                del nodes
+            bench_streaming(tasks)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,64 @@
+"""
+Benchmark: peak memory of rendering a large library as Tana Paste.
+
+Generates a synthetic Things library per size and renders Inbox, Today,
+Anytime and Someday the way clipboard mode used to (every fragment in a
+list, then one string for pyperclip) and the way --output does (fragments
+streamed into shard files of --shard-size bytes), under tracemalloc. The
+streamed peak should stay flat as the library grows. The conversion cache is
+off, so the numbers are the rendering's own. Run from the repository root:
+
+    uv run python -m benchmarks.bench_paste_output [task counts, default 10000 50000 100000]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_end_to_end import SCOPES
+from benchmarks.bench_sync_memory import _traced
+from config import CLIPBOARD_MAX_BYTES
+from conversion_cache import ConversionCache
+from paste_output import write_paste
+from tana_formatter import to_tana_paste
+from things_database import ThingsDatabaseProvider
+from things_fixture import generate_library
+from things_to_tana import paste_fragment
+
+DEFAULT_SIZES = [10_000, 50_000, 100_000]
+
+
+def _fragments(db_path):
+    cache = ConversionCache(max_bytes=0)
+    provider = ThingsDatabaseProvider(db_path)
+    return (paste_fragment(task, cache) for task in provider.get_tasks_in_scopes(dict.fromkeys(SCOPES)))
+
+
+def in_memory(db_path):
+    start = time.perf_counter()
+    text, peak = _traced(lambda: to_tana_paste(list(_fragments(db_path))))
+    return len(text.encode("utf-8")), peak, time.perf_counter() - start
+
+
+def sharded(db_path, directory):
+    start = time.perf_counter()
+    path = os.path.join(directory, "tana.txt")
+    writer, peak = _traced(lambda: write_paste(_fragments(db_path), path, CLIPBOARD_MAX_BYTES))
+    return len(writer.paths), peak, time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'tasks':>8} {'paste (MB)':>11} {'in memory peak (MB)':>20} {'(s)':>6} "
+          f"{'shards':>7} {'sharded peak (MB)':>18} {'(s)':>6}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            db_path = os.path.join(directory, "main.sqlite")
+            generate_library(db_path, size)
+            size_bytes, memory_peak, memory_seconds = in_memory(db_path)
+            shards, shard_peak, shard_seconds = sharded(db_path, directory)
+        print(f"{size:>8,} {size_bytes / 2**20:>11.1f} {memory_peak / 2**20:>20.1f} {memory_seconds:>6.2f} "
+              f"{shards:>7} {shard_peak / 2**20:>18.1f} {shard_seconds:>6.2f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
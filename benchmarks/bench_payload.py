@@ -0,0 +1,95 @@
+"""
+Benchmark: encoding API request bodies for a large sync, the old way (an
+api_payload() dict tree per task, serialized once to size it and again per
+batch) against payload_encoder (each tree walked once straight to bytes,
+batch bodies joined from them), and with orjson quoting its strings when
+it is installed.
+
+Nodes are converted from a synthetic library with the API settings. Run from
+the repository root:
+
+    uv run python -m benchmarks.bench_payload [task counts, default 100000]
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import payload_encoder
+from models import api_payload, task_to_node
+from payload_encoder import encode_node, encode_payload
+from tana_client import plan_batches
+from things_database import ThingsDatabaseProvider
+from things_fixture import generate_library
+
+DEFAULT_SIZES = [100_000]
+TARGET = "INBOX"
+
+
+def dict_tree_bodies(nodes):
+    # The previous TanaClient.batches(): dicts, a json.dumps() per tree to size it, another per batch
+    def count(payload):
+        return 1 + sum(count(child) for child in payload.get("children", ()))
+
+    payloads = [api_payload(node) for node in nodes]
+    sizes = [(count(payload), len(json.dumps(payload, separators=(",", ":")))) for payload in payloads]
+    bodies, start, node_count, size = [], 0, 0, 0
+    for i, (tree_nodes, tree_size) in enumerate(sizes):
+        if i > start and (node_count + tree_nodes > 100 or size + tree_size > 4900):
+            bodies.append(json.dumps({"targetNodeId": TARGET, "nodes": payloads[start:i]}, separators=(",", ":")))
+            start, node_count, size = i, 0, 0
+        node_count += tree_nodes
+        size += tree_size + 1
+    bodies.append(json.dumps({"targetNodeId": TARGET, "nodes": payloads[start:]}, separators=(",", ":")))
+    return bodies
+
+
+def encoder_bodies(nodes):
+    encoded = [encode_node(node) for node in nodes]
+    return [encode_payload(TARGET, encoded[batch.start:batch.end]) for batch in plan_batches(encoded, TARGET)]
+
+
+def _measure(function, nodes):
+    gc.collect()
+    start = time.perf_counter()
+    bodies = function(nodes)
+    elapsed = time.perf_counter() - start
+    del bodies
+    gc.collect()
+    tracemalloc.start()
+    function(nodes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main(sizes):
+    encoders = [
+        ("dict tree + json.dumps (before)", dict_tree_bodies, False),
+        ("payload_encoder, json walker", encoder_bodies, True),
+    ]
+    if payload_encoder.orjson is not None:
+        encoders.append(("payload_encoder, orjson", encoder_bodies, False))
+    else:
+        print("orjson is not installed; skipping it.")
+    print(f"{'nodes':>8} {'encoder':<34} {'time (s)':>9} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"main-{size}.sqlite")
+            generate_library(path, size)
+            nodes = [
+                task_to_node(task, supertags=["SUPERTAG-ID"], tags=False, dates=False, status=False)
+                for task in ThingsDatabaseProvider(path).get_all_tasks()
+            ]
+            for name, function, without_orjson in encoders:
+                with patch.object(payload_encoder, "orjson", None if without_orjson else payload_encoder.orjson):
+                    elapsed, peak = _measure(function, nodes)
+                print(f"{len(nodes):>8,} {name:<34} {elapsed:>9.2f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,53 @@
+"""
+Benchmark: CLI startup, measured with python -X importtime.
+
+Imports the entry points in fresh interpreters and reports the best and
+median cumulative import time of each, and the modules that cost the most
+on their own in the best run of the CLI. things_to_tana should stay well
+below sync_service, whose import pulls in requests; test_startup.py holds
+the budget. Run from the repository root:
+
+    uv run python -m benchmarks.bench_startup [runs, default 10]
+"""
+import statistics
+import subprocess
+import sys
+
+ENTRY_POINTS = [
+    ("things_to_tana", "import things_to_tana"),
+    ("sync_service", "import sync_service"),
+    ("main", "import main"),
+]
+TOP_MODULES = 8
+
+
+def import_times(code):
+    """Returns {module: (self µs, cumulative µs)} for one fresh interpreter."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:"):
+            own, cumulative, module = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main(runs):
+    print(f"{'entry point':<16} {'best (ms)':>10} {'median (ms)':>12}")
+    best_cli = None
+    for module, code in ENTRY_POINTS:
+        samples = [import_times(code) for _ in range(runs)]
+        totals = [times[module][1] / 1000 for times in samples]
+        print(f"{module:<16} {min(totals):>10.1f} {statistics.median(totals):>12.1f}")
+        if module == "things_to_tana":
+            best_cli = samples[totals.index(min(totals))]
+    print("\nHeaviest modules imported by things_to_tana (self time, best run):")
+    for module, (own, _) in sorted(best_cli.items(), key=lambda item: -item[1][0])[:TOP_MODULES]:
+        print(f"  {module:<40} {own / 1000:>6.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
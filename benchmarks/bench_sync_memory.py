@@ -0,0 +1,100 @@
+"""
+Benchmark: peak memory and time to first send of a large API sync.
+
+Generates a synthetic Things library per size and runs a first sync of
+Inbox, Today, Anytime and Someday (every task is new) against a local fake
+Tana server with the rate limit lifted, under tracemalloc. Reports the
+peak memory of the sync, how long it took until the first batch was
+posted, and the total time; for scale, also the memory of just holding the
+fetched tasks in a list, which any implementation that reads everything
+before sending needs on top of its nodes and payloads. Each size is synced
+with every scope going to the Inbox, and with TANA_ROUTES sending the scopes
+to three target nodes, whose senders run side by side. The streaming
+pipeline's peak should stay roughly flat as the library grows, whatever
+the number of targets. The history
+uses the compact backend (memory-mapped) and the conversion cache is off,
+so the numbers are the pipeline's own; with the cache on, add up to
+CONVERSION_CACHE_MAX_BYTES of cached text. Run from the repository root:
+
+    uv run python -m benchmarks.bench_sync_memory [task counts, default 10000 50000 100000]
+"""
+import collections
+import contextlib
+import gc
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from benchmarks.bench_end_to_end import SCOPES, _client, _in_new_directory, _service
+from conversion_cache import ConversionCache
+from fake_tana_server import FakeTanaServer
+from things_database import ThingsDatabaseProvider
+from things_fixture import generate_library
+
+DEFAULT_SIZES = [10_000, 50_000, 100_000]
+HISTORY_BACKEND = "compact"
+# TANA_ROUTES of each run: name -> routes
+ROUTINGS = {"1 target": "", "3 targets": "anytime=ANYTIME,someday=SOMEDAY"}
+
+
+def _traced(function):
+    """Runs function under tracemalloc; returns its result and the peak in bytes."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def fetch_peak(db_path):
+    provider = ThingsDatabaseProvider(db_path)
+    tasks, peak = _traced(lambda: list(provider.get_tasks_in_scopes(dict.fromkeys(SCOPES))))
+    return len(tasks), peak
+
+
+def sync_peak(db_path, server, routes):
+    client = _client(server)
+    post = client.post
+    first_post = []
+
+    def timed_post(body):
+        if not first_post:
+            first_post.append(time.perf_counter())
+        return post(body)
+
+    client.post = timed_post
+    with _in_new_directory(), patch("scopes.TANA_ROUTES", routes):
+        service = _service(db_path, client, HISTORY_BACKEND)
+        service.conversion_cache = ConversionCache(max_bytes=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            _, peak = _traced(lambda: service.sync_scopes(SCOPES))
+            total = time.perf_counter() - start
+        service.history_manager.close()
+    return peak, first_post[0] - start, total
+
+
+def main(sizes):
+    print(f"{'tasks':>8} {'fetched list (MB)':>18} {'routing':>10} {'sync peak (MB)':>15} "
+          f"{'first send (s)':>15} {'total (s)':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory, FakeTanaServer() as server:
+            # The fake server keeps every request it accepts; keep only the last so it isn't counted
+            server.requests = collections.deque(maxlen=1)
+            db_path = os.path.join(directory, "main.sqlite")
+            generate_library(db_path, size)
+            fetched, list_peak = fetch_peak(db_path)
+            for routing, routes in ROUTINGS.items():
+                peak, first_send, total = sync_peak(db_path, server, routes)
+                print(f"{fetched:>8,} {list_peak / 2**20:>18.1f} {routing:>10} {peak / 2**20:>15.1f} "
+                      f"{first_send:>15.3f} {total:>10.2f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,86 @@
+"""
+Benchmark: TanaClient throughput and retry behaviour against a local fake
+Tana endpoint that injects latency and errors.
+
+Compares a new connection per call (plain requests.post, as before) with the
+pooled keep-alive session, then sends a large sync through an endpoint that
+fails a share of calls, with and without retries. The production rate limit
+is lifted so the numbers show the transport; connection setup here is local
+TCP only, without the TLS handshake a real call pays. Run from the repository root:
+
+    uv run python -m benchmarks.bench_tana_client
+"""
+import contextlib
+import io
+import time
+
+import requests
+
+from fake_tana_server import FakeTanaServer
+from models import TanaNode
+from resilience import RetryPolicy, TokenBucket
+from payload_encoder import encode_node
+from tana_client import TanaClient, encode_payload
+
+CALLS = 200
+LATENCY = 0.005
+SYNC_TASKS = 2_000
+ERROR_RATES = [0.0, 0.1, 0.3]
+
+
+def _client(server, max_retries=5) -> TanaClient:
+    return TanaClient(
+        "token",
+        endpoint=server.url,
+        rate_limiter=TokenBucket(rate=1e6, capacity=1e6),
+        retry_policy=RetryPolicy(max_retries, base_delay=0.005, max_delay=0.05),
+    )
+
+
+def _nodes(count):
+    return [TanaNode(name=f"Task {i}", children=[TanaNode(name="note")]) for i in range(count)]
+
+
+def bench_connections():
+    body = encode_payload("INBOX", [encode_node(_nodes(1)[0])])
+    headers = {"Authorization": "Bearer token", "Content-Type": "application/json"}
+    print(f"{'transport':<28} {'calls/s':>8} {'connections':>12}")
+    with FakeTanaServer() as server:
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            requests.post(server.url, data=body, headers=headers).raise_for_status()
+        elapsed = time.perf_counter() - start
+        print(f"{'requests.post per call':<28} {CALLS / elapsed:>8.0f} {server.connections:>12}")
+
+    with FakeTanaServer() as server:
+        client = _client(server)
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            client.post(body)
+        elapsed = time.perf_counter() - start
+        print(f"{'pooled session':<28} {CALLS / elapsed:>8.0f} {server.connections:>12}")
+
+
+def bench_retries():
+    print(f"\n{'error rate':>10} {'retries':>8} {'delivered':>10} {'calls':>6} {'time (s)':>9}")
+    nodes = _nodes(SYNC_TASKS)
+    for error_rate in ERROR_RATES:
+        for max_retries in (0, 5):
+            with FakeTanaServer(latency=LATENCY, error_rate=error_rate) as server:
+                client = _client(server, max_retries)
+                start = time.perf_counter()
+                # The client reports every batch and retry; keep the table readable
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results = list(client.send_batches(nodes, "INBOX"))
+                elapsed = time.perf_counter() - start
+                delivered = sum(r.end - r.start for r in results if r.success) / len(nodes)
+                print(f"{error_rate:>10.0%} {max_retries:>8} {delivered:>10.1%} {server.calls:>6} {elapsed:>9.2f}")
+
+
+def main():
+    bench_connections()
+    bench_retries()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark: things.py vs. the native ThingsDatabaseProvider on synthetic libraries.
+
+Run from the repository root:
+
+    uv run python -m benchmarks.bench_things_provider [task counts, default 10000 100000]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import things
+
+from things_database import ThingsDatabaseProvider
+from things_fixture import generate_library
+
+DEFAULT_SIZES = [10_000, 100_000]
+SYNC_SCOPES = ["inbox", "today", "upcoming", "anytime", "someday"]
+
+
+def _measure(fetch):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = sum(1 for _ in fetch())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak / 1e6
+
+
+def main(sizes):
+    print(f"{'tasks':>8} {'reader':<32} {'rows':>7} {'time (s)':>9} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"main-{size}.sqlite")
+            generate_library(path, size)
+            provider = ThingsDatabaseProvider(path)
+            readers = [
+                ("things.todos()", lambda: things.todos(filepath=path)),
+                ("things.todos(include_items=True)", lambda: things.todos(filepath=path, include_items=True)),
+                ("ThingsDatabaseProvider", provider.get_all_tasks),
+                # Syncing several lists: a read per list vs. one read of their union
+                ("5 lists, a query each", lambda: [
+                    task for scope in SYNC_SCOPES for task in provider._iter_scope(scope)
+                ]),
+                ("5 lists, one query", lambda: provider.get_tasks_in_scopes(dict.fromkeys(SYNC_SCOPES))),
+            ]
+            for name, fetch in readers:
+                count, elapsed, peak = _measure(fetch)
+                print(f"{size:>8,} {name:<32} {count:>7,} {elapsed:>9.2f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
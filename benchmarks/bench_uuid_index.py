@@ -0,0 +1,104 @@
+"""
+Benchmark: history.json loaded into a set vs. the compact mmap'd UUIDIndex.
+
+Each store is opened in a fresh subprocess so startup time and RSS are
+measured in isolation. Run from the repository root:
+
+    uv run python -m benchmarks.bench_uuid_index [history size, default 1000000]
+"""
+import json
+import os
+import random
+import resource
+import string
+import subprocess
+import sys
+import tempfile
+import time
+
+from history_manager import CompactHistoryManager, HistoryManager
+
+LOOKUPS = 100_000
+ALPHABET = string.ascii_letters + string.digits
+
+
+def _things_id(rng: random.Random) -> str:
+    # Things IDs are 22-character base62 strings
+    return "".join(rng.choices(ALPHABET, k=22))
+
+
+def _rss_mb() -> float:
+    # Linux keeps ru_maxrss across fork+exec, so prefer the current RSS there
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS
+        return peak / (1024 * 1024)
+
+
+def _child(backend: str, path: str, probe_path: str):
+    baseline_rss = _rss_mb()
+    start = time.perf_counter()
+    if backend == "set":
+        manager = HistoryManager(path)
+    else:
+        manager = CompactHistoryManager(path, json_path=None)
+    startup = time.perf_counter() - start
+
+    with open(probe_path) as f:
+        probes = json.load(f)
+    start = time.perf_counter()
+    hits = sum(1 for task_id in probes if manager.has_been_synced(task_id))
+    lookup = time.perf_counter() - start
+
+    print(json.dumps({
+        "startup_ms": startup * 1000,
+        "lookup_us": lookup / len(probes) * 1e6,
+        "hits": hits,
+        "rss_mb": _rss_mb() - baseline_rss,
+    }))
+
+
+def _run_child(backend: str, path: str, probe_path: str) -> dict:
+    output = subprocess.check_output(
+        [sys.executable, "-m", "benchmarks.bench_uuid_index", "--child", backend, path, probe_path]
+    )
+    return json.loads(output)
+
+
+def main(size: int):
+    rng = random.Random(42)
+    task_ids = [_things_id(rng) for _ in range(size)]
+    known = min(size, LOOKUPS // 2)
+    probes = rng.sample(task_ids, known) + [_things_id(rng) for _ in range(LOOKUPS // 2)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, "history.json")
+        index_path = os.path.join(directory, "history.idx")
+        probe_path = os.path.join(directory, "probes.json")
+        with open(json_path, "w") as f:
+            json.dump({"synced_ids": task_ids}, f)
+        with open(probe_path, "w") as f:
+            json.dump(probes, f)
+        index = CompactHistoryManager(index_path, json_path=None)
+        index.mark_many(task_ids)
+        index.close()
+        del task_ids
+
+        print(f"history size: {size:,}")
+        print(f"{'store':>8} {'file (MB)':>10} {'startup (ms)':>13} {'lookup (µs)':>12} {'RSS Δ (MB)':>11}")
+        for backend, path in (("set", json_path), ("compact", index_path)):
+            result = _run_child(backend, path, probe_path)
+            assert result["hits"] >= known
+            print(f"{backend:>8} {os.path.getsize(path) / 1e6:>10.1f} {result['startup_ms']:>13.1f}"
+                  f" {result['lookup_us']:>12.2f} {result['rss_mb']:>11.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _child(*sys.argv[2:5])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -10,16 +10,91 @@ TANA_API_TOKEN = os.getenv("TANA_API_TOKEN", "YOUR_API_TOKEN_HERE")
 # API Endpoint
 TANA_API_ENDPOINT = "https://europe-west1-tagr-prod.cloudfunctions.net/addToNodeV2"
 
+# Input API limits per call: nodes created (children included) and payload size
+TANA_MAX_NODES_PER_REQUEST = 100
+TANA_MAX_PAYLOAD_BYTES = 5000
+
+# Input API call rate per token (Tana allows one call per second)
+TANA_REQUESTS_PER_SECOND = float(os.getenv("TANA_REQUESTS_PER_SECOND", "1"))
+# Retries for rate-limited (429) and transient (5xx, connection) failures, with
+# jittered exponential backoff between TANA_RETRY_BASE_DELAY and TANA_RETRY_MAX_DELAY seconds
+TANA_MAX_RETRIES = int(os.getenv("TANA_MAX_RETRIES", "5"))
+TANA_RETRY_BASE_DELAY = 1.0
+TANA_RETRY_MAX_DELAY = 60.0
+# Consecutive failed calls after which the client stops calling the API for TANA_CIRCUIT_COOLDOWN seconds
+TANA_CIRCUIT_THRESHOLD = 5
+TANA_CIRCUIT_COOLDOWN = 60.0
+# Seconds to wait for the API to respond
+TANA_REQUEST_TIMEOUT = 30.0
+
 # Node IDs
 # 'INBOX' is a special ID for the Tana Inbox.
 TANA_INBOX_NODE_ID = "INBOX"
+# Special IDs for creating supertags: the workspace schema node, and the supertag of supertag definitions
+TANA_SCHEMA_NODE_ID = "SCHEMA"
+TANA_SUPERTAG_DEFINITION_ID = "SYS_T01"
 
 # You can specify a specific node ID for "Today" items, or use 'INBOX' if you process them later.
 # If you leave it as None, it might default to Inbox or you can set a specific node ID.
-TANA_TODAY_NODE_ID = os.getenv("TANA_TODAY_NODE_ID", "INBOX") 
+TANA_TODAY_NODE_ID = os.getenv("TANA_TODAY_NODE_ID", "INBOX")
+
+# Where other scopes go, as comma-separated scope=node-id pairs, e.g.
+# "upcoming=abc123,tag:errand=def456". Scopes not listed go to the Inbox (Today to TANA_TODAY_NODE_ID).
+TANA_ROUTES = os.getenv("TANA_ROUTES", "")
 
 # Supertag to apply to synced tasks
 # SUPERTAG_NAME: Used for clipboard mode (Tana Paste format), e.g., "task" or "task (Tanarian Brain)"
 # SUPERTAG_ID: Used for API mode (required for API sync). Get this by running "Show API schema" on your supertag in Tana
 SUPERTAG_NAME = os.getenv("SUPERTAG_NAME", "task")
 SUPERTAG_ID = os.getenv("SUPERTAG_ID", None)  # Required for API sync
+
+# Things tags in API sync: tags with a node ID in tag_ids.json (see --import-tags) become
+# supertags, others stay in the task name as text. With TANA_CREATE_TAGS=true, a tag with
+# no node ID yet is created as a supertag in Tana and its ID saved to tag_ids.json.
+TANA_CREATE_TAGS = os.getenv("TANA_CREATE_TAGS", "false").lower() == "true"
+
+# Sync history backend
+# "json": history.json loaded into memory (default)
+# "sqlite": history.sqlite, safe for overlapping runs (e.g. cron + manual); migrates history.json on first use
+# "compact": history.idx, 24 bytes per task (key and content hash) and constant-time startup for very large histories
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "json")
+
+# What API sync does with a task edited in Things after it was synced (detected by content hash)
+# "log": list it and don't send it again (default)
+# "resend": send it again, with CHANGED_TASK_MARKER appended to its name
+CHANGED_TASKS = os.getenv("CHANGED_TASKS", "log")
+CHANGED_TASK_MARKER = os.getenv("CHANGED_TASK_MARKER", "(updated)")
+
+# Converted tasks kept between runs in conversion_cache.json, keyed by task UUID and content
+# hash, so unchanged tasks reuse their Tana Paste / API JSON instead of being converted again.
+# Least recently used entries are evicted past this many bytes of cached text. Off (0) by default:
+# API syncs send only new and changed tasks, which always miss, and filling the cache makes a
+# clipboard run about twice as slow for a warm run saving ~20% (bench_conversion_cache).
+CONVERSION_CACHE_MAX_BYTES = int(os.getenv("CONVERSION_CACHE_MAX_BYTES", "0"))
+
+# Clipboard mode copies Tana Paste of up to this many bytes (UTF-8). Larger output goes to
+# PASTE_FILE instead, in shards of this size (--shard-size overrides it) so each pastes on its
+# own; --output FILE|- writes to a file or stdout whatever the size.
+CLIPBOARD_MAX_BYTES = int(os.getenv("CLIPBOARD_MAX_BYTES", str(1024 * 1024)))
+PASTE_FILE = os.getenv("PASTE_FILE", "tana_paste.txt")
+
+# Things data source
+# "things": the things.py library (default)
+# "sqlite": read main.sqlite directly with set-based queries (faster for large libraries)
+# The database location can be overridden with THINGSDB, as with things.py.
+THINGS_PROVIDER = os.getenv("THINGS_PROVIDER", "things")
+
+# Prometheus metrics for API sync: with METRICS_FILE set (e.g. a *.prom file in node_exporter's
+# textfile directory), every sync rewrites it atomically with run counts, durations, task counts,
+# API status codes and latencies. `watch --metrics-port PORT` also serves them at /metrics on METRICS_HOST.
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# API sync streams tasks from Things to Tana: each target node's sender takes tasks through a
+# queue of this many, so reading and sending overlap and memory stays flat on large libraries
+# (also how many tasks wait for their missing tags to be created, with TANA_CREATE_TAGS).
+SYNC_QUEUE_SIZE = 1000
+
+# Watch mode: quiet period that ends a burst of writes to the Things database
+# (Things commits a change as several writes); --debounce overrides it.
+WATCH_DEBOUNCE = 0.3
@@ -0,0 +1,43 @@
+"""Fixtures shared by the test modules."""
+import pytest
+from unittest.mock import patch
+from resilience import CircuitBreaker, RetryPolicy, TokenBucket
+from sync_service import SyncService
+from tana_client import TanaClient
+from things_database import ThingsDatabaseProvider
+from things_fixture import ThingsFixture
+
+
+@pytest.fixture
+def things_db(tmp_path, monkeypatch):
+    """
+    An empty fixture Things database; the working directory holds history/state
+    files. Test modules that need tasks in it override this fixture, building on it.
+    """
+    monkeypatch.chdir(tmp_path)
+    db = ThingsFixture(str(tmp_path / "main.sqlite"))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def fast_client():
+    """Builds clients for a stand-in server without the production call rate and delays."""
+    def build(server, **kwargs) -> TanaClient:
+        kwargs.setdefault("rate_limiter", TokenBucket(rate=1000, capacity=1000))
+        kwargs.setdefault("retry_policy", RetryPolicy(max_retries=3, base_delay=0.001, max_delay=0.01))
+        return TanaClient(kwargs.pop("token", "token"), endpoint=server.url, **kwargs)
+    return build
+
+
+@pytest.fixture
+def make_service(fast_client):
+    """Builds SyncServices on a fixture database that sync to a stand-in server (a fast_client with kwargs)."""
+    def build(db_path, server, max_retries=0, **kwargs) -> SyncService:
+        kwargs.setdefault("circuit_breaker", CircuitBreaker(threshold=100, cooldown=0))
+        client = fast_client(server, retry_policy=RetryPolicy(max_retries=max_retries, base_delay=0.001, max_delay=0.001),
+                             **kwargs)
+        with patch('sync_service.create_things_provider', return_value=ThingsDatabaseProvider(db_path)), \
+             patch('sync_service.TanaClient', return_value=client):
+            return SyncService()
+    return build
@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import instrumentation
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config import CONVERSION_CACHE_MAX_BYTES
+from storage import atomic_write_json
+
+CONVERSION_CACHE_FILE = "conversion_cache.json"
+
+
+class ConversionCache:
+    """
+    Bounded LRU cache of converted tasks, kept in conversion_cache.json
+    between runs.
+
+    Entries are a task's rendered Tana Paste or encoded API JSON (with its
+    node count), under a key made of the task UUID, its content hash and
+    whatever else the output depends on (see key()), so an unchanged task
+    reuses its serialized form instead of being converted again. Past
+    max_bytes of cached text the least recently used entries are evicted;
+    0 turns the cache off. Counts hits, misses and evictions. Thread-safe.
+    """
+
+    def __init__(self, file_path: str = CONVERSION_CACHE_FILE, max_bytes: int = CONVERSION_CACHE_MAX_BYTES):
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries: 'OrderedDict[str, Tuple[str, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if self.enabled:
+            self._load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        return "\x1f".join(parts)
+
+    def _load(self):
+        if not os.path.exists(self.file_path):
+            return
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f).get("entries", [])
+        except (ValueError, IOError):
+            return
+        # Stored least recently used first
+        for key, text, node_count in entries:
+            self._store(key, text, node_count)
+        self._evict()
+
+    def get(self, key: str) -> Optional[Tuple[str, int]]:
+        """
+        Returns the cached (text, node count) for a key, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                instrumentation.count("conversion_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            instrumentation.count("conversion_cache.hits")
+            return entry
+
+    def put(self, key: str, text: str, node_count: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._store(key, text, node_count)
+            self._evict()
+            self._dirty = True
+
+    def _store(self, key: str, text: str, node_count: int):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(key) + len(previous[0])
+        self._entries[key] = (text, node_count)
+        self.size += len(key) + len(text)
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            key, (text, _) = self._entries.popitem(last=False)
+            self.size -= len(key) + len(text)
+            self.evictions += 1
+            instrumentation.count("conversion_cache.evictions")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+    def save(self):
+        """
+        Writes the cache out if it changed, least recently used first.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = [[key, text, node_count] for key, (text, node_count) in self._entries.items()]
+            self._dirty = False
+        try:
+            atomic_write_json(self.file_path, {"entries": entries})
+        except IOError as e:
+            print(f"Warning: Could not save conversion cache: {e}")
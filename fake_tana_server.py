@@ -0,0 +1,145 @@
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Set
+from config import TANA_MAX_NODES_PER_REQUEST, TANA_MAX_PAYLOAD_BYTES
+
+
+def _count_nodes(nodes: List[Dict[str, Any]]) -> int:
+    return sum(1 + _count_nodes(node.get("children", [])) for node in nodes)
+
+
+class FakeTanaServer:
+    """
+    Local stand-in for the Tana Input API, for tests and benchmarks.
+
+    Enforces the bearer token and the per-call node and payload-size limits
+    (400 when exceeded) and records every accepted request. Faults can be
+    injected: `statuses` maps 1-based call numbers to an error status
+    (`fail_calls` is shorthand for 500s), `error_rate` fails that fraction of
+    calls with `error_status`, 429/503 responses carry `retry_after`, and
+    every call takes at least `latency` seconds. Connections are kept alive.
+
+    Example:
+        with FakeTanaServer() as server:
+            client = TanaClient("token", endpoint=server.url)
+    """
+
+    def __init__(
+        self,
+        token: str = "token",
+        max_nodes: int = TANA_MAX_NODES_PER_REQUEST,
+        max_payload_bytes: int = TANA_MAX_PAYLOAD_BYTES,
+        fail_calls: Optional[Set[int]] = None,
+        statuses: Optional[Dict[int, int]] = None,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        retry_after: Optional[str] = None,
+        latency: float = 0.0,
+        seed: int = 0,
+    ):
+        self.token = token
+        self.max_nodes = max_nodes
+        self.max_payload_bytes = max_payload_bytes
+        self.statuses = {call: 500 for call in fail_calls or ()}
+        self.statuses.update(statuses or {})
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.latency = latency
+        self._rng = random.Random(seed)
+        self.calls = 0
+        self.connections = 0
+        self.requests: List[Dict[str, Any]] = []
+        self.rejected: List[str] = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/addToNodeV2"
+
+    def received_names(self) -> List[str]:
+        return [node["name"] for request in self.requests for node in request["nodes"]]
+
+    def _handle(self, headers, body: bytes):
+        """
+        Returns (status, response body) for one call.
+        """
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            status = self.statuses.get(call)
+            if status is None and self.error_rate and self._rng.random() < self.error_rate:
+                status = self.error_status
+        if self.latency:
+            time.sleep(self.latency)
+        if headers.get("Authorization") != f"Bearer {self.token}":
+            return 401, {"error": "Unauthorized"}
+        if status is not None:
+            return status, {"error": "Injected failure"}
+        if len(body) > self.max_payload_bytes:
+            self.rejected.append(f"payload of {len(body)} bytes")
+            return 400, {"error": f"Payload too large (max {self.max_payload_bytes})"}
+        payload = json.loads(body)
+        node_count = _count_nodes(payload["nodes"])
+        if node_count > self.max_nodes:
+            self.rejected.append(f"{node_count} nodes")
+            return 400, {"error": f"Too many nodes (max {self.max_nodes})"}
+        with self._lock:
+            self.requests.append(payload)
+            first = sum(len(request["nodes"]) for request in self.requests) - len(payload["nodes"])
+        # Like the real API: the created top-level nodes, with the IDs Tana gave them
+        return 200, {"children": [
+            {"nodeId": f"node-{first + i + 1}", "name": node["name"], "type": "node"}
+            for i, node in enumerate(payload["nodes"])
+        ]}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; don't let Nagle hold the body back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with server._lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, response = server._handle(self.headers, body)
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                if status in (429, 503) and server.retry_after is not None:
+                    self.send_header("Retry-After", server.retry_after)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'FakeTanaServer':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> 'FakeTanaServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,360 @@
+import html
+import json
+import re
+from collections import Counter
+from typing import AbstractSet, Any, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Set, TextIO, Tuple
+from config import SUPERTAG_ID, SUPERTAG_NAME
+from history_manager import content_hash
+
+# Characters read from an export at a time
+CHUNK_SIZE = 1 << 20
+
+# A Things link in a node, e.g. things:///show?id=2YAbtETAdJLxHVbfrvUEsT
+THINGS_LINK = re.compile(r"things:///show\?id=([A-Za-z0-9-]+)")
+PASTE_DATE = re.compile(r"\s*\[\[date:(\d{4}-\d{2}-\d{2})[^\]]*\]\]")
+EXPORT_DATE = re.compile(r'"dateTimeString"\s*:\s*"(\d{4}-\d{2}-\d{2})')
+HTML_TAG = re.compile(r"<[^>]*>")
+# Tags at the end of a node's text: #tag or #[[tag name]]
+TRAILING_TAGS = re.compile(r"(\s+#(\[\[[^\]]*\]\]|\S+))+$")
+TAG = re.compile(r"#(?:\[\[([^\]]*)\]\]|(\S+))")
+# Attribute of a metanode tuple whose value is one of the node's supertags
+TAG_ATTRIBUTE = "SYS_A13"
+CHECKBOX = re.compile(r"^\[[ xX]\]\s+")
+
+
+class Fingerprint(NamedTuple):
+    title: str
+    date: Optional[str]
+    # UUID from a Things link in the node, if it has one
+    uuid: Optional[str] = None
+    # Whether the node carries the supertag sync applies (see sync_tags())
+    tagged: bool = False
+
+
+class ImportResult(NamedTuple):
+    nodes: int
+    matched: int
+    ambiguous: int
+
+
+def _normalize(title: str) -> str:
+    return " ".join(title.split())
+
+
+def sync_tags() -> FrozenSet[str]:
+    """
+    The supertag sync puts on tasks, as it appears in an import: its node
+    ID (SUPERTAG_ID, API sync) and its name (SUPERTAG_NAME, clipboard sync).
+    """
+    return frozenset(tag for tag in (SUPERTAG_ID, SUPERTAG_NAME) if tag)
+
+
+def paste_fingerprint(text: str, tags: AbstractSet[str] = frozenset()) -> Fingerprint:
+    """
+    Fingerprints the text of a node as clipboard or API sync wrote it:
+    checkbox, title, due date, then tags, e.g. '[ ] Buy milk [[date:2025-11-30]] #task'.
+    The node is tagged if one of its trailing tags is in `tags`.
+    """
+    # The patterns only run on text that can contain what they look for; most nodes have none of it
+    link = THINGS_LINK.search(text) if "things:" in text else None
+    date = PASTE_DATE.search(text) if "[[date:" in text else None
+    title = PASTE_DATE.sub("", text).strip() if date else text.strip()
+    if title.startswith("["):
+        title = CHECKBOX.sub("", title)
+    tagged = False
+    if "#" in title:
+        trailing = TRAILING_TAGS.search(title)
+        if trailing:
+            tagged = any((bracketed or plain) in tags for bracketed, plain in TAG.findall(trailing.group(0)))
+            title = title[:trailing.start()]
+    return Fingerprint(_normalize(title), date.group(1) if date else None, link.group(1) if link else None, tagged)
+
+
+def export_fingerprint(name: str) -> Fingerprint:
+    """
+    Fingerprints the name of a node in a Tana JSON export, where dates are
+    inline references and text can carry HTML. Supertags aren't part of
+    the name; see export_doc_fingerprint().
+    """
+    if "&" in name:
+        name = html.unescape(name)
+    if "<" not in name:
+        return paste_fingerprint(name)
+    date = EXPORT_DATE.search(name)
+    fingerprint = paste_fingerprint(HTML_TAG.sub(" ", name))
+    return fingerprint._replace(date=date.group(1) if date else fingerprint.date)
+
+
+def iter_paste_nodes(fp: TextIO, tags: AbstractSet[str] = frozenset()) -> Iterator[Fingerprint]:
+    """
+    Fingerprints the top-level nodes of a Tana Paste file, line by line.
+    Children (notes, checklist items) only contribute Things links.
+    """
+    node: Optional[Fingerprint] = None
+    for line in fp:
+        if line.startswith("- "):
+            if node is not None:
+                yield node
+            node = paste_fingerprint(line[2:].rstrip("\n"), tags)
+        elif node is not None and node.uuid is None:
+            link = THINGS_LINK.search(line)
+            if link:
+                node = node._replace(uuid=link.group(1))
+    if node is not None:
+        yield node
+
+
+def tag_ids(docs: Iterable[Any], tags: AbstractSet[str]) -> Set[str]:
+    """
+    The node IDs of the supertags in `tags`, given by ID or by the name of
+    their tagDef in the export's docs.
+    """
+    ids = set(tags)
+    for doc in docs:
+        props = doc.get("props") if isinstance(doc, dict) else None
+        if props and props.get("_docType") == "tagDef" and props.get("name") in tags and doc.get("id"):
+            ids.add(doc["id"])
+    return ids
+
+
+def tagged_metanodes(docs: Iterable[Any], ids: AbstractSet[str]) -> Set[str]:
+    """
+    The metanodes (a node's props._metaNodeId) that give their node one of
+    the supertags `ids`: owners of a tuple [SYS_A13, tag ID] in the docs.
+    """
+    metanodes = set()
+    for doc in docs:
+        props = doc.get("props") if isinstance(doc, dict) else None
+        if not props or props.get("_docType") != "tuple" or not props.get("_ownerId"):
+            continue
+        children = doc.get("children") or []
+        if len(children) >= 2 and children[0] == TAG_ATTRIBUTE and any(child in ids for child in children[1:]):
+            metanodes.add(props["_ownerId"])
+    return metanodes
+
+
+def export_doc_fingerprint(doc: Any, metanodes: AbstractSet[str] = frozenset()) -> Optional[Fingerprint]:
+    """
+    Fingerprints a doc of a Tana JSON export; tagged if its metanode is in
+    `metanodes` (tagged_metanodes()). None for docs that aren't named nodes:
+    definitions and other system docs (those with a _docType) and trashed nodes.
+    """
+    props = doc.get("props") if isinstance(doc, dict) else None
+    if not props or not props.get("name") or props.get("_docType"):
+        return None
+    if str(props.get("_ownerId", "")).endswith("_TRASH"):
+        return None
+    fingerprint = export_fingerprint(props["name"])
+    if fingerprint.uuid is None and props.get("description"):
+        link = THINGS_LINK.search(props["description"])
+        if link:
+            fingerprint = fingerprint._replace(uuid=link.group(1))
+    if props.get("_metaNodeId") in metanodes:
+        fingerprint = fingerprint._replace(tagged=True)
+    return fingerprint
+
+
+def iter_export_nodes(fp: TextIO, chunk_size: int = CHUNK_SIZE,
+                      tags: AbstractSet[str] = frozenset()) -> Iterator[Fingerprint]:
+    """
+    Fingerprints the named nodes of a Tana JSON export, streaming its docs
+    one at a time. With tags, the export is read three times (fp must be
+    seekable): for the tags' IDs, for the metanodes that apply them, then
+    for the nodes, so memory only grows with the nodes carrying them.
+    """
+    metanodes: Set[str] = set()
+    if tags:
+        ids = tag_ids(iter_json_array(fp, "docs", chunk_size), tags)
+        fp.seek(0)
+        metanodes = tagged_metanodes(iter_json_array(fp, "docs", chunk_size), ids)
+        fp.seek(0)
+    for doc in iter_json_array(fp, "docs", chunk_size):
+        fingerprint = export_doc_fingerprint(doc, metanodes)
+        if fingerprint is not None:
+            yield fingerprint
+
+
+def iter_nodes(fp: TextIO, chunk_size: int = CHUNK_SIZE, tags: AbstractSet[str] = frozenset()) -> Iterator[Fingerprint]:
+    """
+    Fingerprints the nodes of a Tana JSON export or a Tana Paste file,
+    told apart by their first character; nodes are tagged if they carry one
+    of `tags` (supertag IDs or names). fp must be seekable.
+    """
+    start = fp.read(1)
+    while start.isspace():
+        start = fp.read(1)
+    fp.seek(0)
+    if start == "{":
+        return iter_export_nodes(fp, chunk_size, tags)
+    return iter_paste_nodes(fp, tags)
+
+
+class TaskMatcher:
+    """
+    Finds the Things task a node was created from: by the UUID of a Things
+    link in it, else by title and due date. A node without a date matches
+    by title only if it carries the sync supertag (API sync leaves dates
+    out), so an untagged note or page that happens to share a task's title
+    doesn't mark the task as synced. Nodes that fit several tasks are
+    ambiguous and left unmatched.
+    """
+
+    def __init__(self, tasks: Iterable[Dict[str, Any]]):
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self._by_title: Dict[str, List[str]] = {}
+        self._by_title_date: Dict[Tuple[str, str], List[str]] = {}
+        for task in tasks:
+            self.tasks[task['uuid']] = task
+            title = _normalize(task.get('title') or '')
+            self._by_title.setdefault(title, []).append(task['uuid'])
+            date = task.get('due_date') or task.get('deadline')
+            if date:
+                self._by_title_date.setdefault((title, date), []).append(task['uuid'])
+
+    def candidates(self, node: Fingerprint) -> List[str]:
+        if node.uuid is not None:
+            return [node.uuid] if node.uuid in self.tasks else []
+        if node.date is not None:
+            return self._by_title_date.get((node.title, node.date), [])
+        if node.tagged:
+            return self._by_title.get(node.title, [])
+        return []
+
+
+def import_history(nodes: Iterable[Fingerprint], tasks: Iterable[Dict[str, Any]], history) -> ImportResult:
+    """
+    Records the Things tasks that nodes already in Tana were created from as
+    synced, with their current content hashes, in one write of the history.
+    A task that several nodes match by title is ambiguous as well (one of
+    them may be an unrelated node), unless a node links to it.
+    """
+    matcher = TaskMatcher(tasks)
+    linked: Set[str] = set()
+    by_title: Counter = Counter()
+    count = ambiguous = 0
+    for node in nodes:
+        count += 1
+        candidates = matcher.candidates(node)
+        if len(candidates) == 1:
+            if node.uuid is not None:
+                linked.add(candidates[0])
+            else:
+                by_title[candidates[0]] += 1
+        elif candidates:
+            ambiguous += 1
+    matched: Dict[str, str] = {}
+    for uuid, nodes_matched in by_title.items():
+        if uuid in linked:
+            continue
+        if nodes_matched > 1:
+            ambiguous += nodes_matched
+        else:
+            matched[uuid] = content_hash(matcher.tasks[uuid])
+    for uuid in linked:
+        matched[uuid] = content_hash(matcher.tasks[uuid])
+    history.mark_many(matched, matched)
+    return ImportResult(count, len(matched), ambiguous)
+
+
+def import_file(path: str, tasks: Iterable[Dict[str, Any]], history,
+                tags: Optional[AbstractSet[str]] = None) -> ImportResult:
+    """
+    import_history() for a Tana JSON export or Tana Paste file; tags are the
+    sync supertag's ID and name, by default sync_tags().
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return import_history(iter_nodes(f, tags=sync_tags() if tags is None else tags), tasks, history)
+
+
+def iter_json_array(fp: TextIO, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Yields the items of the array under `key` in a top-level JSON object,
+    one at a time, reading fp in chunks. Memory stays at about one chunk
+    plus one item however large the file is; other keys are parsed and
+    dropped. Raises ValueError for malformed JSON.
+    """
+    stream = _JSONStream(fp, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        name = stream.value()
+        stream.expect(":")
+        if name == key and stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.expect("]")
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            stream.value()
+        if stream.expect(",}") == "}":
+            return
+
+
+class _JSONStream:
+    """
+    A text stream read as a sequence of JSON values and punctuation, with a
+    buffer that holds the unread part of the current chunk.
+    """
+
+    def __init__(self, fp: TextIO, chunk_size: int):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size: int) -> bool:
+        if self._eof:
+            return False
+        chunk = self._fp.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character ('' at the end).
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill(self._chunk_size):
+                return ""
+
+    def expect(self, characters: str) -> str:
+        found = self.peek()
+        if not found or found not in characters:
+            raise ValueError(f"Malformed JSON: expected one of {characters!r}, found {found or 'end of file'!r}")
+        self._pos += 1
+        return found
+
+    def value(self) -> Any:
+        self.peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                # Most likely cut off at the end of the buffer: read more (doubling, so a
+                # value much larger than a chunk is still decoded in linear time)
+                if not self._fill(size):
+                    raise ValueError(f"Malformed JSON: {e}") from e
+                size *= 2
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and not self._eof and self._fill(size):
+                continue
+            self._pos = end
+            return value
+
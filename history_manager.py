@@ -1,34 +1,351 @@
+import hashlib
 import json
 import os
-from typing import Set
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Mapping, Optional, Set, Tuple
+import instrumentation
+from config import HISTORY_BACKEND
+from storage import atomic_write_json
+from uuid_index import UUIDIndex
 
 HISTORY_FILE = "history.json"
+HISTORY_DB_FILE = "history.sqlite"
+HISTORY_INDEX_FILE = "history.idx"
 
-class HistoryManager:
+# Bytes of a task's content hash (hex-encoded in the JSON and SQLite stores)
+HASH_SIZE = 8
+
+# How a fetched task compares with the history (see classify())
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+# Synced before content hashes were recorded: treated as unchanged, its hash becomes the baseline
+UNHASHED = "unhashed"
+
+
+def content_hash(task: Dict[str, Any]) -> str:
+    """
+    Returns a stable hex digest of the task content that is synced: title,
+    notes, tags, checklist and due date. Tag order does not count.
+    """
+    checklist = task.get('checklist')
+    content = [
+        task.get('title') or '',
+        task.get('notes') or '',
+        sorted(task.get('tags') or ()),
+        # things.py only lists checklist items when asked to; otherwise 'checklist' is a flag
+        [[item.get('title', ''), item.get('status', '')] for item in checklist]
+        if isinstance(checklist, list) else bool(checklist),
+        task.get('due_date') or task.get('deadline'),
+    ]
+    encoded = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=HASH_SIZE).hexdigest()
+
+
+class _BatchedHistory:
+    """
+    Shared mark_many()/batch()/classify() behaviour for the history stores.
+    Subclasses record IDs and hashes in _record(), persist them in _commit()
+    and look a task up in _lookup().
+    """
+    _batch_depth = 0
+
+    def mark_as_synced(self, task_id: str, content_hash: Optional[str] = None):
+        self.mark_many([task_id], {task_id: content_hash} if content_hash else None)
+
+    def mark_many(self, task_ids: Iterable[str], hashes: Optional[Mapping[str, str]] = None):
+        """
+        Records several task IDs as synced with a single write of the store,
+        with the content hash from `hashes` for those it has (a task already
+        synced gets its hash replaced). Inside a batch() block the write is
+        deferred until the block exits.
+        """
+        hashes = hashes or {}
+        records = [(task_id, hashes.get(task_id)) for task_id in task_ids]
+        instrumentation.count("history.marked", len(records))
+        self._record(records)
+        if self._batch_depth == 0:
+            with instrumentation.span("history.commit", tasks=len(records)):
+                self._commit()
+
+    def classify(self, task_id: str, content_hash: str) -> str:
+        """
+        Compares a task's current content hash with the recorded one:
+        NEW, CHANGED, UNCHANGED, or UNHASHED (synced, but no hash recorded).
+        """
+        synced, stored = self._lookup(task_id)
+        if not synced:
+            return NEW
+        if stored is None:
+            return UNHASHED
+        return UNCHANGED if stored == content_hash else CHANGED
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups mark_as_synced()/mark_many() calls into one commit.
+
+        The store is written once, when the outermost block exits.
+        Marks are committed even if the block raises: each one records a send
+        that Tana has already acknowledged, so dropping it would cause duplicates.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                with instrumentation.span("history.commit"):
+                    self._commit()
+
+
+class HistoryManager(_BatchedHistory):
     def __init__(self, file_path: str = HISTORY_FILE):
         self.file_path = file_path
-        self.synced_ids: Set[str] = self._load_history()
+        self.synced_ids: Set[str] = set()
+        self.hashes: Dict[str, str] = {}
+        self._load_history()
+        self._dirty = False
 
-    def _load_history(self) -> Set[str]:
+    def _load_history(self):
         if not os.path.exists(self.file_path):
-            return set()
+            return
         try:
             with open(self.file_path, 'r') as f:
                 data = json.load(f)
-                return set(data.get("synced_ids", []))
         except (json.JSONDecodeError, IOError):
-            return set()
+            return
+        self.synced_ids = set(data.get("synced_ids", []))
+        self.hashes = data.get("hashes", {})
 
     def _save_history(self):
+        data: Dict[str, Any] = {"synced_ids": list(self.synced_ids)}
+        if self.hashes:
+            data["hashes"] = self.hashes
         try:
-            with open(self.file_path, 'w') as f:
-                json.dump({"synced_ids": list(self.synced_ids)}, f, indent=2)
+            atomic_write_json(self.file_path, data)
+            self._dirty = False
         except IOError as e:
             print(f"Warning: Could not save history: {e}")
 
+    def _record(self, items: Iterable[Tuple[str, Optional[str]]]):
+        for task_id, digest in items:
+            if task_id not in self.synced_ids:
+                self.synced_ids.add(task_id)
+                self._dirty = True
+            if digest is not None and self.hashes.get(task_id) != digest:
+                self.hashes[task_id] = digest
+                self._dirty = True
+
+    def _lookup(self, task_id: str) -> Tuple[bool, Optional[str]]:
+        return task_id in self.synced_ids, self.hashes.get(task_id)
+
+    def _commit(self):
+        if self._dirty:
+            self._save_history()
+
     def has_been_synced(self, task_id: str) -> bool:
         return task_id in self.synced_ids
 
-    def mark_as_synced(self, task_id: str):
-        self.synced_ids.add(task_id)
-        self._save_history()
+    def __len__(self) -> int:
+        return len(self.synced_ids)
+
+
+class SQLiteHistoryManager(_BatchedHistory):
+    """
+    History store backed by a SQLite database.
+
+    Each synced UUID is its own row, inserted with INSERT OR IGNORE, so
+    concurrent runs (e.g. cron and a manual sync) never overwrite each other's
+    history. Membership checks are primary-key lookups; nothing is loaded up front.
+    """
+
+    def __init__(self, db_path: str = HISTORY_DB_FILE, json_path: Optional[str] = HISTORY_FILE):
+        self.db_path = db_path
+        self._pending: Dict[str, Optional[str]] = {}
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS synced_tasks ("
+            " uuid TEXT PRIMARY KEY,"
+            " synced_at REAL NOT NULL,"
+            " content_hash TEXT"
+            ") WITHOUT ROWID"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(synced_tasks)")}
+        if "content_hash" not in columns:
+            # Histories from before content hashes were kept
+            self._conn.execute("ALTER TABLE synced_tasks ADD COLUMN content_hash TEXT")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID"
+        )
+        if json_path:
+            self._migrate_from_json(json_path)
+
+    def _migrate_from_json(self, json_path: str):
+        """
+        One-shot import of an existing history.json. The JSON file is renamed
+        to <name>.migrated afterwards so it is not picked up again.
+        """
+        if not os.path.exists(json_path):
+            return
+        history = HistoryManager(json_path)
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            migrated = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'migrated_from'"
+            ).fetchone()
+            if migrated is None:
+                self._insert((task_id, history.hashes.get(task_id)) for task_id in history.synced_ids)
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('migrated_from', ?)",
+                    (os.path.abspath(json_path),),
+                )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except OSError:
+            # Another process migrated it first
+            pass
+
+    def _insert(self, items: Iterable[Tuple[str, Optional[str]]]):
+        now = time.time()
+        # A task synced again keeps its first synced_at; a new hash replaces the old one
+        self._conn.executemany(
+            "INSERT INTO synced_tasks (uuid, synced_at, content_hash) VALUES (?, ?, ?)"
+            " ON CONFLICT (uuid) DO UPDATE SET content_hash = excluded.content_hash"
+            " WHERE excluded.content_hash IS NOT NULL",
+            ((task_id, now, digest) for task_id, digest in items),
+        )
+
+    def _commit(self):
+        if not self._pending:
+            return
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._insert(self._pending.items())
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._pending.clear()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not save history: {e}")
+
+    def has_been_synced(self, task_id: str) -> bool:
+        return task_id in self._pending or self._is_stored(task_id)
+
+    def _is_stored(self, task_id: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM synced_tasks WHERE uuid = ?", (task_id,)
+        ).fetchone()
+        return row is not None
+
+    def _lookup(self, task_id: str) -> Tuple[bool, Optional[str]]:
+        pending = self._pending.get(task_id)
+        if pending is not None:
+            return True, pending
+        row = self._conn.execute(
+            "SELECT content_hash FROM synced_tasks WHERE uuid = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return task_id in self._pending, None
+        return True, row[0]
+
+    def _record(self, items: Iterable[Tuple[str, Optional[str]]]):
+        for task_id, digest in items:
+            if digest is not None or task_id not in self._pending:
+                self._pending[task_id] = digest
+
+    def __len__(self) -> int:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM synced_tasks").fetchone()
+        unsaved = sum(1 for task_id in self._pending if not self._is_stored(task_id))
+        return count + unsaved
+
+    def close(self):
+        self._commit()
+        self._conn.close()
+
+
+class CompactHistoryManager(_BatchedHistory):
+    """
+    History store backed by a compact, mmap'd UUIDIndex.
+
+    Uses 24 bytes per synced task on disk (its key and content hash) and
+    opens in constant time, which keeps startup and memory flat for very
+    large histories. Like the JSON store it is single-writer; use the SQLite
+    store for overlapping runs.
+    """
+
+    def __init__(self, index_path: str = HISTORY_INDEX_FILE, json_path: Optional[str] = HISTORY_FILE):
+        self.index_path = index_path
+        self.index = UUIDIndex(index_path, value_size=HASH_SIZE)
+        if json_path:
+            self._migrate_from_json(json_path)
+
+    def _migrate_from_json(self, json_path: str):
+        """
+        One-shot import of an existing history.json, renamed to <name>.migrated afterwards.
+        """
+        if not os.path.exists(json_path):
+            return
+        history = HistoryManager(json_path)
+        self._record((task_id, history.hashes.get(task_id)) for task_id in history.synced_ids)
+        self._commit()
+        os.replace(json_path, json_path + ".migrated")
+
+    def _record(self, items: Iterable[Tuple[str, Optional[str]]]):
+        unhashed = []
+        hashed = []
+        for task_id, digest in items:
+            if digest is None:
+                unhashed.append(task_id)
+            else:
+                hashed.append((task_id, bytes.fromhex(digest)))
+        self.index.add_many(unhashed)
+        self.index.set_many(hashed)
+
+    def _lookup(self, task_id: str) -> Tuple[bool, Optional[str]]:
+        value = self.index.get(task_id)
+        if value is None:
+            return False, None
+        # All zero: synced before hashes were kept
+        return True, value.hex() if any(value) else None
+
+    def _commit(self):
+        if not self.index.dirty:
+            return
+        try:
+            self.index.commit()
+        except IOError as e:
+            print(f"Warning: Could not save history: {e}")
+
+    def has_been_synced(self, task_id: str) -> bool:
+        return task_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def close(self):
+        self._commit()
+        self.index.close()
+
+
+def create_history_manager(backend: str = HISTORY_BACKEND):
+    """
+    Returns the history store selected by HISTORY_BACKEND ('json', 'sqlite' or 'compact').
+    """
+    if backend == "json":
+        return HistoryManager()
+    if backend == "sqlite":
+        return SQLiteHistoryManager()
+    if backend == "compact":
+        return CompactHistoryManager()
+    raise ValueError(f"Unknown history backend: {backend}. Use 'json', 'sqlite' or 'compact'.")
@@ -0,0 +1,264 @@
+"""
+Lightweight timing and counters for finding where a sync spends its time.
+
+Instrumented code calls the module functions:
+
+    with instrumentation.span("tana.post", bytes=len(body)) as s:
+        ...
+        s.set(status=status)
+    instrumentation.count("tana.retries")
+
+Spans are timed, aggregated by name and kept as Chrome trace events; timers
+are aggregated only, for work too fine-grained to trace. Nothing is recorded
+until enable() (things-to-tana --profile): disabled, every call is one global
+lookup returning a shared no-op object, and wrap() hands back the function
+itself, so per-task calls pay nothing at all.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _NullSpan:
+    """Stands in for spans and timers while recording is off."""
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """A timed block; set() adds arguments shown in the trace."""
+    __slots__ = ("_recorder", "name", "args", "_traced", "_start")
+
+    def __init__(self, recorder: 'Recorder', name: str, args: Dict[str, Any], traced: bool):
+        self._recorder = recorder
+        self.name = name
+        self.args = args
+        self._traced = traced
+        self._start = 0.0
+
+    def __enter__(self) -> 'Span':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._recorder._finish(self, self._start, time.perf_counter())
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+class Recorder:
+    """
+    Collects span timings (calls, total and longest per name), counters and,
+    if trace is set, one trace event per span. Thread-safe.
+    """
+
+    def __init__(self, trace: bool = True):
+        self.trace_enabled = trace
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        # name -> [calls, total seconds, longest]
+        self._timings: Dict[str, List[float]] = {}
+        self.counters: Dict[str, float] = {}
+        self._events: List[Tuple[str, int, float, float, Dict[str, Any]]] = []
+
+    def span(self, name: str, **args) -> Span:
+        return Span(self, name, args, self.trace_enabled)
+
+    def timer(self, name: str) -> Span:
+        return Span(self, name, {}, False)
+
+    def _finish(self, span: Span, start: float, end: float):
+        with self._lock:
+            self._add(span.name, end - start, 1)
+            if span._traced:
+                self._events.append((span.name, threading.get_ident(), start, end, span.args))
+
+    def _add(self, name: str, seconds: float, calls: int):
+        timing = self._timings.get(name)
+        if timing is None:
+            self._timings[name] = [calls, seconds, seconds]
+        else:
+            timing[0] += calls
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def add(self, name: str, seconds: float, calls: int = 1):
+        with self._lock:
+            self._add(name, seconds, calls)
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def timings(self) -> Dict[str, Tuple[int, float, float]]:
+        """name -> (calls, total seconds, longest call in seconds)."""
+        with self._lock:
+            return {name: (int(calls), total, longest) for name, (calls, total, longest) in self._timings.items()}
+
+    def summary(self) -> str:
+        """The timings, longest total first, and the counters as a text table."""
+        lines = [f"{'span':<28} {'calls':>8} {'total (s)':>10} {'mean (ms)':>10} {'max (ms)':>9}"]
+        for name, (calls, total, longest) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<28} {calls:>8,} {total:>10.3f} {total / calls * 1000:>10.3f} {longest * 1000:>9.2f}")
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'counter':<28} {'value':>8}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"{name:<28} {value:>8,g}")
+        return "\n".join(lines)
+
+    def trace(self) -> Dict[str, Any]:
+        """
+        The spans in Chrome trace event format (chrome://tracing, Perfetto),
+        with the aggregated timings and counters alongside.
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                {"name": name, "ph": "X", "pid": pid, "tid": tid,
+                 "ts": round((start - self._origin) * 1e6, 3), "dur": round((end - start) * 1e6, 3), "args": args}
+                for name, tid, start, end, args in self._events
+            ]
+            counters = dict(self.counters)
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "timings": {name: {"calls": calls, "total_s": total, "max_s": longest}
+                            for name, (calls, total, longest) in self.timings.items()},
+                "counters": counters,
+            },
+        }
+
+    def write_trace(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f, default=str)
+
+
+_recorder: Optional[Recorder] = None
+
+
+def enable(trace: bool = True) -> Recorder:
+    """Starts recording into a new Recorder and returns it."""
+    global _recorder
+    _recorder = Recorder(trace)
+    return _recorder
+
+
+def disable() -> Optional[Recorder]:
+    """Stops recording; returns what was recorded."""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def active() -> Optional[Recorder]:
+    return _recorder
+
+
+def span(name: str, **args):
+    recorder = _recorder
+    return NULL_SPAN if recorder is None else recorder.span(name, **args)
+
+
+def timer(name: str):
+    """Like span(), but aggregated only: for work repeated per task."""
+    recorder = _recorder
+    return NULL_SPAN if recorder is None else recorder.timer(name)
+
+
+def count(name: str, value: float = 1):
+    recorder = _recorder
+    if recorder is not None:
+        recorder.count(name, value)
+
+
+def wrap(name: str, function: Callable[..., T]) -> Callable[..., T]:
+    """
+    The function, timed under the timer `name` on every call if recording
+    is on; otherwise the function itself. Look it up once, outside a loop.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return function
+
+    def timed_call(*args, **kwargs) -> T:
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            recorder.add(name, time.perf_counter() - start)
+    return timed_call
+
+
+def timed(name: str, items: Iterable[T]) -> Iterator[T]:
+    """
+    Iterates items, adding the time spent producing them (e.g. a provider's
+    lazy database reads) to the timer `name`, and counts them as `name`.
+    """
+    if _recorder is None:
+        return iter(items)
+    return _timed(name, items)
+
+
+def _timed(name: str, items: Iterable[T]) -> Iterator[T]:
+    iterator = iter(items)
+    total = 0.0
+    produced = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                total += time.perf_counter() - start
+            produced += 1
+            yield item
+    finally:
+        recorder = _recorder
+        if recorder is not None:
+            recorder.add(name, total, 1)
+            recorder.count(name, produced)
+
+
+@contextmanager
+def profiling(trace_path: Optional[str] = None):
+    """
+    Records everything inside the block, then prints the summary table and
+    writes a Chrome trace to trace_path if one is given.
+    """
+    recorder = enable(trace=bool(trace_path))
+    try:
+        with recorder.span("run"):
+            yield recorder
+    finally:
+        disable()
+        print("\nProfile:")
+        print(recorder.summary())
+        if trace_path:
+            try:
+                recorder.write_trace(trace_path)
+                print(f"Trace written to {trace_path} (open it in chrome://tracing or ui.perfetto.dev).")
+            except OSError as e:
+                print(f"Could not write trace: {e}")
@@ -1,22 +1,49 @@
 import sys
 import argparse
+import instrumentation
+from scopes import expand_scopes
 from sync_service import SyncService
+from things_to_tana import import_history, import_tags
+from task_filter import add_filter_arguments, filter_from_args
 
 def main():
     parser = argparse.ArgumentParser(description="Sync tasks from Things 3 to Tana.")
-    parser.add_argument("scope", choices=["inbox", "today", "all"], nargs="?", default="today", help="Scope to sync (default: today)")
+    parser.add_argument("scopes", nargs="*", default=["today"], metavar="scope", help="Scopes to sync: inbox, today, upcoming, anytime, someday, tag:NAME, project:TITLE or all (default: today), or 'flush' to send the outbox")
+    parser.add_argument("--full", action="store_true", help="Ignore the stored modification watermark and re-read every task in scope")
+    parser.add_argument("--import-tags", metavar="FILE", help="Save the supertag node IDs of Things tags from a Tana export or a JSON mapping, then exit")
+    parser.add_argument("--import-history", metavar="FILE", help="Mark the Things tasks in a Tana export or saved Tana Paste file as synced, then exit")
+    parser.add_argument("--profile", action="store_true", help="Print how long each stage of the run took")
+    parser.add_argument("--profile-trace", metavar="FILE", help="With --profile (implied), also write a Chrome trace")
+    add_filter_arguments(parser)
     
     args = parser.parse_args()
+    if args.profile or args.profile_trace:
+        with instrumentation.profiling(args.profile_trace):
+            run(parser, args)
+    else:
+        run(parser, args)
+
+
+def run(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    if args.import_tags:
+        import_tags(args.import_tags)
+        return
+    if args.import_history:
+        import_history(args.import_history)
+        return
     
-    service = SyncService()
+    if args.scopes != ["flush"]:
+        try:
+            scopes = expand_scopes(args.scopes)
+        except ValueError as e:
+            parser.error(str(e))
+
+    service = SyncService(full=args.full, task_filter=filter_from_args(args))
     
-    if args.scope == "inbox":
-        service.sync_inbox()
-    elif args.scope == "today":
-        service.sync_today()
-    elif args.scope == "all":
-        service.sync_inbox()
-        service.sync_today()
+    if args.scopes == ["flush"]:
+        service.flush_outbox()
+    else:
+        service.sync_scopes(scopes)
     
 if __name__ == "__main__":
     main()
@@ -0,0 +1,201 @@
+"""
+Prometheus metrics for scheduled and watch-mode API syncs.
+
+SyncService records each run, and TanaClient each request, in a
+SyncMetrics. With METRICS_FILE set, the metrics are written after every
+sync in the text format read by node_exporter's textfile collector,
+replaced atomically; counters, histograms and the last success time are
+first read back from the previous file, so runs started by cron keep
+counting. In watch mode, --metrics-port serves the same text at /metrics.
+"""
+import math
+import re
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from config import METRICS_HOST
+from storage import atomic_write_bytes
+
+PREFIX = "things_to_tana_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Results of a sync run
+SUCCESS = "success"
+QUEUED = "queued"
+FAILURE = "failure"
+
+# Histogram bucket bounds, in seconds
+RUN_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600)
+REQUEST_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# name -> (type, help), in the order they are written
+METRICS: Dict[str, Tuple[str, str]] = {
+    "sync_runs_total": ("counter", "Syncs by result: success, queued (Tana unreachable, batches kept in the outbox) or failure."),
+    "last_run_timestamp_seconds": ("gauge", "When the last sync finished."),
+    "last_success_timestamp_seconds": ("gauge", "When the last sync that delivered every task finished."),
+    "last_run_duration_seconds": ("gauge", "How long the last sync took."),
+    "sync_duration_seconds": ("histogram", "How long syncs take."),
+    "last_run_tasks": ("gauge", "Tasks in the last sync by state: fetched, filtered, waiting (in the outbox), "
+                                "new, changed, unchanged, unhashed, sent, queued, skipped, failed."),
+    "tasks_total": ("counter", "Tasks over all syncs, by the states of last_run_tasks."),
+    "http_requests_total": ("counter", "Requests to the Tana API by HTTP status code, or 'error' when none came back."),
+    "http_request_duration_seconds": ("histogram", "Tana API response times."),
+    "http_request_bytes_total": ("counter", "Request body bytes posted to the Tana API."),
+    "history_tasks": ("gauge", "Tasks in the sync history."),
+    "outbox_batches": ("gauge", "Batches waiting in the outbox."),
+}
+BUCKETS = {"sync_duration_seconds": RUN_BUCKETS, "http_request_duration_seconds": REQUEST_BUCKETS}
+# Gauges that keep their value from the previous textfile
+KEPT_GAUGES = {"last_success_timestamp_seconds"}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})?\s+(\S+)')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+def _format(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _sample_names(name: str) -> Tuple[str, ...]:
+    if METRICS[name][0] == "histogram":
+        return (f"{name}_bucket", f"{name}_sum", f"{name}_count")
+    return (name,)
+
+
+class SyncMetrics:
+    """Counters, gauges and histograms of sync runs and API requests. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # sample name (e.g. "sync_duration_seconds_count") -> labels -> value, in insertion order
+        self._samples: Dict[str, Dict[Labels, float]] = {}
+
+    def _inc(self, name: str, value: float, labels: Dict[str, str]):
+        series = self._samples.setdefault(name, {})
+        key = tuple(labels.items())
+        series[key] = series.get(key, 0.0) + value
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        with self._lock:
+            self._inc(name, value, labels)
+
+    def set(self, name: str, value: float, **labels: str):
+        with self._lock:
+            self._samples.setdefault(name, {})[tuple(labels.items())] = float(value)
+
+    def observe(self, name: str, value: float, **labels: str):
+        with self._lock:
+            for bound in BUCKETS[name] + (math.inf,):
+                self._inc(f"{name}_bucket", 1 if value <= bound else 0, {**labels, "le": _format(bound)})
+            self._inc(f"{name}_sum", value, labels)
+            self._inc(f"{name}_count", 1, labels)
+
+    def get(self, name: str, **labels: str) -> float:
+        """The value of one sample, e.g. get("tasks_total", state="sent"); 0 if never recorded."""
+        with self._lock:
+            return self._samples.get(name, {}).get(tuple(labels.items()), 0.0)
+
+    def record_request(self, status: str, seconds: float, size: int):
+        """One call to the Tana API: its HTTP status (or 'error'), response time and body size."""
+        self.inc("http_requests_total", status=status)
+        self.observe("http_request_duration_seconds", seconds)
+        self.inc("http_request_bytes_total", size)
+
+    def record_run(self, result: str, seconds: float, tasks: Dict[str, int], history_size: int,
+                   outbox_size: int, finished: Optional[float] = None):
+        """One sync: SUCCESS, QUEUED or FAILURE, how long it took, and its task counts by state."""
+        finished = time.time() if finished is None else finished
+        self.inc("sync_runs_total", result=result)
+        self.set("last_run_timestamp_seconds", finished)
+        if result == SUCCESS:
+            self.set("last_success_timestamp_seconds", finished)
+        self.set("last_run_duration_seconds", seconds)
+        self.observe("sync_duration_seconds", seconds)
+        with self._lock:
+            self._samples["last_run_tasks"] = {}
+        for state, count in tasks.items():
+            self.set("last_run_tasks", count, state=state)
+            self.inc("tasks_total", count, state=state)
+        self.set("history_tasks", history_size)
+        self.set("outbox_batches", outbox_size)
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in METRICS.items():
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                for sample in _sample_names(name):
+                    for labels, value in self._samples.get(sample, {}).items():
+                        label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                        lines.append(f"{PREFIX}{sample}{{{label_text}}} {_format(value)}" if labels
+                                     else f"{PREFIX}{sample} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+    def load(self, path: str):
+        """
+        Carries the counters, histograms and last success time of an
+        earlier textfile over; a missing or unreadable file is ignored.
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return
+        kept = set(KEPT_GAUGES)
+        for name, (kind, _) in METRICS.items():
+            if kind != "gauge":
+                kept.update(_sample_names(name))
+        with self._lock:
+            for line in text.splitlines():
+                match = _SAMPLE.match(line)
+                if not match or not match.group(1).startswith(PREFIX):
+                    continue
+                name = match.group(1)[len(PREFIX):]
+                if name not in kept:
+                    continue
+                try:
+                    value = float(match.group(3))
+                except ValueError:
+                    continue
+                self._samples.setdefault(name, {})[tuple(_LABEL.findall(match.group(2) or ""))] = value
+
+    def write_textfile(self, path: str):
+        """Writes the metrics to path, replacing it atomically (name it *.prom for node_exporter)."""
+        atomic_write_bytes(path, self.render().encode("utf-8"))
+
+    def serve(self, port: int, host: str = METRICS_HOST):
+        """
+        Serves the metrics at http://host:port/metrics from a background
+        thread. Returns the server; shutdown() stops it.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
@@ -1,79 +1,156 @@
-from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
+# Shared by nodes without children or supertags (most are leaves), until one is added
+_NO_CHILDREN: Sequence['TanaNode'] = ()
+_NO_SUPERTAGS: Mapping[str, None] = MappingProxyType({})
+
 
-@dataclass
 class TanaNode:
-    name: str
-    description: Optional[str] = None
-    children: List['TanaNode'] = field(default_factory=list)
-    supertags: List[str] = field(default_factory=list)
-    checked: Optional[bool] = None
-    
+    """
+    A node to create in Tana, shared by clipboard and API sync.
+
+    The same tree is handed to an emitter: tana_formatter.to_tana_paste()
+    for Tana Paste text, or api_payload() / TanaClient for Input API JSON.
+    `name` is the node's text (`text` is an alias). `supertags` is an
+    insertion-ordered set (a dict with None values), so adding a tag is a
+    hash lookup and tags keep the order they were added in. Slotted, and
+    leaves share empty containers, since a run builds one node per task, note
+    line and checklist item. Use add_child() / add_supertag() to grow a node.
+    """
+    __slots__ = ("name", "description", "children", "supertags", "checked")
+
+    def __init__(
+        self,
+        name: str = "",
+        description: Optional[str] = None,
+        children: Optional[List['TanaNode']] = None,
+        supertags: Iterable[str] = (),
+        checked: Optional[bool] = None,  # None = no checkbox, False = [ ], True = [x]
+        text: Optional[str] = None,
+    ):
+        self.name = name if text is None else text
+        self.description = description
+        self.children: Sequence['TanaNode'] = children or _NO_CHILDREN
+        self.supertags: Mapping[str, None] = dict.fromkeys(supertags) if supertags else _NO_SUPERTAGS
+        self.checked = checked
+
+    @property
+    def text(self) -> str:
+        return self.name
+
+    @text.setter
+    def text(self, value: str):
+        self.name = value
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, TanaNode):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self) -> str:
+        return (f"TanaNode(name={self.name!r}, description={self.description!r}, children={self.children!r}, "
+                f"supertags={list(self.supertags)!r}, checked={self.checked!r})")
+
     def add_child(self, child: 'TanaNode'):
-        self.children.append(child)
+        if self.children:
+            self.children.append(child)
+        else:
+            self.children = [child]
         return self
 
     def add_supertag(self, tag: str):
-        if tag not in self.supertags:
-            self.supertags.append(tag)
+        if self.supertags:
+            self.supertags[tag] = None
+        else:
+            self.supertags = {tag: None}
         return self
 
     def to_api_payload(self) -> Dict[str, Any]:
         """
         Converts the node to the Tana Input API JSON format.
         """
-        payload = {
-            "name": self.name
-        }
-        
-        if self.description:
-            payload["description"] = self.description
-            
-        if self.supertags:
-            # API expects supertags as an array of objects with 'id'
-            # The tag value should be the node ID of the supertag in Tana
-            payload["supertags"] = [{"id": tag} for tag in self.supertags]
-            
-        if self.children:
-            payload["children"] = [child.to_api_payload() for child in self.children]
-            
-        if self.checked is not None:
-            # The API documentation for checkboxes is a bit sparse, 
-            # but often it's handled via a supertag or specific field.
-            # For now, we'll append status to name if it's not supported directly,
-            # OR we can try to set a 'checked' property if the API supports it.
-            # Based on research, 'checked' might not be a direct property of a plain node 
-            # unless it's a checkbox node type. 
-            # Let's assume we create a plain node. If it needs to be a checkbox, 
-            # we might need to set a specific supertag or property.
-            # For simplicity in this MVP, we will rely on the supertag to define it as a task.
-            pass
-
-        return payload
-
-    def to_tana_paste(self, indent_level: int = 0) -> str:
+        return api_payload(self)
+
+    def to_string(self, indent_level: int = 0) -> str:
         """
-        Legacy/Debug: Converts to Tana Paste format.
+        Converts the node (and its children) to Tana Paste lines.
         """
-        indent = "  " * indent_level
-        checkbox = ""
-        if self.checked is not None:
-            checkbox = "[x] " if self.checked else "[ ] "
-        
-        tags = ""
-        for tag in self.supertags:
-            if " " in tag:
-                tags += f" #[[{tag}]]"
-            else:
-                tags += f" #{tag}"
-
-        lines = [f"{indent}- {checkbox}{self.name}{tags}"]
-        if self.description:
-             # Description usually goes as a child or inline? 
-             # In Tana Paste, it's often a child node or just extra text.
-             # Let's add it as a child for clarity in paste format.
-             lines.append(f"{indent}  - {self.description}")
-
-        for child in self.children:
-            lines.append(child.to_tana_paste(indent_level + 1))
-        return "\n".join(lines)
+        from tana_formatter import node_to_paste
+        return node_to_paste(self, indent_level)
+
+    # Legacy/Debug name for to_string()
+    to_tana_paste = to_string
+
+
+def api_payload(node: TanaNode) -> Dict[str, Any]:
+    """
+    Emits a node tree in the Tana Input API JSON format. The API has no
+    checkbox property, so a checkbox is written as a '[x] ' / '[ ] ' prefix.
+    """
+    payload: Dict[str, Any] = {"name": api_name(node)}
+    if node.description:
+        payload["description"] = node.description
+    if node.supertags:
+        # The API expects supertags as objects with the supertag's node ID
+        payload["supertags"] = [{"id": tag} for tag in node.supertags]
+    if node.children:
+        payload["children"] = [api_payload(child) for child in node.children]
+    return payload
+
+
+def api_name(node: TanaNode) -> str:
+    if node.checked is None:
+        return node.name
+    return f"{'[x]' if node.checked else '[ ]'} {node.name}"
+
+
+def task_to_node(
+    task: Dict[str, Any],
+    supertags: Iterable[str] = (),
+    tags: bool = True,
+    dates: bool = True,
+    status: bool = True,
+) -> TanaNode:
+    """
+    Converts a Things 3 task dictionary to a TanaNode, for either sync mode.
+
+    supertags: applied to the task node (names for Tana Paste, node IDs for the API).
+    tags: also add the task's Things tags as supertags (by name).
+    dates: append the due date to the text as a Tana date.
+    status: give the task node a checkbox for its status and mark canceled
+    tasks with #canceled. Checklist items always get a checkbox; a checklist
+    that is only a flag (things.py without include_items) is left out.
+    Notes become one child per non-empty line.
+    """
+    text = task.get('title', 'Untitled Task')
+    due_date = task.get('due_date')
+    if dates and due_date:
+        text += f" [[date:{due_date}]]"
+
+    checked = None
+    if status:
+        task_status = task.get('status', '')
+        # Tana Paste has no canceled checkbox state: canceled tasks are checked and tagged
+        checked = task_status in ('completed', 'canceled')
+        if task_status == 'canceled':
+            text += " #canceled"
+
+    node = TanaNode(text, supertags=supertags, checked=checked)
+    if tags:
+        for tag in task.get('tags', []):
+            node.add_supertag(tag)
+
+    notes = task.get('notes', '')
+    if notes:
+        for line in notes.split('\n'):
+            if line.strip():
+                node.add_child(TanaNode(line))
+
+    checklist = task.get('checklist')
+    # things.py only lists checklist items when asked to (include_items); otherwise it is a flag
+    if isinstance(checklist, list):
+        for item in checklist:
+            node.add_child(TanaNode(item.get('title', ''), checked=item.get('status', '') == 'completed'))
+
+    return node
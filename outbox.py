@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import instrumentation
+from storage import atomic_write_bytes, locked
+
+OUTBOX_FILE = "outbox.jsonl"
+
+# Rewrite the spool once it holds this many acknowledged entries more than pending ones
+COMPACT_SLACK = 100
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    target: str
+    task_ids: List[str]
+    body: str
+    # Content hash of each task, recorded in the history once the batch is sent
+    hashes: Optional[Dict[str, str]] = None
+
+
+class Outbox:
+    """
+    Append-only on-disk spool of Tana API request bodies.
+
+    Each batch is written (and fsynced) before it is sent and acknowledged
+    once Tana accepted it, so a batch that couldn't be delivered survives the
+    process and is sent again later as-is, without re-reading Things or
+    re-converting tasks. The file is JSON lines: an entry per batch, then an
+    {"ack": id} line when it is done. Once nothing is pending it is rewritten
+    as a {"next": id} line, so entry ids never repeat.
+
+    Thread-safe: batches for different targets are spooled from worker threads.
+    Overlapping runs (e.g. cron + manual) share the file: every change holds
+    an flock on file_path + ".lock" and first reads what other processes
+    wrote since, so none of their batches is lost when the file is rewritten.
+    """
+
+    def __init__(self, file_path: str = OUTBOX_FILE):
+        self.file_path = file_path
+        self.lock_path = file_path + ".lock"
+        self._lock = threading.Lock()
+        self._pending: Dict[int, OutboxEntry] = {}
+        self._pending_tasks: Dict[str, int] = {}
+        self._acked = 0
+        self._next_id = 1
+        # The file as this process last read or wrote it (None: not read yet)
+        self._seen: Optional[Tuple[int, int, int]] = None
+        with self._lock, self._file_lock():
+            pass  # Reads the file
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """
+        Holds the lock against other processes, with the file's entries
+        reloaded if one of them changed it. Call with self._lock held.
+        """
+        with locked(self.lock_path):
+            if self._stat() != self._seen:
+                self._load()
+            yield
+            self._seen = self._stat()
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _load(self):
+        self._pending, self._pending_tasks, self._acked = {}, {}, 0
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A write cut short by a crash; the batch was never sent
+                    continue
+                if "ack" in record:
+                    self._forget(record["ack"])
+                elif "next" in record:
+                    self._next_id = max(self._next_id, record["next"])
+                else:
+                    self._remember(OutboxEntry(record["id"], record["target"], record["tasks"], record["body"],
+                                               record.get("hashes")))
+                    self._next_id = max(self._next_id, record["id"] + 1)
+
+    def _remember(self, entry: OutboxEntry):
+        self._pending[entry.id] = entry
+        for task_id in entry.task_ids:
+            self._pending_tasks[task_id] = entry.id
+
+    def _forget(self, entry_id: int):
+        entry = self._pending.pop(entry_id, None)
+        if entry is not None:
+            self._acked += 1
+            for task_id in entry.task_ids:
+                self._pending_tasks.pop(task_id, None)
+
+    def _append(self, record: Dict[str, Any]):
+        with open(self.file_path, 'a') as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def add(self, target: str, task_ids: List[str], body: str,
+            hashes: Optional[Dict[str, str]] = None) -> OutboxEntry:
+        with self._lock, self._file_lock(), instrumentation.span("outbox.add", bytes=len(body)):
+            entry = OutboxEntry(self._next_id, target, list(task_ids), body, hashes)
+            self._next_id += 1
+            self._append(_record(entry))
+            self._remember(entry)
+            return entry
+
+    def ack(self, entry: OutboxEntry):
+        """
+        Removes a batch that was delivered (or that should not be retried).
+        """
+        with self._lock, self._file_lock(), instrumentation.span("outbox.ack"):
+            self._forget(entry.id)
+            if not self._pending or self._acked > len(self._pending) + COMPACT_SLACK:
+                self._compact()
+            else:
+                self._append({"ack": entry.id})
+
+    def _compact(self):
+        records = [{"next": self._next_id}] + [_record(entry) for entry in self._pending.values()]
+        lines = [json.dumps(record, separators=(",", ":")) for record in records]
+        atomic_write_bytes(self.file_path, ("\n".join(lines) + "\n").encode())
+        self._acked = 0
+
+    def pending(self) -> List[OutboxEntry]:
+        """
+        Batches waiting to be sent, oldest first, including those of other processes.
+        """
+        with self._lock, self._file_lock():
+            return list(self._pending.values())
+
+    def contains_task(self, task_id: str) -> bool:
+        with self._lock:
+            return task_id in self._pending_tasks
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+def _record(entry: OutboxEntry) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"id": entry.id, "target": entry.target, "tasks": entry.task_ids, "body": entry.body}
+    if entry.hashes:
+        record["hashes"] = entry.hashes
+    return record
@@ -0,0 +1,141 @@
+"""
+Tana Paste written to files or stdout, in size-limited shards.
+
+Clipboard mode used to render every task into one string for pyperclip,
+which is slow and unreliable for multi-megabyte pastes, and Tana struggles
+to paste very large blocks anyway. ShardWriter streams rendered tasks (the
+fragments of paste_fragment()) into files of at most shard_size bytes
+instead, each a complete %%tana%% document, holding one fragment at a time.
+"""
+import contextlib
+import os
+import sys
+import time
+from typing import Iterable, List, Optional, TextIO
+
+HEADER = "%%tana%%"
+# Seconds between updates of the progress line
+PROGRESS_INTERVAL = 0.2
+
+
+class PasteWriteError(OSError):
+    """
+    Writing Tana Paste failed. The fragments written are often rendered
+    from a Things read as they go, so this tells a write error apart from
+    an OSError of that read.
+    """
+
+
+@contextlib.contextmanager
+def _write_errors():
+    try:
+        yield
+    except PasteWriteError:
+        raise
+    except OSError as e:
+        raise PasteWriteError(e.errno, e.strerror, e.filename) from e
+
+
+def shard_path(path: str, index: int) -> str:
+    """The file of shard `index` (from 1): tana.txt -> tana-001.txt."""
+    root, ext = os.path.splitext(path)
+    return f"{root}-{index:03d}{ext}"
+
+
+class ShardWriter:
+    """
+    Writes Tana Paste fragments to path ('-' for stream, by default stdout),
+    raising PasteWriteError if that fails. With shard_size, starts a new numbered file (shard_path()) before one
+    would grow past shard_size bytes of UTF-8; a task larger than that gets
+    a shard of its own, as a task tree isn't split. Files are only created
+    once there is something to write.
+    """
+
+    def __init__(self, path: str, shard_size: Optional[int] = None, stream: Optional[TextIO] = None):
+        if shard_size is not None and shard_size <= 0:
+            raise ValueError("shard size must be positive")
+        if path == "-" and shard_size is not None:
+            raise ValueError("stdout can't be split into shards")
+        self.path = path
+        self.shard_size = shard_size
+        self.stream = stream
+        self.paths: List[str] = []
+        self.fragments = 0
+        self.bytes = 0
+        self._fp: Optional[TextIO] = None
+        self._shard_bytes = 0
+
+    def write(self, fragment: str):
+        size = len(fragment.encode("utf-8")) + 1
+        with _write_errors():
+            if self._fp is None or (self.shard_size is not None and self._shard_bytes
+                                    and self._shard_bytes + size > self.shard_size):
+                self._open_shard()
+            self._fp.write(fragment)
+            self._fp.write("\n")
+        self._shard_bytes += size
+        self.bytes += size
+        self.fragments += 1
+
+    def _open_shard(self):
+        self._close_shard()
+        if self.path == "-":
+            self._fp = self.stream or sys.stdout
+        else:
+            path = self.path if self.shard_size is None else shard_path(self.path, len(self.paths) + 1)
+            self._fp = open(path, "w", encoding="utf-8", newline="")
+            self.paths.append(path)
+        self._fp.write(HEADER + "\n")
+        self._shard_bytes = len(HEADER) + 1
+        self.bytes += self._shard_bytes
+
+    def _close_shard(self):
+        if self._fp is None:
+            return
+        if self.path == "-":
+            self._fp.flush()
+        else:
+            self._fp.close()
+        self._fp = None
+
+    def close(self):
+        """Closes the last shard and removes numbered shards left over from a longer earlier export."""
+        with _write_errors():
+            self._close_shard()
+            if self.shard_size is not None and self.paths:
+                index = len(self.paths) + 1
+                while os.path.exists(shard_path(self.path, index)):
+                    os.remove(shard_path(self.path, index))
+                    index += 1
+
+    def __enter__(self) -> 'ShardWriter':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def write_paste(fragments: Iterable[str], path: str, shard_size: Optional[int] = None,
+                stream: Optional[TextIO] = None, progress: Optional[TextIO] = None) -> ShardWriter:
+    """
+    Writes fragments with a ShardWriter and returns it. If progress is a
+    stream (a terminal's stderr), keeps a line of tasks and bytes written on it.
+    """
+    shown = time.monotonic()
+    with ShardWriter(path, shard_size, stream) as writer:
+        for fragment in fragments:
+            writer.write(fragment)
+            if progress is not None and time.monotonic() - shown >= PROGRESS_INTERVAL:
+                shown = time.monotonic()
+                _show_progress(writer, progress)
+    if progress is not None and writer.fragments:
+        _show_progress(writer, progress)
+        progress.write("\n")
+    return writer
+
+
+def _show_progress(writer: ShardWriter, progress: TextIO):
+    shards = f", {len(writer.paths)} files" if writer.shard_size is not None else ""
+    progress.write(f"\r{writer.fragments:,} tasks, {writer.bytes / 2**20:.1f} MB{shards}")
+    progress.flush()
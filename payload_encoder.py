@@ -0,0 +1,83 @@
+import json
+from typing import List, NamedTuple, Sequence
+from models import TanaNode, api_name
+
+try:
+    import orjson
+except ImportError:
+    # Optional (pip install things-to-tana[fast]): quotes strings faster; json's escaper is used without it
+    orjson = None
+
+# json's string escaper (its C implementation where available): quoted, ASCII-only
+_quote = json.encoder.encode_basestring_ascii
+
+
+class EncodedNode(NamedTuple):
+    """
+    A top-level node tree as compact Input API JSON, and how many nodes it
+    creates (children included).
+    """
+    json: bytes
+    node_count: int
+
+
+def _ascii_quote(text: str) -> bytes:
+    return _quote(text).encode("ascii")
+
+
+def encode_node(node: TanaNode) -> EncodedNode:
+    """
+    Encodes a node tree to the bytes it takes in a request body. Walks the
+    tree iteratively into one buffer, without building the api_payload()
+    dicts; the length of `json` is the exact byte size. Strings are quoted
+    by orjson when it is installed, as UTF-8, otherwise ASCII-escaped like
+    json.dumps(); the two give the same bytes for ASCII-only text.
+    """
+    quote = orjson.dumps if orjson is not None else _ascii_quote
+    parts: List[bytes] = []
+    append = parts.append
+    node_count = 0
+    # Each level: the iterator over its nodes, and whether one was written (for commas)
+    stack: List[List] = [[iter((node,)), False]]
+    while stack:
+        level = stack[-1]
+        current = next(level[0], None)
+        if current is None:
+            stack.pop()
+            if stack:
+                append(b"]}")
+            continue
+        if level[1]:
+            append(b",")
+        level[1] = True
+        node_count += 1
+        append(b'{"name":')
+        append(quote(api_name(current)))
+        if current.description:
+            append(b',"description":')
+            append(quote(current.description))
+        if current.supertags:
+            append(b',"supertags":[')
+            append(b",".join(b'{"id":' + quote(tag) + b'}' for tag in current.supertags))
+            append(b"]")
+        if current.children:
+            append(b',"children":[')
+            stack.append([iter(current.children), False])
+        else:
+            append(b"}")
+    return EncodedNode(b"".join(parts), node_count)
+
+
+def envelope(target_node_id: str) -> bytes:
+    """
+    The request body with no nodes; each node adds its JSON plus a comma after the first.
+    """
+    return b'{"targetNodeId":' + _quote(target_node_id).encode("ascii") + b',"nodes":[]}'
+
+
+def encode_payload(target_node_id: str, nodes: Sequence[EncodedNode]) -> bytes:
+    """
+    Joins encoded nodes into a request body, exactly as it is sent.
+    """
+    empty = envelope(target_node_id)
+    return empty[:-2] + b",".join(node.json for node in nodes) + empty[-2:]
@@ -0,0 +1,127 @@
+import email.utils
+import random
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() blocks until a call may be made at
+    `rate` calls per second, allowing bursts of up to `capacity` calls.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max((1 - self.tokens) / self.rate, self.updated - now)
+            time.sleep(wait)
+
+    def defer(self, seconds: float):
+        """
+        Holds every caller back for `seconds` (e.g. after a 429 with Retry-After).
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0)
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: the n-th retry waits a random time
+    up to min(max_delay, base_delay * 2**n).
+    """
+
+    def __init__(self, max_retries: int, base_delay: float, max_delay: float, rng: Optional[random.Random] = None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+
+    def delay(self, retry: int) -> float:
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or HTTP-date).
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a service that keeps failing.
+
+    After `threshold` consecutive failures the circuit opens and allow()
+    refuses calls for `cooldown` seconds. Then a single trial call is let
+    through: success closes the circuit, failure opens it again, and a call
+    that ends with neither (release()) lets the next call be the trial.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def release(self):
+        """Ends the trial call, if any, without a verdict on the service."""
+        with self._lock:
+            self._trial = False
@@ -0,0 +1,96 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import TANA_INBOX_NODE_ID, TANA_ROUTES, TANA_TODAY_NODE_ID
+
+# Things lists that can be synced, and their display names
+LIST_SCOPES = {
+    "inbox": "Inbox",
+    "today": "Today",
+    "upcoming": "Upcoming",
+    "anytime": "Anytime",
+    "someday": "Someday",
+}
+# Scopes that take a value, written kind:value (e.g. tag:errand), and their display names
+VALUE_SCOPES = {"tag": "#{}", "project": "Project {}"}
+# Shorthands for several scopes
+SCOPE_ALIASES = {"all": ["inbox", "today"]}
+
+# Scopes whose membership changes when the date rolls over, without any task being modified
+DATE_DEPENDENT_SCOPES = {"today", "upcoming"}
+
+
+def split_scope(scope: str) -> Tuple[str, Optional[str]]:
+    """
+    Splits a scope into its kind and value: 'inbox' -> ('inbox', None),
+    'tag:errand' -> ('tag', 'errand'). Raises ValueError for unknown scopes.
+    """
+    if scope in LIST_SCOPES:
+        return scope, None
+    kind, _, value = scope.partition(":")
+    if kind in VALUE_SCOPES and value:
+        return kind, value
+    raise ValueError(
+        f"Unknown scope: {scope}. Use {', '.join(LIST_SCOPES)}, "
+        f"{', '.join(SCOPE_ALIASES)}, tag:NAME or project:TITLE."
+    )
+
+
+def scope_name(scope: str) -> str:
+    kind, value = split_scope(scope)
+    if value is None:
+        return LIST_SCOPES[kind]
+    return VALUE_SCOPES[kind].format(value)
+
+
+def expand_scopes(scopes: Iterable[str]) -> List[str]:
+    """
+    Resolves aliases and drops repeats, keeping the order given (a task in
+    several scopes is synced with the first). Raises ValueError for unknown scopes.
+    """
+    expanded: List[str] = []
+    for scope in scopes:
+        for name in SCOPE_ALIASES.get(scope, [scope]):
+            split_scope(name)
+            if name not in expanded:
+                expanded.append(name)
+    return expanded
+
+
+def parse_routes(spec: str) -> Dict[str, str]:
+    """
+    Parses TANA_ROUTES, comma-separated scope=node-id pairs such as
+    'upcoming=abc123,tag:errand=def456'.
+    """
+    routes: Dict[str, str] = {}
+    for pair in spec.split(","):
+        if not pair.strip():
+            continue
+        scope, _, node_id = pair.partition("=")
+        scope, node_id = scope.strip(), node_id.strip()
+        try:
+            split_scope(scope)
+        except ValueError as e:
+            print(f"Warning: ignoring TANA_ROUTES entry '{pair.strip()}': {e}")
+            continue
+        if not node_id:
+            print(f"Warning: ignoring TANA_ROUTES entry '{pair.strip()}': no node ID")
+            continue
+        routes[scope] = node_id
+    return routes
+
+
+def routing_table(scopes: Iterable[str], routes: Optional[str] = None) -> Dict[str, str]:
+    """
+    Maps each scope to the Tana node its tasks are sent to: the TANA_ROUTES
+    entry if there is one, else TANA_TODAY_NODE_ID for Today and
+    TANA_INBOX_NODE_ID for everything else.
+    """
+    configured = parse_routes(TANA_ROUTES if routes is None else routes)
+    table = {}
+    for scope in scopes:
+        if scope in configured:
+            table[scope] = configured[scope]
+        elif scope == "today" and TANA_TODAY_NODE_ID:
+            table[scope] = TANA_TODAY_NODE_ID
+        else:
+            table[scope] = TANA_INBOX_NODE_ID
+    return table
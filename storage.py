@@ -0,0 +1,84 @@
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+# The process umask, read once: os.umask() can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write_bytes(file_path: str, data: bytes):
+    """
+    Writes data to file_path atomically.
+
+    The data goes to a temporary file in the same directory, is fsynced and
+    then renamed over the target, so readers (and a crash mid-write) only ever
+    see the old or the new file, never a truncated one. The file keeps the
+    mode of the one it replaces, or gets the umask's like open() would give
+    it (mkstemp() creates 0600, which e.g. a metrics collector running as
+    another user can't read).
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    try:
+        mode = os.stat(file_path).st_mode & 0o777
+    except OSError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+@contextmanager
+def locked(lock_path: str, waiting: Optional[str] = None) -> Iterator[None]:
+    """
+    Holds an exclusive flock on lock_path (created if missing) against other
+    processes, blocking until it is free; prints `waiting`, if given, when
+    another process holds it.
+    """
+    with open(lock_path, 'a') as lock:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if waiting:
+                print(waiting)
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write_json(file_path: str, data: Any):
+    """
+    Serializes data as compact JSON and writes it atomically.
+    """
+    atomic_write_bytes(file_path, json.dumps(data, separators=(',', ':')).encode('utf-8'))
+
+
+def _fsync_directory(directory: str):
+    # Persist the rename itself; not supported on every platform.
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -1,15 +1,116 @@
-from typing import List, Dict, Any
-from config import SUPERTAG_ID, TANA_INBOX_NODE_ID, TANA_TODAY_NODE_ID
-from models import TanaNode
-from things_provider import ThingsProvider
-from tana_client import TanaClient
-from history_manager import HistoryManager
+import queue
+import time
+from collections import Counter, deque
+import instrumentation
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Deque, Iterable, Iterator, NamedTuple, Optional, Set, Tuple
+from config import (
+    CHANGED_TASK_MARKER, CHANGED_TASKS, DEBUG, METRICS_FILE, SUPERTAG_ID, SYNC_QUEUE_SIZE, TANA_CREATE_TAGS,
+)
+from conversion_cache import ConversionCache
+from metrics import FAILURE, QUEUED, SUCCESS, SyncMetrics
+from models import TanaNode, task_to_node
+from tag_index import TagIndex
+from tana_formatter import tana_tag
+from things_provider import create_things_provider
+from tana_client import RETRY_LATER, SENT, TanaClient
+from payload_encoder import EncodedNode, encode_node
+from outbox import Outbox, OutboxEntry
+from history_manager import CHANGED, NEW, UNCHANGED, UNHASHED, content_hash, create_history_manager
+from sync_state import ModificationTracker, SyncState
+from task_filter import TaskFilter
+from scopes import DATE_DEPENDENT_SCOPES, expand_scopes, routing_table, scope_name
+from storage import locked
+
+# What to do with tasks edited in Things after they were synced (CHANGED_TASKS)
+CHANGE_POLICIES = ("log", "resend")
+# Held by a run from planning to its last history update, so overlapping runs
+# (e.g. cron + manual) take turns instead of both sending the same new tasks
+SYNC_LOCK_FILE = "sync.lock"
+WAITING_FOR_LOCK = "Another sync is running; waiting for it to finish..."
+
+
+class BatchOutcome(NamedTuple):
+    """What became of one batch, passed from its sender to the calling thread."""
+    success: bool
+    # Not sent yet, but saved in the outbox to be sent later
+    queued: bool
+    # (UUID, content hash, scope) of each task in the batch
+    tasks: List[Tuple[str, str, str]]
+    entry: Optional[OutboxEntry]
+    # Not sent: a task too large for one API call, which no retry can fix
+    skipped: bool = False
+
+
+class TargetSend(NamedTuple):
+    """A target node's sender: the tasks going in (None ends them) and the batch outcomes coming out."""
+    target: str
+    tasks: "queue.Queue[Optional[Dict[str, Any]]]"
+    results: "queue.Queue[Optional[BatchOutcome]]"
+    future: Future
+
+
+class SyncRun:
+    """
+    What one sync_scopes() run has seen so far, kept on the calling thread:
+    counts instead of task lists, so memory doesn't grow with the library.
+    """
+
+    def __init__(self, watermarks: Dict[str, Optional[float]]):
+        self.watermarks = watermarks
+        self.trackers = {scope: ModificationTracker(since) for scope, since in watermarks.items()}
+        # Fetched tasks by what happened to them: fetched, filtered, waiting (in the outbox) and their history state
+        self.counts: Counter = Counter()
+        # Tasks each scope sent, and how many of them went through, into the outbox or were skipped
+        self.assigned: Counter = Counter()
+        self.synced: Counter = Counter()
+        self.queued: Counter = Counter()
+        self.skipped: Counter = Counter()
+        # Titles of the synced tasks each scope found edited since
+        self.changed: Dict[str, List[str]] = {scope: [] for scope in watermarks}
+        # Content hashes to record for synced tasks that aren't sent: the baseline
+        # for tasks synced before hashes were kept, and logged edits
+        self.rehash: Dict[str, str] = {}
+        # One sender per target node, in scope order, and the targets whose senders are done
+        self.sends: Dict[str, TargetSend] = {}
+        self.finished: Set[str] = set()
+        # Tasks held back until their missing tags are created (TANA_CREATE_TAGS)
+        self.hold_for_tags = False
+        self.held: List[Tuple[str, Dict[str, Any]]] = []
+
 
 class SyncService:
-    def __init__(self):
-        self.things_provider = ThingsProvider()
+    def __init__(self, full: bool = False, task_filter: Optional[TaskFilter] = None,
+                 changed_tasks: Optional[str] = None, create_tags: Optional[bool] = None):
+        """
+        full: ignore the stored modification-date watermarks and re-read every
+        task in scope (the --full escape hatch).
+        task_filter: which tasks to sync; defaults to active to-dos.
+        changed_tasks: 'log' or 'resend' tasks edited in Things after they
+        were synced; defaults to CHANGED_TASKS.
+        create_tags: create Things tags that have no node ID yet as supertags
+        in Tana; defaults to TANA_CREATE_TAGS.
+        """
+        changed_tasks = changed_tasks or CHANGED_TASKS
+        if changed_tasks not in CHANGE_POLICIES:
+            raise ValueError(f"Unknown CHANGED_TASKS policy: {changed_tasks}. Use 'log' or 'resend'.")
+        self.changed_tasks = changed_tasks
+        self.things_provider = create_things_provider()
         self.tana_client = TanaClient()
-        self.history_manager = HistoryManager()
+        self.history_manager = create_history_manager()
+        self.sync_state = SyncState()
+        self.outbox = Outbox()
+        self.tag_index = TagIndex()
+        self.conversion_cache = ConversionCache()
+        self.metrics = SyncMetrics()
+        if METRICS_FILE:
+            self.metrics.load(METRICS_FILE)
+        self.tana_client.metrics = self.metrics
+        self.create_tags = TANA_CREATE_TAGS if create_tags is None else create_tags
+        self.full = full
+        self.task_filter = task_filter or TaskFilter()
+        # Set when Tana can't be reached; the rest of the run goes to the outbox without calling it
+        self._offline = False
 
         # Warn if SUPERTAG_ID is not configured
         if not SUPERTAG_ID:
@@ -23,102 +124,441 @@ class SyncService:
 
     def _convert_task_to_node(self, task: Dict[str, Any]) -> TanaNode:
         """
-        Converts a Things 3 task dictionary to a TanaNode.
-        """
-        title = task.get('title', 'Untitled Task')
-        notes = task.get('notes', '')
-        tags = task.get('tags', [])
-        # due_date = task.get('due_date') # Tana API might handle dates differently, or we put in name
-        checklist = task.get('checklist', [])
-        
-        # Create the main node
-        node = TanaNode(name=title)
-
-        # Add configured supertag (using node ID for API)
-        if SUPERTAG_ID:
-            node.add_supertag(SUPERTAG_ID)
-
-        # Note: Things tags are skipped in API mode since they require node IDs
-        # To use Things tags, you would need to map each tag name to its Tana node ID
-        # For now, tags are only supported in clipboard mode (things_to_tana.py)
-            
-        # Add notes as a child node
-        if notes:
-            # Split notes by line
-            for line in notes.split('\n'):
-                if line.strip():
-                    node.add_child(TanaNode(name=line))
-            
-        # Add checklist items as children
-        for item in checklist:
-            item_title = item.get('title', '')
-            item_status = item.get('status', '')
-            # For now, checklist items are just child nodes. 
-            # If we want them to be checkboxes, we might need a specific supertag or property.
-            # We'll just add them as children for now.
-            child = TanaNode(name=item_title)
-            if item_status == 'completed':
-                child.name = f"[x] {child.name}" # Visual indicator
+        Converts a Things 3 task dictionary to a TanaNode for the API.
+        The API needs a node ID for each supertag: the configured SUPERTAG_ID
+        is applied, and each Things tag with an ID in the tag index; other tags
+        are appended to the name as text. Checklist items get a '[x] ' / '[ ] '
+        prefix. A task re-sent after an edit is marked with CHANGED_TASK_MARKER.
+        """
+        supertags = [SUPERTAG_ID] if SUPERTAG_ID else []
+        unmapped = []
+        for tag in task.get('tags', []):
+            node_id = self.tag_index.get(tag)
+            if node_id:
+                supertags.append(node_id)
             else:
-                child.name = f"[ ] {child.name}"
-            node.add_child(child)
-            
+                unmapped.append(tana_tag(tag))
+        node = task_to_node(task, supertags=supertags, tags=False, dates=False, status=False)
+        if unmapped:
+            node.name = " ".join([node.name] + unmapped)
+        if task.get('changed') and CHANGED_TASK_MARKER:
+            node.name = f"{node.name} {CHANGED_TASK_MARKER}"
         return node
 
+    def _encode_task(self, task: Dict[str, Any]) -> EncodedNode:
+        """
+        Worker: the task's API JSON, from the conversion cache when the same
+        content was converted before with the same supertag IDs and marker.
+        """
+        if not self.conversion_cache.enabled:
+            return encode_node(self._convert_task_to_node(task))
+        key = self.conversion_cache.key(
+            task['uuid'], task.get('content_hash') or content_hash(task), "api", SUPERTAG_ID or "",
+            *(self.tag_index.get(tag) or "" for tag in task.get('tags', [])),
+            CHANGED_TASK_MARKER if task.get('changed') else "",
+        )
+        cached = self.conversion_cache.get(key)
+        if cached is not None:
+            return EncodedNode(cached[0].encode("utf-8"), cached[1])
+        encoded = encode_node(self._convert_task_to_node(task))
+        self.conversion_cache.put(key, encoded.json.decode("utf-8"), encoded.node_count)
+        return encoded
+
     def sync_inbox(self):
         """
         Syncs uncompleted tasks from Things Inbox to Tana Inbox.
         """
-        print("Syncing Inbox...")
-        tasks = self.things_provider.get_inbox_tasks()
-        self._process_tasks(tasks, TANA_INBOX_NODE_ID)
+        self.sync_scopes(["inbox"])
 
     def sync_today(self):
         """
         Syncs uncompleted tasks from Things Today to Tana Today (or Inbox if not configured).
         """
-        print("Syncing Today...")
-        tasks = self.things_provider.get_today_tasks()
-        target_node = TANA_TODAY_NODE_ID if TANA_TODAY_NODE_ID else TANA_INBOX_NODE_ID
-        self._process_tasks(tasks, target_node)
+        self.sync_scopes(["today"])
 
-    def _process_tasks(self, tasks: List[Dict[str, Any]], target_node_id: str):
-        nodes_to_send = []
-        task_ids_to_mark = []
+    def sync_scopes(self, scopes: List[str]):
+        """
+        Syncs several scopes in one pass, after sending what earlier runs left
+        in the outbox.
 
-        for task in tasks:
-            task_id = task.get('uuid')
-            status = task.get('status')
-            type_ = task.get('type')
+        The union of the scopes is read with a single provider query (each
+        scope from its own watermark) and streamed through the sync: each
+        task is routed to the Tana node of the first scope it is in as soon
+        as it is read, through a bounded queue (SYNC_QUEUE_SIZE) to that
+        node's sender, which converts it and posts each batch once it is
+        full. Reading and sending overlap, and memory stays flat however
+        large the library. Sends to different targets run in parallel under
+        the client's shared rate limit. History and outbox acknowledgements
+        are only updated on the calling thread, as the batch results of any
+        target come in, and watermarks at the end. A run waits for one in
+        another process to finish (SYNC_LOCK_FILE) and then sees its history.
+        """
+        scopes = expand_scopes(scopes)
+        start = time.monotonic()
+        counts: Dict[str, int] = {}
+        result = FAILURE
+        try:
+            with locked(SYNC_LOCK_FILE, WAITING_FOR_LOCK), instrumentation.span("sync", scopes=scopes):
+                result = self._sync(scopes, counts)
+        finally:
+            self._record_run(result, time.monotonic() - start, counts)
 
-            # Skip if already synced
-            if self.history_manager.has_been_synced(task_id):
-                continue
+    def _sync(self, scopes: List[str], counts: Dict[str, int]) -> str:
+        """
+        sync_scopes(); fills `counts` with the run's task counts by state and
+        returns its result: SUCCESS, QUEUED or FAILURE.
+        """
+        self._offline = not self._flush_outbox()
+        routes = routing_table(scopes)
+        print(f"Syncing {', '.join(scope_name(scope) for scope in scopes)}...")
+        run = SyncRun({scope: self._watermark(scope) for scope in scopes})
+        run.hold_for_tags = self.create_tags
+        error = None
+        with ThreadPoolExecutor(max_workers=len(set(routes.values())), thread_name_prefix="send") as senders:
+            for scope in scopes:
+                target = routes[scope]
+                if target not in run.sends:
+                    tasks: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(SYNC_QUEUE_SIZE)
+                    results: "queue.Queue[Optional[BatchOutcome]]" = queue.Queue()
+                    run.sends[target] = TargetSend(
+                        target, tasks, results, senders.submit(self._send, tasks, target, results))
+            try:
+                with instrumentation.span("plan"):
+                    self._plan(run, routes)
+                self._release(run)
+            except Exception as e:
+                error = e
+            finally:
+                for send in run.sends.values():
+                    self._put(run, send, None)
+                self._record_results(run, block=True)
+
+        counts.update(run.counts)
+        sent = sum(run.assigned.values())
+        synced, queued, skipped = sum(run.synced.values()), sum(run.queued.values()), sum(run.skipped.values())
+        counts.update(sent=synced, queued=queued, skipped=skipped, failed=sent - synced - queued - skipped)
+        if run.rehash:
+            self.history_manager.mark_many(run.rehash, run.rehash)
+        self.conversion_cache.save()
+        if DEBUG and self.conversion_cache.enabled:
+            print(f"Conversion cache: {self.conversion_cache.stats()}")
+        if error is not None:
+            print(f"Error fetching tasks: {error}")
+            return FAILURE
+
+        failed = False
+        for scope in scopes:
+            self._report_changes(scope, run.changed[scope])
+            if not self._report(scope, run.assigned[scope], run.synced[scope], run.queued[scope], run.skipped[scope]):
+                failed = True
+            elif run.trackers[scope].latest is not None:
+                self.sync_state.set_watermark(self._watermark_key(scope), run.trackers[scope].latest)
+        if failed:
+            return FAILURE
+        return QUEUED if queued or self._offline else SUCCESS
+
+    def _record_run(self, result: str, seconds: float, counts: Dict[str, int]):
+        """
+        Records a sync in self.metrics and, with METRICS_FILE set, rewrites
+        the metrics textfile.
+        """
+        self.metrics.record_run(result, seconds, counts, len(self.history_manager), len(self.outbox))
+        if METRICS_FILE:
+            try:
+                self.metrics.write_textfile(METRICS_FILE)
+            except OSError as e:
+                print(f"Could not write metrics to {METRICS_FILE}: {e}")
 
-            # Skip if completed or canceled (One-way sync of active tasks)
-            if status in ('completed', 'canceled'):
+    def _plan(self, run: SyncRun, routes: Dict[str, str]):
+        """
+        Reads the tasks of all scopes at once and decides where each goes,
+        passing it on to its target's sender as soon as it is read.
+        Each task's content hash is compared with the history: new tasks are
+        sent, unchanged ones dropped, and edited ones handled by the
+        CHANGED_TASKS policy. Tasks waiting in the outbox are dropped, and a
+        task in several scopes goes with the first. Also notes each scope's
+        latest modification time, its next watermark.
+        """
+        trackers, counts = run.trackers, run.counts
+        hash_task = instrumentation.wrap("task.hash", content_hash)
+        classify = instrumentation.wrap("history.lookup", self.history_manager.classify)
+        fetched = self.things_provider.get_tasks_in_scopes(run.watermarks, task_filter=self.task_filter)
+        for task in instrumentation.timed("things.fetch", fetched):
+            counts["fetched"] += 1
+            for scope in task['scopes']:
+                trackers[scope].observe(task)
+            # Python fallback for filter parts the provider couldn't push into its query
+            # (by default: skips completed/canceled tasks and projects)
+            if not self.task_filter.matches(task):
+                counts["filtered"] += 1
+                continue
+            if self.outbox.contains_task(task['uuid']):
+                counts["waiting"] += 1
+                continue
+            task['content_hash'] = hash_task(task)
+            state = classify(task['uuid'], task['content_hash'])
+            counts[state] += 1
+            scope = task['scopes'][0]
+            if state == CHANGED:
+                run.changed[scope].append(task.get('title', 'Untitled Task'))
+                if self.changed_tasks == "resend":
+                    task['changed'] = True
+                else:
+                    run.rehash[task['uuid']] = task['content_hash']
+                    continue
+            elif state == UNHASHED:
+                run.rehash[task['uuid']] = task['content_hash']
                 continue
-            
-            # Skip projects (unless we want to handle them differently)
-            if type_ == 'project':
+            elif state != NEW:
                 continue
+            run.assigned[scope] += 1
+            self._dispatch(run, routes[scope], task)
 
-            # Convert and prepare for sending
-            node = self._convert_task_to_node(task)
-            nodes_to_send.append(node)
-            task_ids_to_mark.append(task_id)
+        for state in (NEW, CHANGED, UNCHANGED, UNHASHED, "fetched", "filtered", "waiting"):
+            if counts[state]:
+                instrumentation.count(f"tasks.{state}", counts[state])
 
-        if not nodes_to_send:
-            print("No new tasks to sync.")
+    def _dispatch(self, run: SyncRun, target: str, task: Dict[str, Any]):
+        """
+        Passes a task on to its target's sender, or holds it back until its
+        missing tags are created, and records the batch results that have
+        come in meanwhile.
+        """
+        if run.hold_for_tags:
+            run.held.append((target, task))
+            if len(run.held) >= SYNC_QUEUE_SIZE:
+                self._release(run)
             return
+        self._put(run, run.sends[target], task)
+        self._record_results(run, block=False)
+
+    def _release(self, run: SyncRun):
+        """
+        Creates the missing tags of the held tasks in as few calls as the
+        API allows, then passes the tasks on.
+        """
+        held, run.held = run.held, []
+        if held and not self._offline:
+            self._create_missing_tags(task for _, task in held)
+        for target, task in held:
+            self._put(run, run.sends[target], task)
+        self._record_results(run, block=False)
 
-        # Send to Tana
-        success = self.tana_client.send_nodes(nodes_to_send, target_node_id)
-        
-        # Update history if successful
-        if success:
-            for tid in task_ids_to_mark:
-                self.history_manager.mark_as_synced(tid)
-            print(f"Synced {len(nodes_to_send)} tasks.")
-        else:
-            print("Failed to sync tasks.")
+    def _put(self, run: SyncRun, send: TargetSend, task: Optional[Dict[str, Any]]):
+        """
+        Queues a task (None: the end of them) for a sender, waiting while
+        its queue is full and recording results meanwhile. Gives up if the
+        sender stopped; its tasks then count as failed.
+        """
+        while True:
+            try:
+                send.tasks.put(task, timeout=0.05)
+                return
+            except queue.Full:
+                if send.future.done():
+                    return
+                self._record_results(run, block=False)
+
+    def _create_missing_tags(self, tasks: Iterable[Dict[str, Any]]):
+        """
+        Creates the tags of the tasks about to be sent that have no node ID
+        yet as supertags in Tana, in one call where the limits allow, and
+        saves the IDs Tana returns to the tag index.
+        """
+        missing: Dict[str, str] = {}
+        for task in tasks:
+            for tag in task.get('tags', []):
+                if tag not in self.tag_index:
+                    missing.setdefault(tag.casefold(), tag)
+        if not missing:
+            return
+        with instrumentation.span("tags.create", tags=len(missing)):
+            created = self.tana_client.create_supertags(list(missing.values()))
+        self.tag_index.update(created)
+        print(f"Created {len(created)} of {len(missing)} new tags as supertags in Tana.")
+
+    def flush_outbox(self) -> bool:
+        """
+        Sends the batches earlier runs left in the outbox, oldest first, and
+        marks their tasks as synced. Stops at the first batch Tana still
+        can't take. Returns True if the outbox was emptied.
+        """
+        with locked(SYNC_LOCK_FILE, WAITING_FOR_LOCK):
+            return self._flush_outbox()
+
+    def _flush_outbox(self) -> bool:
+        entries = self.outbox.pending()
+        if not entries:
+            return True
+        print(f"Sending {len(entries)} queued batches from the outbox...")
+        with instrumentation.span("outbox.flush", batches=len(entries)):
+            return self._flush(entries)
+
+    def _flush(self, entries: List[OutboxEntry]) -> bool:
+        for entry in entries:
+            # Sent before a crash that came between the history update and the acknowledgement
+            if all(self.history_manager.has_been_synced(task_id) for task_id in entry.task_ids):
+                self.outbox.ack(entry)
+                continue
+            status = self.tana_client.post(entry.body)
+            if status == RETRY_LATER:
+                print(f"Tana is still unreachable; {len(self.outbox)} batches stay in the outbox.")
+                return False
+            if status == SENT:
+                print(f"Successfully sent {len(entry.task_ids)} queued tasks to Tana ({entry.target}).")
+                self.history_manager.mark_many(entry.task_ids, entry.hashes)
+            else:
+                # Their scopes' watermarks already moved past them; read everything again next time
+                print(f"Dropped {len(entry.task_ids)} queued tasks that Tana rejected; the next sync re-reads all tasks.")
+                self.sync_state.reset()
+            self.outbox.ack(entry)
+        return True
+
+    def _watermark(self, scope: str) -> Optional[float]:
+        # An empty history (first run, or history reset) always needs a full read
+        if self.full or len(self.history_manager) == 0:
+            return None
+        return self.sync_state.get_watermark(self._watermark_key(scope), same_day_only=scope in DATE_DEPENDENT_SCOPES)
+
+    def _watermark_key(self, scope: str) -> str:
+        """
+        The scope's key in the sync state. A filtered run reads only some of
+        the scope's tasks, so it keeps a watermark of its own ('inbox?tags=work')
+        instead of moving the scope's past the tasks it left out.
+        """
+        fingerprint = self.task_filter.fingerprint()
+        return f"{scope}?{fingerprint}" if fingerprint else scope
+
+    def _send(self, tasks: "queue.Queue[Optional[Dict[str, Any]]]", target_node_id: str,
+              results: "queue.Queue[Optional[BatchOutcome]]"):
+        """
+        Worker: converts the tasks arriving on `tasks` (None ends them) and
+        sends them in as many calls as the API limits require, each batch as
+        soon as it is full, passing its outcome back through `results` (None
+        marks the end). Only the tasks of the batch being filled are kept.
+        """
+        pending: Deque[Dict[str, Any]] = deque()
+        encode = instrumentation.wrap("convert.api", self._encode_task)
+
+        def encoded() -> Iterator[EncodedNode]:
+            for task in iter(tasks.get, None):
+                pending.append(task)
+                yield encode(task)
+
+        try:
+            for batch, body in self.tana_client.batches(encoded(), target_node_id):
+                batch_tasks = [pending.popleft() for _ in range(batch.end - batch.start)]
+                results.put(self._send_batch(body, batch_tasks, target_node_id))
+        finally:
+            results.put(None)
+
+    def _send_batch(self, body: Optional[bytes], tasks: List[Dict[str, Any]], target_node_id: str) -> BatchOutcome:
+        """
+        Worker: writes a batch to the outbox, then sends it unless Tana is
+        already known to be unreachable in this run.
+        """
+        summary = [(task['uuid'], task['content_hash'], task['scopes'][0]) for task in tasks]
+        if body is None:
+            return BatchOutcome(False, False, summary, None, skipped=True)
+        task_ids = [task['uuid'] for task in tasks]
+        entry = self.outbox.add(target_node_id, task_ids, body.decode("utf-8"),
+                                {task['uuid']: task['content_hash'] for task in tasks})
+        status = RETRY_LATER if self._offline else self.tana_client.post(body)
+        if status == RETRY_LATER:
+            self._offline = True
+            return BatchOutcome(False, True, summary, entry)
+        if status == SENT:
+            print(f"Successfully sent {len(task_ids)} nodes to Tana ({target_node_id}).")
+        return BatchOutcome(status == SENT, False, summary, entry)
+
+    def _record_results(self, run: SyncRun, block: bool):
+        """
+        Records the batch outcomes that have come in from every target,
+        without waiting; with block set, every outcome until the senders are
+        done.
+
+        The tasks of each batch that went through are marked as soon as its
+        outcome arrives, so an interrupted run doesn't resend it, then the
+        batch is dropped from the outbox. Batches left in the outbox count
+        as done: they are sent before the next sync. Tasks in rejected
+        batches are read again next time.
+        """
+        while True:
+            running = [send for send in run.sends.values() if send.target not in run.finished]
+            for send in running:
+                while send.target not in run.finished:
+                    try:
+                        outcome = send.results.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._record_outcome(run, send, outcome)
+            running = [send for send in running if send.target not in run.finished]
+            if not block or not running:
+                return
+            # Wait a little for the first target still sending, then look at all of them again
+            try:
+                self._record_outcome(run, running[0], running[0].results.get(timeout=0.05))
+            except queue.Empty:
+                pass
+
+    def _record_outcome(self, run: SyncRun, send: TargetSend, outcome: Optional[BatchOutcome]):
+        """Records one batch outcome of a target's sender (None: the sender is done)."""
+        if outcome is None:
+            run.finished.add(send.target)
+            try:
+                send.future.result()
+            except Exception as e:
+                print(f"Error syncing to {send.target}: {e}")
+            return
+        if outcome.success:
+            self.history_manager.mark_many([uuid for uuid, _, _ in outcome.tasks],
+                                           {uuid: content for uuid, content, _ in outcome.tasks})
+            run.synced.update(scope for _, _, scope in outcome.tasks)
+            instrumentation.count("tasks.synced", len(outcome.tasks))
+        elif outcome.queued:
+            run.queued.update(scope for _, _, scope in outcome.tasks)
+            instrumentation.count("tasks.queued", len(outcome.tasks))
+            return
+        elif outcome.skipped:
+            # Left out of the history: sent again if it is edited (e.g. its notes shortened)
+            run.skipped.update(scope for _, _, scope in outcome.tasks)
+            instrumentation.count("tasks.skipped", len(outcome.tasks))
+            return
+        if outcome.entry is not None:
+            self.outbox.ack(outcome.entry)
+
+    def _report_changes(self, scope: str, titles: List[str]):
+        """
+        Prints the synced tasks of a scope that were edited in Things since.
+        """
+        if not titles:
+            return
+        name = scope_name(scope)
+        if self.changed_tasks == "resend":
+            print(f"{name}: re-sent {len(titles)} tasks edited since they were synced.")
+            return
+        print(f"{name}: {len(titles)} synced tasks were edited in Things since; not re-sent (CHANGED_TASKS=log):")
+        for title in titles:
+            print(f"  - {title}")
+
+    def _report(self, scope: str, tasks: int, synced: int, queued: int, skipped: int) -> bool:
+        """
+        Prints how the tasks a scope sent fared. Returns False if any failed;
+        skipped tasks don't count, as sending them again can't succeed.
+        """
+        name = scope_name(scope)
+        if not tasks:
+            print(f"{name}: no new tasks to sync.")
+            return True
+        if queued:
+            print(f"{name}: Tana is unreachable; {queued} tasks saved in the outbox for the next sync "
+                  f"(or run 'things-to-tana flush').")
+        if skipped:
+            print(f"{name}: skipped {skipped} tasks too large for one Tana API call; "
+                  f"they are sent once edited to fit (e.g. shorter notes or checklists).")
+        if synced + queued + skipped == tasks:
+            if synced:
+                print(f"{name}: synced {synced} tasks.")
+            return True
+        print(f"{name}: failed to sync {tasks - synced - queued} of {tasks} tasks.")
+        return False
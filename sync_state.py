@@ -0,0 +1,80 @@
+import datetime
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, Optional
+from storage import atomic_write_json
+from things_provider import modification_time
+
+SYNC_STATE_FILE = "sync_state.json"
+
+class SyncState:
+    """
+    Per-scope high-water marks of the Things userModificationDate.
+
+    A watermark is only advanced after a scope synced successfully, so the
+    next run can ask Things for rows modified since then. Each mark records
+    the day it was taken: lists such as Today change membership when the date
+    rolls over without any task being modified, so they can ask for
+    same-day marks only.
+    """
+
+    def __init__(self, file_path: str = SYNC_STATE_FILE):
+        self.file_path = file_path
+        self.watermarks: Dict[str, Dict[str, Any]] = self._load_state()
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.file_path):
+            return {}
+        try:
+            with open(self.file_path, 'r') as f:
+                return json.load(f).get("watermarks", {})
+        except (json.JSONDecodeError, IOError):
+            return {}
+
+    def _save_state(self):
+        try:
+            atomic_write_json(self.file_path, {"watermarks": self.watermarks})
+        except IOError as e:
+            print(f"Warning: Could not save sync state: {e}")
+
+    def get_watermark(self, scope: str, same_day_only: bool = False) -> Optional[float]:
+        mark = self.watermarks.get(scope)
+        if mark is None:
+            return None
+        if same_day_only and mark.get("day") != datetime.date.today().isoformat():
+            return None
+        return mark["modified"]
+
+    def reset(self):
+        """
+        Forgets every watermark, so the next sync reads all tasks again.
+        """
+        self.watermarks = {}
+        self._save_state()
+
+    def set_watermark(self, scope: str, modified: float):
+        self.watermarks[scope] = {
+            "modified": modified,
+            "day": datetime.date.today().isoformat(),
+        }
+        self._save_state()
+
+
+class ModificationTracker:
+    """
+    Passes tasks through unchanged while recording the latest modification
+    time seen, which becomes the scope's next watermark.
+    """
+
+    def __init__(self, latest: Optional[float] = None):
+        self.latest = latest
+
+    def track(self, tasks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for task in tasks:
+            self.observe(task)
+            yield task
+
+    def observe(self, task: Dict[str, Any]):
+        modified = modification_time(task)
+        if modified is not None and (self.latest is None or modified > self.latest):
+            self.latest = modified
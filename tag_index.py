@@ -0,0 +1,104 @@
+import json
+import os
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+from storage import atomic_write_json
+
+TAG_INDEX_FILE = "tag_ids.json"
+
+
+def tana_export_tags(export: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+    """
+    Yields (name, node ID) for each supertag defined in a Tana workspace
+    export (its JSON 'docs' whose _docType is tagDef), skipping trashed ones.
+    """
+    for doc in export.get("docs", []):
+        props = doc.get("props", {})
+        if props.get("_docType") != "tagDef" or not props.get("name") or not doc.get("id"):
+            continue
+        if str(props.get("_ownerId", "")).endswith("_TRASH"):
+            continue
+        yield props["name"], doc["id"]
+
+
+def read_tag_mapping(path: str) -> Dict[str, str]:
+    """
+    Reads tag name -> node ID pairs from a JSON file: a Tana workspace export,
+    a tag_ids.json, or a plain {"tag name": "node-id"} object.
+    Raises ValueError for anything else.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict) and isinstance(data.get("docs"), list):
+        return dict(tana_export_tags(data))
+    if isinstance(data, dict) and isinstance(data.get("tags"), dict):
+        data = data["tags"]
+    if not isinstance(data, dict) or not all(isinstance(v, str) for v in data.values()):
+        raise ValueError("expected a Tana export or a JSON object of tag names to node IDs")
+    return data
+
+
+class TagIndex:
+    """
+    Persistent map of Things tag names to Tana supertag node IDs, for API sync.
+
+    Loaded once per run from tag_ids.json; lookups are dict hits, with names
+    compared case-insensitively. Seeded from a mapping file or a Tana export
+    (things-to-tana --import-tags FILE), and added to with the node IDs Tana
+    returns for supertags it creates (TANA_CREATE_TAGS).
+    """
+
+    def __init__(self, file_path: str = TAG_INDEX_FILE):
+        self.file_path = file_path
+        # Keyed by casefolded name: (name as written, node ID)
+        self._tags: Dict[str, Tuple[str, str]] = {
+            name.casefold(): (name, node_id) for name, node_id in self._load().items()
+        }
+
+    def _load(self) -> Dict[str, str]:
+        if not os.path.exists(self.file_path):
+            return {}
+        try:
+            return read_tag_mapping(self.file_path)
+        except (ValueError, IOError) as e:
+            print(f"Warning: Could not read {self.file_path}: {e}")
+            return {}
+
+    def get(self, name: str) -> Optional[str]:
+        entry = self._tags.get(name.casefold())
+        return None if entry is None else entry[1]
+
+    def __contains__(self, name: str) -> bool:
+        return name.casefold() in self._tags
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    @property
+    def tags(self) -> Dict[str, str]:
+        return dict(self._tags.values())
+
+    def update(self, mapping: Mapping[str, str]) -> int:
+        """
+        Adds or replaces tag IDs and saves the index if anything changed.
+        Returns how many tags were added or changed.
+        """
+        changed = 0
+        for name, node_id in mapping.items():
+            if self.get(name) != node_id:
+                self._tags[name.casefold()] = (name, node_id)
+                changed += 1
+        if changed:
+            self._save()
+        return changed
+
+    def import_file(self, path: str) -> int:
+        """
+        Adds the tags of a mapping file or Tana export (see read_tag_mapping()).
+        """
+        return self.update(read_tag_mapping(path))
+
+    def _save(self):
+        try:
+            atomic_write_json(self.file_path, {"tags": self.tags})
+        except IOError as e:
+            print(f"Warning: Could not save tag IDs: {e}")
@@ -1,48 +1,284 @@
 import requests
 import json
-from typing import List, Dict, Any
-from config import TANA_API_TOKEN, TANA_API_ENDPOINT, DEBUG
+import time
+import instrumentation
+from typing import Any, Dict, Iterable, List, Iterator, NamedTuple, Optional, Sequence, Tuple, Union
+from requests.adapters import HTTPAdapter
+from config import (
+    TANA_API_TOKEN, TANA_API_ENDPOINT, DEBUG, TANA_MAX_NODES_PER_REQUEST, TANA_MAX_PAYLOAD_BYTES,
+    TANA_REQUESTS_PER_SECOND, TANA_MAX_RETRIES, TANA_RETRY_BASE_DELAY, TANA_RETRY_MAX_DELAY,
+    TANA_CIRCUIT_THRESHOLD, TANA_CIRCUIT_COOLDOWN, TANA_REQUEST_TIMEOUT, TANA_SCHEMA_NODE_ID,
+    TANA_SUPERTAG_DEFINITION_ID,
+)
+from metrics import SyncMetrics
 from models import TanaNode
+from payload_encoder import EncodedNode, encode_node, encode_payload, envelope
+from resilience import CircuitBreaker, RetryPolicy, TokenBucket, parse_retry_after
+
+# Rate-limited or transient server/gateway errors that are worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Connections kept alive per host
+POOL_SIZE = 4
+
+# Outcomes of TanaClient.post()
+SENT = "sent"
+RETRY_LATER = "retry-later"
+FAILED = "failed"
+
+
+class Batch(NamedTuple):
+    """
+    A run of consecutive nodes, nodes[start:end], sent in one API call.
+    """
+    start: int
+    end: int
+    node_count: int
+    size: int
+
+
+class BatchResult(NamedTuple):
+    start: int
+    end: int
+    success: bool
+
+
+def plan_batches(
+    nodes: Iterable[EncodedNode],
+    target_node_id: str,
+    max_nodes: int = TANA_MAX_NODES_PER_REQUEST,
+    max_bytes: int = TANA_MAX_PAYLOAD_BYTES,
+) -> Iterator[Batch]:
+    """
+    Splits encoded top-level node trees into consecutive batches that stay
+    within the API's node and payload-size limits. A tree is never split; one
+    that exceeds a limit on its own ends up alone in an oversized batch.
+    Sizes are exact: encode_payload() of a batch has batch.size bytes.
+    Nodes are read as needed: each batch is yielded once the next node
+    doesn't fit in it, or the nodes run out.
+    """
+    empty = len(envelope(target_node_id))
+    start, node_count, size, end = 0, 0, empty, 0
+    for i, node in enumerate(nodes):
+        end = i + 1
+        # +1 for the separating comma once the batch has a node
+        added = len(node.json) + (1 if i > start else 0)
+        if i > start and (node_count + node.node_count > max_nodes or size + added > max_bytes):
+            yield Batch(start, i, node_count, size)
+            start, node_count, size = i, 0, empty
+            added -= 1
+        node_count += node.node_count
+        size += added
+    if start < end:
+        yield Batch(start, end, node_count, size)
+
 
 class TanaClient:
-    def __init__(self, api_token: str = TANA_API_TOKEN):
+    def __init__(
+        self,
+        api_token: str = TANA_API_TOKEN,
+        endpoint: str = TANA_API_ENDPOINT,
+        max_nodes: int = TANA_MAX_NODES_PER_REQUEST,
+        max_payload_bytes: int = TANA_MAX_PAYLOAD_BYTES,
+        rate_limiter: Optional[TokenBucket] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        timeout: float = TANA_REQUEST_TIMEOUT,
+    ):
         self.api_token = api_token
-        self.endpoint = TANA_API_ENDPOINT
+        self.endpoint = endpoint
+        self.max_nodes = max_nodes
+        self.max_payload_bytes = max_payload_bytes
+        self.rate_limiter = rate_limiter or TokenBucket(TANA_REQUESTS_PER_SECOND)
+        self.retry_policy = retry_policy or RetryPolicy(TANA_MAX_RETRIES, TANA_RETRY_BASE_DELAY, TANA_RETRY_MAX_DELAY)
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(TANA_CIRCUIT_THRESHOLD, TANA_CIRCUIT_COOLDOWN)
+        self.timeout = timeout
+        # Where each call's status, response time and size are recorded, if set
+        self.metrics: Optional[SyncMetrics] = None
+        # One keep-alive connection pool for every call; retries are handled in post()
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=POOL_SIZE, max_retries=0))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=POOL_SIZE, max_retries=0))
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_token}",
+            "Content-Type": "application/json",
+        })
+
+    def batches(
+        self, nodes: Iterable[Union[TanaNode, EncodedNode]], target_node_id: str = 'INBOX'
+    ) -> Iterator[Tuple[Batch, Optional[bytes]]]:
+        """
+        Plans the calls needed to send nodes within the API limits, yielding
+        each batch with its request body (None for a tree too large to send)
+        as soon as it is full. Nodes may come from a generator: only those of
+        the batch being filled are kept. Each node is encoded once (nodes
+        already encoded, e.g. from the conversion cache, are used as they
+        are); batch bodies are joined from those bytes.
+        """
+        encode = instrumentation.wrap("tana.encode", encode_node)
+        join = instrumentation.wrap("tana.encode", encode_payload)
+        # The encoded nodes from window_start on, not yet in a yielded batch
+        window: List[EncodedNode] = []
+        window_start = 0
+
+        def encoded() -> Iterator[EncodedNode]:
+            for node in nodes:
+                node = node if isinstance(node, EncodedNode) else encode(node)
+                window.append(node)
+                yield node
+
+        for batch in plan_batches(encoded(), target_node_id, self.max_nodes, self.max_payload_bytes):
+            batch_nodes = window[:batch.end - window_start]
+            del window[:batch.end - window_start]
+            window_start = batch.end
+            if batch.node_count > self.max_nodes or batch.size > self.max_payload_bytes:
+                print(f"Skipping '{json.loads(batch_nodes[0].json)['name']}': too large for one Tana API call "
+                      f"({batch.node_count} nodes, {batch.size} bytes).")
+                yield batch, None
+            else:
+                yield batch, join(target_node_id, batch_nodes)
+
+    def send_batches(self, nodes: List[TanaNode], target_node_id: str = 'INBOX') -> Iterator[BatchResult]:
+        """
+        Sends nodes in as many calls as the API limits require, in order,
+        yielding each call's outcome as soon as it is known. Later batches are
+        still sent after one fails.
+        """
+        for batch, body in self.batches(nodes, target_node_id):
+            success = body is not None and self.post(body) == SENT
+            if success:
+                print(f"Successfully sent {batch.end - batch.start} nodes to Tana ({target_node_id}).")
+            yield BatchResult(batch.start, batch.end, success)
 
     def send_nodes(self, nodes: List[TanaNode], target_node_id: str = 'INBOX') -> bool:
         """
-        Sends a list of TanaNodes to the Tana Input API.
+        Sends a list of TanaNodes to the Tana Input API in a single call.
+        Use send_batches() for lists that may exceed the API limits.
         """
         if not nodes:
             return True
 
-        headers = {
-            "Authorization": f"Bearer {self.api_token}",
-            "Content-Type": "application/json"
-        }
+        if self.post(encode_payload(target_node_id, [encode_node(node) for node in nodes])) == SENT:
+            print(f"Successfully sent {len(nodes)} nodes to Tana ({target_node_id}).")
+            return True
+        return False
 
-        # Convert TanaNodes to API payload format
-        nodes_payload = [node.to_api_payload() for node in nodes]
+    def create_supertags(self, names: Sequence[str]) -> Dict[str, str]:
+        """
+        Creates supertags in the workspace schema, as few calls as the API
+        limits allow, and returns the node ID Tana gave each one created.
+        Stops at the first call that fails.
+        """
+        created: Dict[str, str] = {}
+        nodes = [TanaNode(name, supertags=[TANA_SUPERTAG_DEFINITION_ID]) for name in names]
+        for batch, body in self.batches(nodes, TANA_SCHEMA_NODE_ID):
+            if body is None:
+                continue
+            status, response = self._post(body)
+            if status != SENT:
+                break
+            children = response.get("children", []) if isinstance(response, dict) else []
+            for name, child in zip(names[batch.start:batch.end], children):
+                if isinstance(child, dict) and child.get("nodeId"):
+                    created[name] = child["nodeId"]
+        return created
+
+    def post(self, body: Union[bytes, str]) -> str:
+        """
+        POSTs a request body, retrying rate-limited and transient failures
+        with backoff (or as long as Retry-After asks).
 
-        payload = {
-            "targetNodeId": target_node_id,
-            "nodes": nodes_payload
-        }
+        Returns SENT, RETRY_LATER (retries used up, or the circuit breaker is
+        open: the same body can be sent again later) or FAILED (rejected by
+        the API, or the outcome is unknown).
+        """
+        return self._post(body)[0]
 
+    def _post(self, body: Union[bytes, str]) -> Tuple[str, Any]:
+        """
+        post(), also returning the decoded JSON response of a call that went
+        through (None otherwise, or if it wasn't JSON).
+        """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
         # Debug: Print payload only if DEBUG=true
         if DEBUG:
+            payload = json.loads(body)
             print(f"\n[DEBUG] Sending payload to Tana API:")
             print(json.dumps(payload, indent=2))
-            print(f"[DEBUG] Target node: {target_node_id}")
-            print(f"[DEBUG] Number of nodes: {len(nodes_payload)}\n")
+            print(f"[DEBUG] Target node: {payload['targetNodeId']}")
+            print(f"[DEBUG] Number of nodes: {len(payload['nodes'])}\n")
+
+        with instrumentation.span("tana.post", bytes=len(body)) as span:
+            status, response = self._send(body)
+            span.set(status=status)
+        return status, response
 
+    def _send(self, body: bytes) -> Tuple[str, Any]:
+        retries = self.retry_policy.max_retries
+        for attempt in range(retries + 1):
+            if not self.circuit_breaker.allow():
+                print("Tana API is failing repeatedly; not calling it until the cooldown has passed.")
+                return RETRY_LATER, None
+            with instrumentation.timer("tana.rate_limit_wait"):
+                self.rate_limiter.acquire()
+            retry_after = None
+            instrumentation.count("tana.requests")
+            instrumentation.count("tana.bytes_sent", len(body))
+            try:
+                response = self._request(body)
+                if response.status_code < 500:
+                    # The service answered; a 4xx or 429 is about this call, not an outage
+                    self.circuit_breaker.record_success()
+            except requests.exceptions.ReadTimeout as e:
+                # Tana may have created the nodes already; retrying could duplicate them
+                print(f"Error sending data to Tana: {e}")
+                self.circuit_breaker.record_failure()
+                return FAILED, None
+            except requests.exceptions.ConnectionError as e:
+                reason = f"connection failed ({e.__class__.__name__})"
+                self.circuit_breaker.record_failure()
+            except requests.exceptions.RequestException as e:
+                print(f"Error sending data to Tana: {e}")
+                return FAILED, None
+            else:
+                if response.ok:
+                    try:
+                        return SENT, response.json()
+                    except ValueError:
+                        return SENT, None
+                if response.status_code not in RETRY_STATUSES:
+                    print(f"Error sending data to Tana: {response.status_code} {response.reason}")
+                    print(f"Response content: {response.text}")
+                    return FAILED, None
+                reason = f"returned {response.status_code}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if response.status_code == 429:
+                    # Rate limited, not down: hold back every caller instead of tripping the breaker
+                    self.rate_limiter.defer(retry_after or 0)
+                else:
+                    self.circuit_breaker.record_failure()
+            finally:
+                # Whatever the outcome, a trial call must not keep the circuit open for good
+                self.circuit_breaker.release()
+
+            if attempt == retries:
+                print(f"Error sending data to Tana: API {reason}, giving up after {retries} retries.")
+                return RETRY_LATER, None
+            delay = retry_after if retry_after is not None else self.retry_policy.delay(attempt)
+            print(f"Tana API {reason}; retrying in {delay:.1f}s ({attempt + 1}/{retries}).")
+            instrumentation.count("tana.retries")
+            time.sleep(delay)
+        return RETRY_LATER, None
+
+    def _request(self, body: bytes) -> requests.Response:
+        """One POST of body, recorded in self.metrics."""
+        start = time.perf_counter()
+        status = "error"
         try:
-            response = requests.post(self.endpoint, headers=headers, json=payload)
-            response.raise_for_status()
-            print(f"Successfully sent {len(nodes)} nodes to Tana ({target_node_id}).")
-            return True
-        except requests.exceptions.RequestException as e:
-            print(f"Error sending data to Tana: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"Response content: {e.response.text}")
-            return False
+            with instrumentation.timer("tana.http"):
+                response = self.session.post(self.endpoint, data=body, timeout=self.timeout)
+            status = str(response.status_code)
+            return response
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_request(status, time.perf_counter() - start, len(body))
@@ -1,61 +1,95 @@
-from dataclasses import dataclass, field
-from typing import List, Optional
-
-@dataclass
-class TanaNode:
-    text: str
-    children: List['TanaNode'] = field(default_factory=list)
-    supertags: List[str] = field(default_factory=list)
-    checked: Optional[bool] = None  # None = no checkbox, False = [ ], True = [x]
-    
-    def add_child(self, child: 'TanaNode'):
-        self.children.append(child)
-        return self
-    
-    def add_supertag(self, tag: str):
-        """Add a supertag to this node."""
-        if tag not in self.supertags:
-            self.supertags.append(tag)
-        return self
-
-    def to_string(self, indent_level: int = 0) -> str:
-        indent = "  " * indent_level
-        checkbox = ""
-        if self.checked is not None:
-            checkbox = "[x] " if self.checked else "[ ] "
-        
-        # Format supertags - in Tana paste format, supertags come after checkbox, before text
-        tags = ""
-        for tag in self.supertags:
-            tags += f" {tana_tag(tag)}"
-        
-        # Build the node line: checkbox, then tags, then text
-        # Join parts with proper spacing
-        parts = []
-        if checkbox:
-            parts.append(checkbox.rstrip())  # Remove trailing space, we'll add it back
-        if self.text:
-            parts.append(self.text)
-        if tags:
-            parts.append(tags.strip())  # Remove leading/trailing spaces
-        
-        # Join with single spaces, filtering out empty strings
-        node_line = " ".join(p for p in parts if p)
-        
-        lines = [f"{indent}- {node_line}"]
-        for child in self.children:
-            lines.append(child.to_string(indent_level + 1))
-        return "\n".join(lines)
-
-def to_tana_paste(nodes: List[TanaNode]) -> str:
+import functools
+import io
+from typing import Callable, Iterable, Iterator, List, TextIO, Tuple, Union
+from models import TanaNode
+
+# Indent prefixes ("- " included) by depth, grown as deeper nodes are rendered
+_BULLETS = ["- "]
+
+
+def _bullet(depth: int) -> str:
+    while len(_BULLETS) <= depth:
+        _BULLETS.append("  " * len(_BULLETS) + "- ")
+    return _BULLETS[depth]
+
+
+def _node_line(node: TanaNode) -> str:
+    # Checkbox, then text, then supertags
+    parts = []
+    if node.checked is not None:
+        parts.append("[x]" if node.checked else "[ ]")
+    if node.name:
+        parts.append(node.name)
+    parts.extend(tana_tag(tag) for tag in node.supertags)
+    return " ".join(parts)
+
+
+def _write_description(node: TanaNode, depth: int, write: Callable[[str], object]):
+    # Tana Paste has no description syntax: it goes first among the children
+    if node.description:
+        write("\n")
+        write(_bullet(depth + 1))
+        write(node.description)
+
+
+def _write_tree(node: TanaNode, depth: int, write: Callable[[str], object], separator: str):
+    """
+    Writes a node and its descendants depth-first with an explicit stack of
+    child iterators, so deep trees don't hit the recursion limit and no
+    subtree string is built. Every line is preceded by `separator`.
+    """
+    write(separator)
+    write(_bullet(depth))
+    write(_node_line(node))
+    _write_description(node, depth, write)
+    stack: List[Tuple[Iterator[TanaNode], int]] = [(iter(node.children), depth + 1)]
+    while stack:
+        children, child_depth = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            continue
+        write("\n")
+        write(_bullet(child_depth))
+        write(_node_line(child))
+        _write_description(child, child_depth, write)
+        if child.children:
+            stack.append((iter(child.children), child_depth + 1))
+
+
+def to_tana_paste_stream(nodes: Iterable[Union[TanaNode, str]], fp: TextIO):
+    """
+    Writes TanaNodes to a text stream (a file, sys.stdout, io.StringIO) as
+    Tana Paste, %%tana%% first. Nodes can be any iterable, so a generator
+    renders a huge export with memory for one tree at a time. A string is
+    taken as a tree already rendered by node_to_paste() and written as is.
+    """
+    write = fp.write
+    write("%%tana%%")
+    for node in nodes:
+        if isinstance(node, str):
+            write("\n")
+            write(node)
+        else:
+            _write_tree(node, 0, write, "\n")
+
+
+def node_to_paste(node: TanaNode, indent_level: int = 0) -> str:
+    """
+    Emits a node tree as Tana Paste lines.
+    """
+    output = io.StringIO()
+    _write_tree(node, indent_level, output.write, "")
+    return output.getvalue()
+
+def to_tana_paste(nodes: List[Union[TanaNode, str]]) -> str:
     """
     Converts a list of TanaNodes into a Tana Paste formatted string.
     Prepends %%tana%% to the output.
     """
-    output = ["%%tana%%"]
-    for node in nodes:
-        output.append(node.to_string(0))
-    return "\n".join(output)
+    output = io.StringIO()
+    to_tana_paste_stream(nodes, output)
+    return output.getvalue()
 
 def tana_date(date_str: str) -> str:
     """
@@ -64,6 +98,7 @@ def tana_date(date_str: str) -> str:
     """
     return f"[[date:{date_str}]]"
 
+@functools.lru_cache(maxsize=1024)
 def tana_tag(tag_name: str) -> str:
     """
     Formats a tag. Handles multi-word tags by wrapping in [[ ]].
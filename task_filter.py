@@ -0,0 +1,113 @@
+import argparse
+import datetime
+from dataclasses import dataclass, fields
+from typing import Any, Dict, FrozenSet, Optional
+
+STATUSES = ('incomplete', 'completed', 'canceled')
+TYPES = ('to-do', 'project', 'heading')
+
+
+@dataclass(frozen=True)
+class TaskFilter:
+    """
+    Declarative description of which Things tasks to sync.
+
+    Providers push as much of it as they can into their queries (SQL WHERE
+    clauses for ThingsDatabaseProvider, things.py keyword arguments for
+    ThingsProvider); matches() is the Python fallback for the rest.
+
+    The default selects active to-dos, which is what both sync modes want.
+    Dates are ISO YYYY-MM-DD strings and ranges are inclusive. A task matches
+    `tags` if it has any of them; `area` and `project` match by title.
+    """
+    statuses: FrozenSet[str] = frozenset({'incomplete'})
+    types: FrozenSet[str] = frozenset({'to-do'})
+    tags: FrozenSet[str] = frozenset()
+    area: Optional[str] = None
+    project: Optional[str] = None
+    deadline_after: Optional[str] = None
+    deadline_before: Optional[str] = None
+    start_after: Optional[str] = None
+    start_before: Optional[str] = None
+
+    def matches(self, task: Dict[str, Any]) -> bool:
+        if self.statuses and task.get('status') not in self.statuses:
+            return False
+        if self.types and task.get('type') not in self.types:
+            return False
+        if self.tags and self.tags.isdisjoint(task.get('tags') or ()):
+            return False
+        if self.area is not None and task.get('area_title') != self.area:
+            return False
+        if self.project is not None and task.get('project_title') != self.project:
+            return False
+        if not _in_range(task.get('deadline'), self.deadline_after, self.deadline_before):
+            return False
+        if not _in_range(task.get('start_date'), self.start_after, self.start_before):
+            return False
+        return True
+
+    def fingerprint(self) -> str:
+        """
+        The fields that differ from the default filter, as a stable string
+        (e.g. 'tags=errand,work&area=Home'); '' for the default filter.
+        """
+        default = TaskFilter()
+        parts = []
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if value == getattr(default, field.name):
+                continue
+            if isinstance(value, frozenset):
+                value = ",".join(sorted(value))
+            parts.append(f"{field.name}={value}")
+        return "&".join(parts)
+
+
+def _in_range(value: Optional[str], after: Optional[str], before: Optional[str]) -> bool:
+    if after is None and before is None:
+        return True
+    if not value:
+        return False
+    return (after is None or value >= after) and (before is None or value <= before)
+
+
+def _iso_date(value: str) -> str:
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}', expected YYYY-MM-DD")
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the task filter options to a CLI parser.
+    """
+    group = parser.add_argument_group("task filters")
+    group.add_argument("--status", action="append", choices=STATUSES,
+                       help="Only tasks with this status (repeatable, default: incomplete)")
+    group.add_argument("--type", action="append", choices=TYPES, dest="types",
+                       help="Only items of this type (repeatable, default: to-do)")
+    group.add_argument("--tag", action="append", dest="tags", metavar="TAG",
+                       help="Only tasks with this tag (repeatable, matches any)")
+    group.add_argument("--area", metavar="TITLE", help="Only tasks in this area")
+    group.add_argument("--project", metavar="TITLE", help="Only tasks in this project")
+    group.add_argument("--deadline-after", type=_iso_date, metavar="YYYY-MM-DD")
+    group.add_argument("--deadline-before", type=_iso_date, metavar="YYYY-MM-DD")
+    group.add_argument("--start-after", type=_iso_date, metavar="YYYY-MM-DD")
+    group.add_argument("--start-before", type=_iso_date, metavar="YYYY-MM-DD")
+
+
+def filter_from_args(args: argparse.Namespace) -> TaskFilter:
+    defaults = TaskFilter()
+    return TaskFilter(
+        statuses=frozenset(args.status) if args.status else defaults.statuses,
+        types=frozenset(args.types) if args.types else defaults.types,
+        tags=frozenset(args.tags or ()),
+        area=args.area,
+        project=args.project,
+        deadline_after=args.deadline_after,
+        deadline_before=args.deadline_before,
+        start_after=args.start_after,
+        start_before=args.start_before,
+    )
@@ -0,0 +1,77 @@
+import os
+from unittest.mock import patch
+from conversion_cache import ConversionCache
+from fake_tana_server import FakeTanaServer
+from history_manager import HISTORY_FILE
+from tana_formatter import to_tana_paste
+from things_to_tana import convert_task_to_node, paste_fragment
+
+T0 = 1_700_000_000.0
+
+
+def test_least_recently_used_entries_are_evicted_past_the_size_limit(tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache.json"), max_bytes=25)
+    cache.put("a", "x" * 9)
+    cache.put("b", "y" * 9)
+    assert cache.get("a") == ("x" * 9, 1)
+
+    cache.put("c", "z" * 9)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats() == {"hits": 3, "misses": 1, "evictions": 1, "entries": 2, "bytes": 20}
+
+
+def test_entries_persist_in_recency_order(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ConversionCache(path, max_bytes=1000)
+    cache.put("a", "first", 2)
+    cache.put("b", "second")
+    cache.get("a")
+    cache.save()
+
+    reopened = ConversionCache(path, max_bytes=12)
+    assert reopened.get("a") == ("first", 2)
+    assert reopened.get("b") is None
+
+
+def test_a_zero_limit_turns_the_cache_off(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ConversionCache(path, max_bytes=0)
+    cache.put("a", "text")
+    cache.save()
+
+    assert cache.get("a") is None
+    assert not os.path.exists(path)
+
+
+def test_cached_paste_matches_a_fresh_render(tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache.json"), max_bytes=1 << 20)
+    task = {'uuid': 'T1', 'title': 'Buy milk', 'status': 'incomplete', 'tags': ['errand'],
+            'notes': 'Oat', 'checklist': [{'title': 'Check fridge', 'status': 'completed'}]}
+
+    first = paste_fragment(task, cache)
+    second = paste_fragment(dict(task), cache)
+    completed = paste_fragment(dict(task, status='completed'), cache)
+
+    assert second == first
+    assert to_tana_paste([first]) == to_tana_paste([convert_task_to_node(task)])
+    assert completed.startswith("- [x] ")
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_resent_tasks_reuse_their_api_json(things_db, make_service):
+    things_db.add_task("Buy milk", start="Inbox", tags=["errand"], notes="Oat", modified=T0)
+    things_db.commit()
+
+    with FakeTanaServer() as server, \
+         patch('sync_service.ConversionCache', lambda: ConversionCache(max_bytes=1 << 20)):
+        make_service(things_db.path, server).sync_inbox()
+        # With the history gone, the same task goes out again
+        os.remove(HISTORY_FILE)
+        service = make_service(things_db.path, server)
+        service.sync_inbox()
+
+    first, second = server.requests
+    assert second == first
+    assert (service.conversion_cache.hits, service.conversion_cache.misses) == (1, 0)
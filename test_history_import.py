@@ -0,0 +1,128 @@
+import io
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+from history_import import (
+    Fingerprint, export_fingerprint, import_file, import_history, iter_json_array, iter_nodes, paste_fingerprint,
+)
+from history_manager import HistoryManager, UNCHANGED, content_hash
+from sync_service import SyncService
+from tana_client import SENT
+from tana_formatter import to_tana_paste
+from things_database import ThingsDatabaseProvider
+from things_to_tana import convert_task_to_node, main
+
+T0 = 1_700_000_000.0
+
+
+def test_json_array_is_streamed_across_chunk_boundaries():
+    export = {
+        "formatVersion": 1,
+        "editors": [["someone@example.com", 0]],
+        "docs": [{"id": f"n{i}", "props": {"name": f"Node {i} ✓", "created": 1700000000000 + i}} for i in range(50)],
+        "lastTxid": 123456789,
+    }
+    text = json.dumps(export, indent=1, ensure_ascii=False)
+
+    for chunk_size in (1, 7, 1 << 20):
+        assert list(iter_json_array(io.StringIO(text), "docs", chunk_size)) == export["docs"]
+    assert list(iter_json_array(io.StringIO('{"docs": []}'), "docs")) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"docs": [{"id": 1}, {"id"'), "docs", 4))
+
+
+def test_nodes_are_fingerprinted_as_sync_wrote_them():
+    assert paste_fingerprint("[ ] Buy  milk [[date:2025-11-30]] #task #[[deep work]]") == \
+        Fingerprint("Buy milk", "2025-11-30")
+    assert paste_fingerprint("[x] Call #1 back #canceled #task") == Fingerprint("Call #1 back", None)
+    assert paste_fingerprint("Plan trip things:///show?id=ABC123").uuid == "ABC123"
+    assert paste_fingerprint("Plan trip #[[task (Tanarian Brain)]] #home", {"task (Tanarian Brain)"}) == \
+        Fingerprint("Plan trip", None, tagged=True)
+    assert export_fingerprint(
+        'Buy milk <span data-inlineref-date="{&quot;dateTimeString&quot;:&quot;2025-11-30&quot;}"></span>'
+    ) == Fingerprint("Buy milk", "2025-11-30")
+
+
+def tagged(doc_id, name, tag_id="TASK"):
+    """A node with a supertag, and its metanode and tag tuple, as a Tana export has them."""
+    return [
+        {"id": doc_id, "props": {"name": name, "_metaNodeId": f"{doc_id}-meta"}},
+        {"id": f"{doc_id}-meta", "props": {"_docType": "metanode", "_ownerId": doc_id}, "children": [f"{doc_id}-tag"]},
+        {"id": f"{doc_id}-tag", "props": {"_docType": "tuple", "_ownerId": f"{doc_id}-meta"}, "children": ["SYS_A13", tag_id]},
+    ]
+
+
+def test_tasks_are_matched_by_link_then_title_and_date(tmp_path):
+    tasks = [
+        {'uuid': 'a', 'title': 'Buy milk', 'deadline': '2025-11-30'},
+        {'uuid': 'b', 'title': 'Buy milk', 'deadline': '2025-12-01'},
+        {'uuid': 'c', 'title': 'Call mom'},
+        {'uuid': 'd', 'title': 'Call mom'},
+        {'uuid': 'e', 'title': 'Renamed in Tana'},
+        {'uuid': 'f', 'title': 'Water plants'},
+        {'uuid': 'g', 'title': 'Meeting notes'},
+        {'uuid': 'h', 'title': 'Pay rent'},
+    ]
+    export = {"docs": [
+        {"id": "1", "props": {"name": 'Buy milk <span data-inlineref-date="{&quot;dateTimeString&quot;:&quot;2025-11-30&quot;}"></span>'}},
+        *tagged("2", "Call mom"),
+        {"id": "3", "props": {"name": "Something else", "description": "things:///show?id=e"}},
+        {"id": "4", "props": {"name": "Buy milk", "_docType": "tagDef"}},
+        {"id": "5", "props": {"name": "Call mom", "_ownerId": "ws_TRASH"}},
+        # Tagged by the tag's name, through its tagDef
+        *tagged("6", "Water plants", tag_id="TASKDEF"),
+        {"id": "TASKDEF", "props": {"name": "todo", "_docType": "tagDef"}},
+        # Untagged and undated: a page that only shares a task's title
+        {"id": "7", "props": {"name": "Meeting notes"}},
+        # Two tagged nodes with one task's title
+        *tagged("8", "Pay rent"),
+        *tagged("9", "Pay rent"),
+    ]}
+    path = tmp_path / "workspace.json"
+    path.write_text(json.dumps(export))
+    history = HistoryManager(str(tmp_path / "history.json"))
+
+    result = import_file(str(path), tasks, history, tags={"TASK", "todo"})
+
+    assert result == (7, 3, 3)
+    assert history.synced_ids == {"a", "e", "f"}
+    assert history.classify("a", content_hash(tasks[0])) == UNCHANGED
+
+
+def test_untagged_paste_nodes_match_only_with_a_date(tmp_path):
+    tasks = [{'uuid': 'a', 'title': 'Buy milk'}, {'uuid': 'b', 'title': 'Call mom', 'deadline': '2025-11-30'},
+             {'uuid': 'c', 'title': 'Read', 'deadline': '2025-11-30'}]
+    paste = "%%tana%%\n- [ ] Buy milk #[[task list]]\n- Call mom [[date:2025-11-30]]\n- Read\n"
+    path = tmp_path / "backlog.txt"
+    path.write_text(paste)
+
+    assert import_file(str(path), tasks, HistoryManager(str(tmp_path / "h.json")), tags={"task"}) == (3, 1, 0)
+    assert HistoryManager(str(tmp_path / "h.json")).synced_ids == {"b"}
+    assert import_file(str(path), tasks, HistoryManager(str(tmp_path / "h2.json")), tags={"task list"}).matched == 2
+
+
+def test_imported_paste_file_keeps_the_first_api_sync_from_resending(things_db, tmp_path):
+    for i in range(3):
+        things_db.add_task(f"Pasted {i}", start="Inbox", tags=["home"], modified=T0)
+    things_db.commit()
+    tasks = list(ThingsDatabaseProvider(things_db.path).get_all_tasks())
+    (tmp_path / "backlog.txt").write_text(to_tana_paste([convert_task_to_node(task) for task in tasks]) + "\n")
+    things_db.add_task("Not pasted", start="Inbox", modified=T0)
+    things_db.commit()
+
+    with patch('things_to_tana.create_things_provider', return_value=ThingsDatabaseProvider(things_db.path)), \
+         patch('sys.argv', ['things-to-tana', '--import-history', 'backlog.txt']):
+        main()
+
+    with patch('sync_service.create_things_provider', return_value=ThingsDatabaseProvider(things_db.path)):
+        service = SyncService()
+    service.tana_client.post = MagicMock(return_value=SENT)
+    service.sync_inbox()
+    (body,) = [call.args[0] for call in service.tana_client.post.call_args_list]
+    assert [node["name"] for node in json.loads(body)["nodes"]] == ["Not pasted"]
+
+
+def test_paste_nodes_are_read_line_by_line(tmp_path):
+    paste = "%%tana%%\n- [ ] One #task\n  - note things:///show?id=X1\n- Two\n"
+    assert list(iter_nodes(io.StringIO(paste))) == [Fingerprint("One", None, "X1"), Fingerprint("Two", None)]
+    assert import_history(iter([]), [], HistoryManager(str(tmp_path / "history.json"))) == (0, 0, 0)
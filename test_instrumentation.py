@@ -0,0 +1,104 @@
+import json
+import threading
+import pytest
+from unittest.mock import patch
+import instrumentation
+from fake_tana_server import FakeTanaServer
+from things_to_tana import main
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture(autouse=True)
+def recording_off():
+    instrumentation.disable()
+    yield
+    instrumentation.disable()
+
+
+def test_disabled_calls_record_nothing():
+    assert instrumentation.span("a", x=1) is instrumentation.NULL_SPAN
+    assert instrumentation.timer("b") is instrumentation.NULL_SPAN
+    with instrumentation.span("a") as span:
+        span.set(status="sent")
+    instrumentation.count("c")
+    items = [1, 2, 3]
+    assert list(instrumentation.timed("d", items)) == items
+    assert instrumentation.wrap("e", len) is len
+    assert instrumentation.active() is None
+
+
+def test_spans_and_counters_are_aggregated_across_threads():
+    recorder = instrumentation.enable()
+
+    def work():
+        for _ in range(5):
+            with instrumentation.span("post", bytes=10) as span:
+                span.set(status="sent")
+            with instrumentation.timer("hash"):
+                pass
+            instrumentation.count("bytes", 10)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert list(instrumentation.timed("fetch", range(7))) == list(range(7))
+    instrumentation.disable()
+
+    assert recorder.timings["post"][0] == recorder.timings["hash"][0] == 20
+    assert recorder.timings["fetch"][0] == 1
+    assert recorder.counters == {"bytes": 200, "fetch": 7}
+    events = recorder.trace()["traceEvents"]
+    # Timers are aggregated only
+    assert {event["name"] for event in events} == {"post"}
+    assert len({event["tid"] for event in events}) == 4
+    assert all(event["ph"] == "X" and event["dur"] >= 0 and event["args"] == {"bytes": 10, "status": "sent"}
+               for event in events)
+    summary = recorder.summary()
+    assert "post" in summary and "bytes" in summary
+
+
+def test_a_profiled_sync_accounts_for_every_stage(things_db, make_service):
+    for i in range(3):
+        things_db.add_task(f"Task {i}", start="Inbox", modified=T0)
+    things_db.commit()
+
+    recorder = instrumentation.enable()
+    with FakeTanaServer(fail_calls={1}) as server:
+        make_service(things_db.path, server, max_retries=2).sync_inbox()
+    instrumentation.disable()
+
+    timings, counters = recorder.timings, recorder.counters
+    for stage in ("sync", "plan", "things.fetch", "task.hash", "history.lookup", "convert.api",
+                  "tana.encode", "tana.post", "tana.http", "outbox.add", "history.commit"):
+        assert stage in timings, stage
+    assert counters["tasks.new"] == counters["tasks.synced"] == counters["things.fetch"] == 3
+    # The conversion cache is off by default and not consulted
+    assert "conversion_cache.misses" not in counters
+    assert counters["tana.retries"] == 1
+    assert counters["tana.requests"] == 2
+    (post,) = [event for event in recorder.trace()["traceEvents"] if event["name"] == "tana.post"]
+    assert post["args"]["status"] == "sent"
+    assert counters["tana.bytes_sent"] == 2 * post["args"]["bytes"]
+
+
+def test_cli_profile_prints_a_summary_and_writes_a_trace(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    tasks = [{'title': 'Task 1', 'type': 'to-do', 'status': 'incomplete', 'uuid': '123'}]
+
+    with patch('things_to_tana.is_api_token_valid', return_value=False), \
+         patch('things_to_tana.get_things_tasks', return_value=tasks), \
+         patch('pyperclip.copy'), \
+         patch('sys.argv', ['things-to-tana', 'inbox', '--profile-trace', 'trace.json']):
+        main()
+
+    out = capsys.readouterr().out
+    assert "Profile:" in out and "convert.paste" in out
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    assert {"run", "paste.render", "clipboard.copy"} <= {event["name"] for event in trace["traceEvents"]}
+    # Tasks are read and converted as they are rendered: timed per task, not traced
+    assert {"things.fetch", "convert.paste"} <= set(trace["otherData"]["timings"])
+    assert "conversion_cache.misses" not in trace["otherData"]["counters"]
+    assert instrumentation.active() is None
@@ -0,0 +1,123 @@
+import stat
+import urllib.error
+import urllib.request
+import pytest
+from unittest.mock import patch
+from fake_tana_server import FakeTanaServer
+from metrics import FAILURE, QUEUED, SUCCESS, SyncMetrics
+
+T0 = 1_700_000_000.0
+
+
+def samples(text):
+    """{'name{labels}': value} of a textfile."""
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line and not line.startswith("#")}
+
+
+def test_histograms_are_cumulative_and_counters_survive_a_reload(tmp_path):
+    metrics = SyncMetrics()
+    metrics.record_request("200", 0.3, 100)
+    metrics.record_request("503", 12.0, 50)
+    metrics.record_run(SUCCESS, 2.0, {"fetched": 3, "sent": 2}, history_size=2, outbox_size=0, finished=T0)
+    text = metrics.render()
+
+    values = samples(text)
+    assert "# TYPE things_to_tana_http_request_duration_seconds histogram" in text
+    assert values['things_to_tana_http_request_duration_seconds_bucket{le="0.25"}'] == 0
+    assert values['things_to_tana_http_request_duration_seconds_bucket{le="0.5"}'] == 1
+    assert values['things_to_tana_http_request_duration_seconds_bucket{le="+Inf"}'] == 2
+    assert values['things_to_tana_http_request_duration_seconds_sum'] == 12.3
+    assert values['things_to_tana_http_requests_total{status="503"}'] == 1
+    assert values['things_to_tana_http_request_bytes_total'] == 150
+    assert values['things_to_tana_last_run_tasks{state="sent"}'] == 2
+    assert values['things_to_tana_last_success_timestamp_seconds'] == T0
+
+    path = str(tmp_path / "things_to_tana.prom")
+    metrics.write_textfile(path)
+    reloaded = SyncMetrics()
+    reloaded.load(path)
+    reloaded.record_run(FAILURE, 1.0, {"fetched": 1}, history_size=2, outbox_size=0, finished=T0 + 60)
+
+    # Counters, histograms and the last success carry over; other gauges are this run's
+    assert reloaded.get("sync_runs_total", result=SUCCESS) == reloaded.get("sync_runs_total", result=FAILURE) == 1
+    assert reloaded.get("sync_duration_seconds_count") == 2
+    assert reloaded.get("tasks_total", state="fetched") == 4
+    assert reloaded.get("http_request_bytes_total") == 150
+    assert reloaded.get("last_success_timestamp_seconds") == T0
+    assert reloaded.get("last_run_timestamp_seconds") == T0 + 60
+    assert reloaded.get("last_run_tasks", state="sent") == 0
+
+
+def test_the_textfile_is_readable_by_other_users(tmp_path, monkeypatch):
+    """A node_exporter textfile collector often runs as another user"""
+    monkeypatch.setattr("storage._UMASK", 0o022)
+    path = tmp_path / "things_to_tana.prom"
+    SyncMetrics().write_textfile(str(path))
+    assert stat.S_IMODE(path.stat().st_mode) == 0o644
+
+    # A mode set on the file is kept when it is rewritten
+    path.chmod(0o640)
+    SyncMetrics().write_textfile(str(path))
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+
+def test_scheduled_syncs_write_the_textfile(things_db, tmp_path, make_service):
+    path = str(tmp_path / "things_to_tana.prom")
+    for i in range(3):
+        things_db.add_task(f"Task {i}", start="Inbox", modified=T0)
+    things_db.commit()
+
+    with patch('sync_service.METRICS_FILE', path), FakeTanaServer(statuses={1: 503}) as server:
+        make_service(things_db.path, server, max_retries=1).sync_inbox()
+        first = samples(open(path).read())
+        things_db.add_task("Task 3", start="Inbox", modified=T0 + 1)
+        things_db.commit()
+        make_service(things_db.path, server, max_retries=1).sync_inbox()
+        second = samples(open(path).read())
+
+    assert first['things_to_tana_sync_runs_total{result="success"}'] == 1
+    assert first['things_to_tana_last_run_tasks{state="new"}'] == 3
+    assert first['things_to_tana_last_run_tasks{state="sent"}'] == 3
+    assert first['things_to_tana_http_requests_total{status="503"}'] == 1
+    assert first['things_to_tana_http_requests_total{status="200"}'] == 1
+    assert first['things_to_tana_history_tasks'] == 3
+    # The second run read only the new task, and kept counting from the first
+    assert second['things_to_tana_sync_runs_total{result="success"}'] == 2
+    assert second['things_to_tana_last_run_tasks{state="fetched"}'] == 1
+    assert second['things_to_tana_tasks_total{state="sent"}'] == 4
+    assert second['things_to_tana_http_requests_total{status="200"}'] == 2
+    assert second['things_to_tana_http_request_bytes_total'] > first['things_to_tana_http_request_bytes_total'] > 0
+    assert second['things_to_tana_history_tasks'] == 4
+
+
+def test_an_offline_run_is_queued_and_keeps_the_last_success(things_db, make_service):
+    things_db.add_task("Task", start="Inbox", modified=T0)
+    things_db.commit()
+
+    with FakeTanaServer(error_rate=1.0) as server:
+        service = make_service(things_db.path, server, max_retries=1)
+        service.sync_inbox()
+
+    assert service.metrics.get("sync_runs_total", result=QUEUED) == 1
+    assert service.metrics.get("last_run_tasks", state="queued") == 1
+    assert service.metrics.get("outbox_batches") == 1
+    assert service.metrics.get("http_requests_total", status="503") == 2
+    assert service.metrics.get("last_success_timestamp_seconds") == 0
+
+
+def test_metrics_are_served_over_http():
+    metrics = SyncMetrics()
+    metrics.record_run(SUCCESS, 1.0, {"sent": 5}, history_size=5, outbox_size=0)
+    server = metrics.serve(0)
+    try:
+        host, port = server.server_address[:2]
+        url = f"http://{host}:{port}"
+        with urllib.request.urlopen(url + "/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert 'things_to_tana_last_run_tasks{state="sent"} 5' in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url + "/")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,8 +1,17 @@
 import pytest
-from models import TanaNode
-from history_manager import HistoryManager
+from unittest.mock import patch
+from models import TanaNode, api_payload, task_to_node
+from tana_formatter import to_tana_paste
+from history_manager import (
+    CHANGED, NEW, UNCHANGED, UNHASHED, CompactHistoryManager, HistoryManager, SQLiteHistoryManager,
+    content_hash, create_history_manager,
+)
+import sqlite3
+from uuid_index import UUIDIndex, HEADER, KEY_SIZE
 import os
 import json
+import things
+from things_fixture import ThingsFixture
 
 # --- Models Tests ---
 def test_tana_node_api_payload():
@@ -17,6 +26,47 @@ def test_tana_node_api_payload():
     assert payload["children"][0]["name"] == "Subtask 1"
     assert payload["supertags"][0]["id"] == "node-id-123"  # Changed from "name" to "id"
 
+def test_tana_node_is_slotted_with_ordered_unique_supertags():
+    node = TanaNode(text="Task", supertags=["b", "a"])
+    node.add_supertag("b").add_supertag("c")
+
+    assert not hasattr(node, "__dict__")
+    assert node.name == node.text == "Task"
+    assert list(node.supertags) == ["b", "a", "c"]
+
+def test_one_converter_feeds_both_emitters():
+    task = {
+        'title': 'Task', 'status': 'canceled', 'due_date': '2025-11-30', 'tags': ['deep work'],
+        'notes': 'note', 'checklist': [{'title': 'Item', 'status': 'completed'}],
+    }
+
+    paste = to_tana_paste([task_to_node(task, supertags=["task"])])
+    payload = api_payload(task_to_node(task, supertags=["tag-id"], tags=False, dates=False, status=False))
+
+    assert paste == "%%tana%%\n- [x] Task [[date:2025-11-30]] #canceled #task #[[deep work]]\n  - note\n  - [x] Item"
+    assert payload == {
+        "name": "Task",
+        "supertags": [{"id": "tag-id"}],
+        "children": [{"name": "note"}, {"name": "[x] Item"}],
+    }
+
+def test_converter_takes_things_py_tasks_without_checklist_items(tmp_path):
+    path = str(tmp_path / "main.sqlite")
+    with ThingsFixture(path) as db:
+        db.add_task("Pack", start="Inbox", checklist=["passport"])
+    (flagged,) = things.inbox(filepath=path)
+    (listed,) = things.inbox(filepath=path, include_items=True)
+
+    # Without include_items, things.py only flags that the task has a checklist
+    assert flagged['checklist'] is True
+    assert task_to_node(flagged).to_string() == "- [ ] Pack"
+    assert task_to_node(listed).to_string() == "- [ ] Pack\n  - [ ] passport"
+
+
+def test_description_is_pasted_as_the_first_child():
+    node = TanaNode("Task", description="Details", children=[TanaNode("Child", description="More")])
+    assert node.to_string() == "- Task\n  - Details\n  - Child\n    - More"
+
 # --- History Manager Tests ---
 def test_history_manager(tmp_path):
     # Use a temporary file for history
@@ -31,3 +81,208 @@ def test_history_manager(tmp_path):
     # Reload from file
     manager2 = HistoryManager(str(history_file))
     assert manager2.has_been_synced("123") == True
+
+def test_history_manager_mark_many_writes_once(tmp_path):
+    history_file = tmp_path / "test_history.json"
+    manager = HistoryManager(str(history_file))
+
+    with patch.object(manager, '_save_history', wraps=manager._save_history) as save:
+        manager.mark_many(["a", "b", "c"])
+
+    assert save.call_count == 1
+    assert HistoryManager(str(history_file)).synced_ids == {"a", "b", "c"}
+
+def test_history_manager_batch_defers_save_until_exit(tmp_path):
+    history_file = tmp_path / "test_history.json"
+    manager = HistoryManager(str(history_file))
+
+    with patch.object(manager, '_save_history', wraps=manager._save_history) as save:
+        with manager.batch():
+            manager.mark_as_synced("1")
+            with manager.batch():
+                manager.mark_many(["2", "3"])
+            assert save.call_count == 0
+            assert not history_file.exists()
+
+    assert save.call_count == 1
+    assert HistoryManager(str(history_file)).synced_ids == {"1", "2", "3"}
+
+def test_history_manager_save_is_atomic(tmp_path):
+    history_file = tmp_path / "test_history.json"
+    manager = HistoryManager(str(history_file))
+    manager.mark_as_synced("keep")
+
+    # A failing write must leave the previous history intact and no temp files behind
+    with patch('storage.os.replace', side_effect=OSError("disk full")):
+        manager.mark_as_synced("lost")
+
+    assert json.loads(history_file.read_text()) == {"synced_ids": ["keep"]}
+    assert os.listdir(tmp_path) == ["test_history.json"]
+
+def test_sqlite_history_manager(tmp_path):
+    db_file = tmp_path / "history.sqlite"
+    manager = SQLiteHistoryManager(str(db_file), json_path=None)
+
+    assert manager.has_been_synced("123") == False
+
+    manager.mark_as_synced("123")
+    manager.mark_many(["456", "123"])
+    assert manager.has_been_synced("123") == True
+    assert len(manager) == 2
+
+    # Reload from database
+    manager2 = SQLiteHistoryManager(str(db_file), json_path=None)
+    assert manager2.has_been_synced("456") == True
+
+def test_sqlite_history_manager_overlapping_runs_keep_both_updates(tmp_path):
+    db_file = str(tmp_path / "history.sqlite")
+    cron_run = SQLiteHistoryManager(db_file, json_path=None)
+    manual_run = SQLiteHistoryManager(db_file, json_path=None)
+
+    with cron_run.batch():
+        cron_run.mark_as_synced("from-cron")
+        manual_run.mark_as_synced("from-manual")
+
+    # Neither writer clobbers the other (the JSON store's last-writer-wins problem)
+    check = SQLiteHistoryManager(db_file, json_path=None)
+    assert check.has_been_synced("from-cron") == True
+    assert check.has_been_synced("from-manual") == True
+
+def test_sqlite_history_manager_migrates_json_once(tmp_path):
+    json_file = tmp_path / "history.json"
+    json_file.write_text(json.dumps({"synced_ids": ["a", "b"]}))
+    db_file = str(tmp_path / "history.sqlite")
+
+    manager = SQLiteHistoryManager(db_file, json_path=str(json_file))
+
+    assert manager.has_been_synced("a") == True
+    assert manager.has_been_synced("b") == True
+    assert not json_file.exists()
+    assert (tmp_path / "history.json.migrated").exists()
+
+    # A stale history.json reappearing later is not imported again
+    json_file.write_text(json.dumps({"synced_ids": ["c"]}))
+    manager2 = SQLiteHistoryManager(db_file, json_path=str(json_file))
+    assert manager2.has_been_synced("c") == False
+
+def test_create_history_manager_selects_backend(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert isinstance(create_history_manager("json"), HistoryManager)
+    assert isinstance(create_history_manager("sqlite"), SQLiteHistoryManager)
+    assert isinstance(create_history_manager("compact"), CompactHistoryManager)
+    with pytest.raises(ValueError):
+        create_history_manager("redis")
+
+def test_content_hash_covers_the_synced_fields():
+    task = {
+        'uuid': 'a', 'title': 'Task', 'notes': 'note', 'tags': ['x', 'y'], 'deadline': '2025-11-30',
+        'checklist': [{'title': 'Item', 'status': 'incomplete'}], 'modified_at': 1.0,
+    }
+    digest = content_hash(task)
+
+    assert digest == content_hash(dict(task, tags=['y', 'x'], modified_at=2.0))
+    for field, value in [('title', 'Edited'), ('notes', ''), ('tags', ['x']), ('deadline', None),
+                         ('checklist', [{'title': 'Item', 'status': 'completed'}])]:
+        assert content_hash(dict(task, **{field: value})) != digest, field
+
+@pytest.mark.parametrize("open_store", [
+    lambda tmp_path: HistoryManager(str(tmp_path / "history.json")),
+    lambda tmp_path: SQLiteHistoryManager(str(tmp_path / "history.sqlite"), json_path=None),
+    lambda tmp_path: CompactHistoryManager(str(tmp_path / "history.idx"), json_path=None),
+], ids=["json", "sqlite", "compact"])
+def test_history_classifies_tasks_by_content_hash(tmp_path, open_store):
+    manager = open_store(tmp_path)
+    with manager.batch():
+        manager.mark_many(["a", "b"], {"a": "00000000000000aa"})
+        manager.mark_as_synced("c", "00000000000000cc")
+    manager.mark_as_synced("c", "00000000000000c2")
+
+    reopened = open_store(tmp_path)
+    assert reopened.classify("a", "00000000000000aa") == UNCHANGED
+    assert reopened.classify("a", "00000000000000ff") == CHANGED
+    assert reopened.classify("b", "00000000000000bb") == UNHASHED
+    assert reopened.classify("c", "00000000000000c2") == UNCHANGED
+    assert reopened.classify("d", "00000000000000dd") == NEW
+    # Recording the task again without a hash keeps the one it has
+    reopened.mark_as_synced("a")
+    assert open_store(tmp_path).classify("a", "00000000000000aa") == UNCHANGED
+    assert len(open_store(tmp_path)) == 3
+
+def test_sqlite_history_manager_adds_hashes_to_an_old_database(tmp_path):
+    db_file = str(tmp_path / "history.sqlite")
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE synced_tasks (uuid TEXT PRIMARY KEY, synced_at REAL NOT NULL) WITHOUT ROWID")
+    conn.execute("INSERT INTO synced_tasks VALUES ('old', 0)")
+    conn.commit()
+    conn.close()
+
+    manager = SQLiteHistoryManager(db_file, json_path=None)
+    assert manager.classify("old", "00000000000000aa") == UNHASHED
+    manager.mark_as_synced("old", "00000000000000aa")
+    assert SQLiteHistoryManager(db_file, json_path=None).classify("old", "00000000000000aa") == UNCHANGED
+
+def test_compact_history_manager_upgrades_a_keys_only_index(tmp_path):
+    index_file = tmp_path / "history.idx"
+    old = UUIDIndex(str(index_file))
+    old.add_many(["a", "b", "c"])
+    old.commit()
+    old.close()
+
+    manager = CompactHistoryManager(str(index_file), json_path=None)
+    assert manager.classify("b", "00000000000000bb") == UNHASHED
+    manager.mark_as_synced("b", "00000000000000bb")
+    manager.close()
+
+    assert HEADER.unpack_from(index_file.read_bytes())[1] == KEY_SIZE + 8
+    reopened = CompactHistoryManager(str(index_file), json_path=None)
+    assert [reopened.classify(task_id, "00000000000000bb") for task_id in "abc"] == [UNHASHED, UNCHANGED, UNHASHED]
+    assert len(reopened) == 3
+
+# --- UUID Index Tests ---
+def test_uuid_index_merges_commits_into_sorted_file(tmp_path):
+    index_file = tmp_path / "history.idx"
+    index = UUIDIndex(str(index_file))
+    first = [f"task-{i}" for i in range(0, 200, 2)]
+    second = [f"task-{i}" for i in range(1, 200, 2)]
+
+    index.add_many(first)
+    index.commit()
+    index.add_many(second + first[:10])  # already stored IDs are ignored
+    assert len(index) == 200
+    index.commit()
+
+    data = index_file.read_bytes()
+    keys = [data[i:i + KEY_SIZE] for i in range(HEADER.size, len(data), KEY_SIZE)]
+    assert len(keys) == 200
+    assert keys == sorted(keys)
+
+    reopened = UUIDIndex(str(index_file))
+    assert all(task_id in reopened for task_id in first + second)
+    assert "task-200" not in reopened
+
+def test_uuid_index_rejects_foreign_file(tmp_path):
+    bogus = tmp_path / "history.idx"
+    bogus.write_bytes(b"not an index at all")
+
+    with pytest.raises(ValueError):
+        UUIDIndex(str(bogus))
+
+def test_compact_history_manager(tmp_path):
+    json_file = tmp_path / "history.json"
+    json_file.write_text(json.dumps({"synced_ids": ["old-1", "old-2"]}))
+    index_file = str(tmp_path / "history.idx")
+
+    manager = CompactHistoryManager(index_file, json_path=str(json_file))
+    assert manager.has_been_synced("old-1") == True
+    assert not json_file.exists()
+
+    with manager.batch():
+        manager.mark_as_synced("new-1")
+        manager.mark_many(["new-2", "old-2"])
+        assert manager.has_been_synced("new-2") == True
+    assert len(manager) == 4
+
+    manager2 = CompactHistoryManager(index_file, json_path=str(json_file))
+    assert manager2.has_been_synced("new-1") == True
+    assert manager2.has_been_synced("unknown") == False
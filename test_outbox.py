@@ -0,0 +1,137 @@
+from unittest.mock import MagicMock
+from fake_tana_server import FakeTanaServer
+from history_manager import HistoryManager
+from outbox import COMPACT_SLACK, Outbox
+from sync_state import SyncState
+
+T0 = 1_700_000_000.0
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    outbox = Outbox(path)
+    first = outbox.add("INBOX", ["a", "b"], '{"nodes":[]}')
+    second = outbox.add("TODAY", ["c"], '{"nodes":[1]}', {"c": "0123456789abcdef"})
+    outbox.ack(first)
+
+    reopened = Outbox(path)
+
+    assert reopened.pending() == [second]
+    assert reopened.contains_task("c") and not reopened.contains_task("a")
+    # Ids keep increasing across restarts
+    assert reopened.add("INBOX", ["d"], "{}").id == second.id + 1
+
+
+def test_a_torn_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    entry = Outbox(path).add("INBOX", ["a"], "{}")
+    with open(path, "a") as f:
+        f.write('{"id": 2, "target": "INB')
+
+    assert Outbox(path).pending() == [entry]
+
+
+def test_spool_is_truncated_and_compacted(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    outbox = Outbox(path)
+    entry = outbox.add("INBOX", ["a"], "{}")
+    outbox.ack(entry)
+
+    # Nothing pending: only the next id is kept
+    assert open(path).read() == '{"next":2}\n'
+
+    kept = outbox.add("INBOX", ["keep"], "{}")
+    for i in range(COMPACT_SLACK + 2):
+        outbox.ack(outbox.add("INBOX", [str(i)], "{}"))
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert len(lines) < COMPACT_SLACK + 2
+    assert Outbox(path).pending() == [kept]
+
+
+def test_overlapping_processes_keep_each_others_batches(tmp_path):
+    path = str(tmp_path / "outbox.jsonl")
+    first, second = Outbox(path), Outbox(path)
+
+    mine = first.add("INBOX", ["a"], "{}")
+    theirs = second.add("INBOX", ["b"], "{}")
+    # Acking the last batch first knew of doesn't empty the file under second's
+    first.ack(mine)
+
+    assert theirs.id != mine.id
+    assert Outbox(path).pending() == [theirs]
+    assert first.pending() == [theirs] and first.contains_task("b")
+    # Once every batch is acked, ids still don't repeat
+    second.ack(theirs)
+    assert first.add("INBOX", ["c"], "{}").id > theirs.id
+
+
+def test_offline_run_is_queued_and_sent_on_recovery(things_db, make_service):
+    for i in range(25):
+        things_db.add_task(f"Task {i:02d}", start="Inbox", modified=T0 + i)
+    things_db.commit()
+
+    with FakeTanaServer(error_rate=1.0) as server:
+        service = make_service(things_db.path, server, max_retries=1, max_nodes=10)
+        service.sync_inbox()
+
+        # One failed call (plus its retry), then the rest is queued without calling Tana
+        assert server.calls == 2 and server.requests == []
+        assert len(service.outbox) == 3 and len(HistoryManager()) == 0
+        assert SyncState().get_watermark("inbox") == T0 + 24
+
+        server.error_rate = 0.0
+        recovered = make_service(things_db.path, server, max_retries=1, max_nodes=10)
+        convert = MagicMock(wraps=recovered._convert_task_to_node)
+        recovered._convert_task_to_node = convert
+        recovered.sync_inbox()
+
+    assert server.received_names() == [f"Task {i:02d}" for i in range(25)]
+    assert len(HistoryManager()) == 25 and len(recovered.outbox) == 0
+    # Recovery resent the stored bodies: nothing was read again or re-converted
+    convert.assert_not_called()
+
+
+def test_flush_stops_while_still_offline(things_db, make_service):
+    task = things_db.add_task("Task", start="Inbox", modified=T0)
+    things_db.commit()
+
+    with FakeTanaServer(error_rate=1.0) as server:
+        make_service(things_db.path, server, max_retries=1, max_nodes=10).sync_inbox()
+        assert not make_service(things_db.path, server, max_retries=1, max_nodes=10).flush_outbox()
+        assert len(Outbox()) == 1
+
+        server.error_rate = 0.0
+        assert make_service(things_db.path, server, max_retries=1, max_nodes=10).flush_outbox()
+
+    assert server.received_names() == ["Task"]
+    assert HistoryManager().has_been_synced(task) and len(Outbox()) == 0
+
+
+def test_rejected_queued_batch_is_dropped_and_tasks_reread(things_db, make_service):
+    task = things_db.add_task("Task", start="Inbox", modified=T0)
+    things_db.commit()
+
+    with FakeTanaServer(error_rate=1.0) as server:
+        make_service(things_db.path, server, max_retries=1, max_nodes=10).sync_inbox()
+        server.error_rate, server.statuses = 0.0, {server.calls + 1: 400}
+
+        service = make_service(things_db.path, server, max_retries=1, max_nodes=10)
+        assert service.flush_outbox()
+
+    assert len(Outbox()) == 0 and not HistoryManager().has_been_synced(task)
+    assert SyncState().get_watermark("inbox") is None
+
+
+def test_batch_already_in_history_is_not_resent(things_db, make_service):
+    task = things_db.add_task("Task", start="Inbox", modified=T0)
+    things_db.commit()
+    # As if the process died between recording the send and acknowledging it
+    Outbox().add("INBOX", [task], '{"targetNodeId":"INBOX","nodes":[{"name":"Task"}]}')
+    HistoryManager().mark_as_synced(task)
+
+    with FakeTanaServer() as server:
+        assert make_service(things_db.path, server, max_retries=1, max_nodes=10).flush_outbox()
+
+    assert server.calls == 0 and len(Outbox()) == 0
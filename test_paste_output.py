@@ -0,0 +1,54 @@
+import io
+import pytest
+from paste_output import HEADER, ShardWriter, shard_path, write_paste
+from tana_formatter import TanaNode, node_to_paste, to_tana_paste
+
+
+def fragments(count, size=40):
+    return [node_to_paste(TanaNode(text=f"Task {i} ".ljust(size, "x"), children=[TanaNode(text="note")]))
+            for i in range(count)]
+
+
+def test_shards_are_complete_documents_within_the_size_limit(tmp_path):
+    path = str(tmp_path / "tana.txt")
+    tasks = fragments(50)
+
+    writer = write_paste(iter(tasks), path, shard_size=500)
+
+    assert writer.fragments == 50
+    assert writer.paths == [shard_path(path, i) for i in range(1, len(writer.paths) + 1)]
+    assert len(writer.paths) > 1
+    documents = [open(p, encoding="utf-8").read() for p in writer.paths]
+    assert all(document.startswith(HEADER + "\n") for document in documents)
+    assert all(len(document.encode("utf-8")) <= 500 for document in documents)
+    assert sum(len(document.encode("utf-8")) for document in documents) == writer.bytes
+    # Together, the shards hold every task once, in order, each tree whole
+    body = "".join(document[len(HEADER) + 1:] for document in documents)
+    assert HEADER + "\n" + body == to_tana_paste(tasks) + "\n"
+
+
+def test_an_oversized_task_gets_a_shard_and_leftover_shards_are_removed(tmp_path):
+    path = str(tmp_path / "tana.txt")
+    write_paste(fragments(10), path, shard_size=100)
+    assert (tmp_path / "tana-010.txt").exists()
+
+    small, big = fragments(1)[0], fragments(1, size=300)[0]
+    writer = write_paste([small, big, small], path, shard_size=100)
+
+    assert [open(p, encoding="utf-8").read() for p in writer.paths] == [
+        f"{HEADER}\n{small}\n", f"{HEADER}\n{big}\n", f"{HEADER}\n{small}\n"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["tana-001.txt", "tana-002.txt", "tana-003.txt"]
+
+
+def test_stdout_is_one_document_with_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr("paste_output.PROGRESS_INTERVAL", 0)
+    stream, progress = io.StringIO(), io.StringIO()
+    tasks = fragments(3)
+
+    writer = write_paste(iter(tasks), "-", stream=stream, progress=progress)
+
+    assert writer.paths == []
+    assert stream.getvalue() == to_tana_paste(tasks) + "\n"
+    assert progress.getvalue().endswith(f"\r3 tasks, {writer.bytes / 2**20:.1f} MB\n")
+    with pytest.raises(ValueError):
+        ShardWriter("-", shard_size=100)
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import pytest
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+# Cumulative import time of the CLI entry point (best of STARTUP_RUNS), in ms. It
+# imports in about 60 ms where both modes were loaded up front in over 200 ms;
+# the budget leaves room for slower machines but not for requests or sync_service.
+STARTUP_BUDGET_MS = 150
+STARTUP_RUNS = 3
+MODE_MODULES = ("requests", "pyperclip", "sync_service", "flask")
+
+
+def run_python(code, cwd, **env):
+    """Runs code in a fresh interpreter with -X importtime; returns (stdout, {module: cumulative µs})."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, capture_output=True, text=True, timeout=60,
+        env={**os.environ, "PYTHONPATH": REPO, **env},
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:"):
+            _, cumulative, module = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative)
+    return result.stdout, times
+
+
+@pytest.fixture
+def things_db(things_db):
+    things_db.add_task("Buy milk", start="Inbox")
+    things_db.commit()
+    return things_db
+
+
+def test_cli_imports_neither_sync_mode_within_budget(tmp_path):
+    runs = [run_python("import things_to_tana", tmp_path)[1] for _ in range(STARTUP_RUNS)]
+
+    assert not [module for module in MODE_MODULES if module in runs[0]]
+    assert min(times["things_to_tana"] for times in runs) / 1000 < STARTUP_BUDGET_MS
+
+
+def test_clipboard_run_never_loads_requests(things_db, tmp_path):
+    out, times = run_python(
+        "import sys, things_to_tana; sys.argv = ['things-to-tana', 'inbox']; things_to_tana.main()",
+        tmp_path, TANA_API_TOKEN="", THINGS_PROVIDER="sqlite", THINGSDB=things_db.path,
+    )
+
+    assert "Buy milk" in out or "copied" in out
+    assert "pyperclip" in times
+    assert "requests" not in times and "sync_service" not in times
+
+
+def test_api_run_never_loads_pyperclip(things_db, tmp_path):
+    out, times = run_python(
+        "import sys, things_to_tana; sys.argv = ['things-to-tana', 'flush']; things_to_tana.main()",
+        tmp_path, TANA_API_TOKEN="token", THINGS_PROVIDER="sqlite", THINGSDB=things_db.path,
+    )
+
+    assert "Outbox is empty." in out
+    assert "requests" in times
+    assert "pyperclip" not in times
@@ -0,0 +1,429 @@
+import datetime
+import json
+import shutil
+import threading
+import time
+from unittest.mock import MagicMock, patch
+from history_manager import HistoryManager, SQLiteHistoryManager
+from sync_service import SyncService
+from sync_state import SyncState
+from tana_client import FAILED, SENT
+from task_filter import TaskFilter
+from things_database import ThingsDatabaseProvider
+from things_provider import ThingsProvider
+
+T0 = 1_700_000_000.0
+
+
+def mocked_service(db_path, full=False, send_result=True, task_filter=None):
+    """A SyncService on the fixture database whose API calls (TanaClient.post) are mocked."""
+    with patch('sync_service.create_things_provider', return_value=ThingsDatabaseProvider(db_path)):
+        service = SyncService(full=full, task_filter=task_filter)
+    service.tana_client.post = MagicMock(return_value=SENT if send_result else FAILED)
+    return service
+
+
+def sent_titles(service):
+    titles = []
+    for call in service.tana_client.post.call_args_list:
+        titles.extend(node['name'] for node in json.loads(call.args[0])['nodes'])
+    return sorted(titles)
+
+
+def fetch_spy(service):
+    fetch = MagicMock(wraps=service.things_provider.get_tasks_in_scopes)
+    service.things_provider.get_tasks_in_scopes = fetch
+    return fetch
+
+
+def test_incremental_sync_matches_full_sync(things_db, tmp_path):
+    for i in range(3):
+        things_db.add_task(f"Old {i}", start="Inbox", modified=T0)
+    things_db.commit()
+
+    first = mocked_service(things_db.path)
+    first.sync_inbox()
+    assert sent_titles(first) == ["Old 0", "Old 1", "Old 2"]
+    assert first.sync_state.get_watermark("inbox") == T0
+
+    # Edits in Things after the first sync
+    things_db.add_task("New 1", start="Inbox", modified=T0 + 10)
+    things_db.add_task("New 2", start="Inbox", modified=T0 + 20)
+    old = things_db.add_task("Old 3", start="Inbox", modified=T0 + 5)
+    first.history_manager.mark_as_synced(old)
+    things_db.commit()
+    shutil.copy("history.json", tmp_path / "history-before.json")
+
+    incremental = mocked_service(things_db.path)
+    fetch = fetch_spy(incremental)
+    incremental.sync_inbox()
+
+    shutil.copy(tmp_path / "history-before.json", "history.json")
+    full = mocked_service(things_db.path, full=True)
+    full.sync_inbox()
+
+    assert sent_titles(incremental) == sent_titles(full) == ["New 1", "New 2"]
+    assert fetch.call_args.args[0] == {"inbox": T0}
+    assert SyncState().get_watermark("inbox") == T0 + 20
+
+
+def test_noop_run_reads_nothing(things_db):
+    things_db.add_task("Task", start="Inbox", modified=T0)
+    things_db.commit()
+    mocked_service(things_db.path).sync_inbox()
+
+    service = mocked_service(things_db.path)
+    fetched = list(service.things_provider.get_inbox_tasks(modified_since=service._watermark("inbox")))
+    service.sync_inbox()
+
+    assert fetched == []
+    service.tana_client.post.assert_not_called()
+
+
+def test_failed_sync_does_not_advance_watermark(things_db):
+    things_db.add_task("Task", start="Inbox", modified=T0)
+    things_db.commit()
+
+    service = mocked_service(things_db.path, send_result=False)
+    service.sync_inbox()
+
+    assert SyncState().get_watermark("inbox") is None
+    assert len(service.history_manager) == 0
+
+
+def test_a_task_too_large_to_send_is_skipped_without_failing_the_scope(things_db, capsys):
+    things_db.add_task("Huge", start="Inbox", notes="x" * 3000, modified=T0 + 10)
+    things_db.add_task("Small", start="Inbox", modified=T0)
+    things_db.commit()
+
+    service = mocked_service(things_db.path)
+    service.tana_client.max_payload_bytes = 1000
+    service.sync_inbox()
+
+    assert sent_titles(service) == ["Small"]
+    out = capsys.readouterr().out
+    assert "skipped 1 tasks too large" in out and "failed" not in out
+    # The watermark moves on; the skipped task isn't in the history, so an edit sends it again
+    assert SyncState().get_watermark("inbox") == T0 + 10
+    assert len(service.history_manager) == 1
+
+
+def test_a_filtered_run_keeps_its_own_watermark(things_db):
+    HistoryManager().mark_as_synced("something")
+    things_db.add_task("Work", start="Inbox", tags=["work"], modified=T0 + 10)
+    things_db.add_task("Home", start="Inbox", modified=T0)
+    things_db.commit()
+
+    filtered = mocked_service(things_db.path, task_filter=TaskFilter(tags=frozenset({"work"})))
+    filtered.sync_inbox()
+    assert sent_titles(filtered) == ["Work #work"]
+    assert SyncState().get_watermark("inbox?tags=work") == T0 + 10
+    assert SyncState().get_watermark("inbox") is None
+
+    # The unfiltered run still reads the task the filtered one left out
+    unfiltered = mocked_service(things_db.path)
+    unfiltered.sync_inbox()
+    assert sent_titles(unfiltered) == ["Home"]
+    assert SyncState().get_watermark("inbox") == T0 + 10
+
+
+def test_today_watermark_expires_when_the_day_changes(things_db):
+    HistoryManager().mark_as_synced("something")
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    with open("sync_state.json", "w") as f:
+        json.dump({"watermarks": {
+            "today": {"modified": T0, "day": yesterday},
+            "inbox": {"modified": T0, "day": yesterday},
+        }}, f)
+
+    service = mocked_service(things_db.path)
+
+    assert service._watermark("today") is None
+    assert service._watermark("inbox") == T0
+
+
+def test_things_py_provider_filters_by_modified_time():
+    tasks = [
+        {'uuid': 'a', 'modified': '2024-01-01 10:00:00'},
+        {'uuid': 'b', 'modified': '2024-01-01 12:00:00'},
+    ]
+    since = datetime.datetime(2024, 1, 1, 11, 0, 0).timestamp()
+
+    with patch('things_provider.things.tasks', return_value=tasks):
+        provider = ThingsProvider()
+        assert [t['uuid'] for t in provider.get_inbox_tasks(modified_since=since)] == ['b']
+        assert len(provider.get_inbox_tasks()) == 2
+
+
+def slow_send(delays, log):
+    """A TanaClient.post stand-in that takes delays[target] seconds and logs what it sent."""
+    def post(body):
+        payload = json.loads(body)
+        time.sleep(delays[payload['targetNodeId']])
+        log.append((payload['targetNodeId'], [node['name'] for node in payload['nodes']]))
+        return SENT
+    return post
+
+
+def test_scopes_send_to_different_targets_in_parallel(things_db):
+    things_db.add_task("Inbox task", start="Inbox", modified=T0)
+    things_db.add_task("Today task", start_date=datetime.date.today().isoformat(), modified=T0)
+    things_db.commit()
+    log = []
+
+    with patch('scopes.TANA_TODAY_NODE_ID', "TODAY"):
+        service = mocked_service(things_db.path)
+        service.tana_client.post.side_effect = slow_send({"INBOX": 0.3, "TODAY": 0.3}, log)
+        started = time.monotonic()
+        service.sync_scopes(["inbox", "today"])
+
+    assert time.monotonic() - started < 0.55
+    assert sorted(log) == [("INBOX", ["Inbox task"]), ("TODAY", ["Today task"])]
+    assert SyncState().get_watermark("inbox") == SyncState().get_watermark("today") == T0
+
+
+def test_scopes_with_the_same_target_share_calls(things_db):
+    things_db.add_task("Inbox task", start="Inbox", modified=T0)
+    things_db.add_task("Today task", start_date=datetime.date.today().isoformat(), modified=T0)
+    things_db.commit()
+    log = []
+
+    service = mocked_service(things_db.path)
+    fetch = fetch_spy(service)
+    service.tana_client.post.side_effect = slow_send({"INBOX": 0.05}, log)
+    service.sync_scopes(["inbox", "today"])
+
+    # One read of both lists, one call in scope order
+    fetch.assert_called_once()
+    assert log == [("INBOX", ["Inbox task", "Today task"])]
+
+
+def test_history_is_updated_on_the_calling_thread_as_results_arrive(things_db):
+    inbox_task = things_db.add_task("Inbox task", start="Inbox", modified=T0)
+    today_task = things_db.add_task("Today task", start_date=datetime.date.today().isoformat(), modified=T0)
+    things_db.commit()
+
+    # SQLite connections refuse use from other threads, so this fails if a worker touches history
+    with patch('scopes.TANA_TODAY_NODE_ID', "TODAY"), \
+         patch('sync_service.create_history_manager', lambda: SQLiteHistoryManager()):
+        service = mocked_service(things_db.path)
+        # Today finishes first and is recorded first, though Inbox comes first in scope order
+        service.tana_client.post.side_effect = slow_send({"INBOX": 0.2, "TODAY": 0}, [])
+        marks = MagicMock(wraps=service.history_manager.mark_many)
+        service.history_manager.mark_many = lambda ids, hashes=None: marks(list(ids))
+        service.sync_scopes(["inbox", "today"])
+
+    assert [call.args[0] for call in marks.call_args_list] == [[today_task], [inbox_task]]
+
+
+def test_overlapping_runs_take_turns_and_send_each_task_once(things_db, capsys):
+    for i in range(3):
+        things_db.add_task(f"Task {i}", start="Inbox", modified=T0)
+    things_db.commit()
+    log = []
+    sending = threading.Event()
+    send = slow_send({"INBOX": 0.3}, log)
+
+    def first_run():
+        # Its own thread, as SQLite connections are per thread (like another process's)
+        service = mocked_service(things_db.path)
+        service.tana_client.post.side_effect = lambda body: (sending.set(), send(body))[1]
+        service.sync_inbox()
+
+    with patch('sync_service.create_history_manager', lambda: SQLiteHistoryManager()):
+        running = threading.Thread(target=first_run)
+        running.start()
+        # The second run starts while the first is still sending, before it has recorded anything
+        assert sending.wait(5)
+        second = mocked_service(things_db.path)
+        second.tana_client.post.side_effect = slow_send({"INBOX": 0}, log)
+        second.sync_inbox()
+        running.join()
+
+    assert log == [("INBOX", ["Task 0", "Task 1", "Task 2"])]
+    assert "waiting for it to finish" in capsys.readouterr().out
+
+
+def test_later_targets_are_recorded_while_an_earlier_one_is_still_sending(things_db):
+    for i in range(5):
+        things_db.add_task(f"Inbox {i}", start="Inbox", modified=T0)
+    today = [things_db.add_task(f"Today {i}", start_date=datetime.date.today().isoformat(), modified=T0)
+             for i in range(250)]
+    things_db.commit()
+    seen_while_inbox_sent = []
+
+    with patch('scopes.TANA_ROUTES', "inbox=AAA"):
+        service = mocked_service(things_db.path)
+
+        def post(body):
+            if json.loads(body)['targetNodeId'] == "AAA":
+                # Hold the first target's batch until the other target's batches are recorded and acked
+                deadline = time.monotonic() + 2
+                while time.monotonic() < deadline and not (
+                        all(service.history_manager.has_been_synced(uuid) for uuid in today)
+                        and len(service.outbox) == 1):
+                    time.sleep(0.01)
+                seen_while_inbox_sent.append(sum(map(service.history_manager.has_been_synced, today)))
+            return SENT
+        service.tana_client.post.side_effect = post
+        service.sync_scopes(["inbox", "today"])
+
+    assert seen_while_inbox_sent == [250]
+    assert len(service.outbox) == 0 and len(HistoryManager()) == 255
+
+
+def test_task_in_two_scopes_is_sent_once(things_db):
+    yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+    things_db.add_task("Overdue inbox task", start="Inbox", deadline=yesterday, modified=T0)
+    things_db.commit()
+
+    with patch('scopes.TANA_TODAY_NODE_ID', "TODAY"):
+        service = mocked_service(things_db.path)
+        service.sync_scopes(["inbox", "today"])
+
+    # It goes to the first scope's target only
+    assert [json.loads(call.args[0])['targetNodeId'] for call in service.tana_client.post.call_args_list] == ["INBOX"]
+
+
+def test_failed_fetch_sends_nothing(things_db, capsys):
+    things_db.add_task("Today task", start_date=datetime.date.today().isoformat(), modified=T0)
+    things_db.commit()
+
+    service = mocked_service(things_db.path)
+    service.things_provider.get_tasks_in_scopes = MagicMock(side_effect=RuntimeError("database is locked"))
+    service.sync_scopes(["inbox", "today"])
+
+    assert "database is locked" in capsys.readouterr().out
+    service.tana_client.post.assert_not_called()
+    assert SyncState().watermarks == {}
+
+
+def reading_spy(service, fail_after=None):
+    """Counts the tasks the provider has yielded; raises after fail_after of them if set."""
+    read = []
+    fetch = service.things_provider.get_tasks_in_scopes
+
+    def get_tasks_in_scopes(*args, **kwargs):
+        for task in fetch(*args, **kwargs):
+            if len(read) == fail_after:
+                raise RuntimeError("database is locked")
+            read.append(task['uuid'])
+            yield task
+    service.things_provider.get_tasks_in_scopes = get_tasks_in_scopes
+    return read
+
+
+def test_sending_starts_while_tasks_are_still_being_read(things_db):
+    for i in range(500):
+        things_db.add_task(f"Task {i:03d}", start="Inbox", modified=T0)
+    things_db.commit()
+    read_at_post = []
+
+    with patch('sync_service.SYNC_QUEUE_SIZE', 10):
+        service = mocked_service(things_db.path)
+        read = reading_spy(service)
+
+        def post(body):
+            read_at_post.append(len(read))
+            time.sleep(0.002)
+            return SENT
+        service.tana_client.post.side_effect = post
+        service.sync_inbox()
+
+    assert len(read) == 500 and len(HistoryManager()) == 500
+    assert len(read_at_post) > 1
+    # The first batch went out while most of the library was still unread, and reading
+    # never ran further ahead of sending than the queue and the batch being filled
+    assert read_at_post[0] < 250
+    sent = 0
+    for call, read_then in zip(service.tana_client.post.call_args_list, read_at_post):
+        assert read_then - sent <= 10 + 100 + 2
+        sent += len(json.loads(call.args[0])['nodes'])
+
+
+def test_fetch_failing_midway_keeps_what_was_sent(things_db, capsys):
+    for i in range(300):
+        things_db.add_task(f"Task {i:03d}", start="Inbox", modified=T0 + i)
+    things_db.commit()
+
+    service = mocked_service(things_db.path)
+    reading_spy(service, fail_after=250)
+    service.sync_inbox()
+
+    assert "database is locked" in capsys.readouterr().out
+    # Every task read before the failure was sent and recorded; the watermark stays put
+    synced = HistoryManager()
+    assert len(synced) == len(sent_titles(service)) == 250
+    assert SyncState().watermarks == {}
+
+    mocked_service(things_db.path).sync_inbox()
+    assert len(HistoryManager()) == 300
+
+
+def test_routing_table_sends_each_scope_to_its_node(things_db):
+    tomorrow = (datetime.date.today() + datetime.timedelta(days=1)).isoformat()
+    things_db.add_task("Errand", start="Inbox", tags=["errand"], modified=T0)
+    things_db.add_task("Later", start="Someday", start_date=tomorrow, tags=["errand"], modified=T0 + 1)
+    things_db.add_task("Idea", start="Someday", modified=T0 + 2)
+    things_db.commit()
+
+    with patch('scopes.TANA_ROUTES', "upcoming=UPCOMING,tag:errand=ERRANDS"):
+        service = mocked_service(things_db.path)
+        service.sync_scopes(["tag:errand", "upcoming", "someday"])
+
+    sent = [(json.loads(call.args[0])['targetNodeId'], [node['name'] for node in json.loads(call.args[0])['nodes']])
+            for call in service.tana_client.post.call_args_list]
+    # "Later" is in both tag:errand and Upcoming and goes with the first; unmapped tags stay as text
+    assert sorted(sent) == [("ERRANDS", ["Errand #errand", "Later #errand"]), ("INBOX", ["Idea"])]
+    assert SyncState().get_watermark("upcoming") == T0 + 1
+    assert SyncState().get_watermark("tag:errand") == T0 + 1
+    assert SyncState().get_watermark("someday") == T0 + 2
+
+
+def test_edited_task_is_logged_not_resent(things_db, capsys):
+    task = things_db.add_task("Draft", start="Inbox", modified=T0)
+    things_db.commit()
+    mocked_service(things_db.path).sync_inbox()
+
+    things_db.touch(task, title="Draft v2", modified=T0 + 10)
+    things_db.commit()
+    service = mocked_service(things_db.path)
+    service.sync_inbox()
+
+    service.tana_client.post.assert_not_called()
+    assert "1 synced tasks were edited in Things since" in capsys.readouterr().out
+    # The edit is the new baseline: it is reported once
+    mocked_service(things_db.path, full=True).sync_inbox()
+    assert "edited" not in capsys.readouterr().out
+
+
+def test_edited_task_is_resent_with_a_marker(things_db):
+    task = things_db.add_task("Draft", start="Inbox", modified=T0)
+    things_db.add_task("Untouched", start="Inbox", modified=T0)
+    things_db.commit()
+    mocked_service(things_db.path).sync_inbox()
+
+    things_db.touch(task, title="Draft v2", modified=T0 + 10)
+    things_db.commit()
+    with patch('sync_service.CHANGED_TASKS', "resend"):
+        service = mocked_service(things_db.path, full=True)
+    service.sync_inbox()
+
+    assert sent_titles(service) == ["Draft v2 (updated)"]
+    assert service.history_manager.classify(task, service.history_manager.hashes[task]) == "unchanged"
+
+
+def test_history_from_before_hashes_gets_a_baseline(things_db):
+    task = things_db.add_task("Task", start="Inbox", modified=T0)
+    things_db.commit()
+    HistoryManager().mark_as_synced(task)
+
+    mocked_service(things_db.path).sync_inbox()
+    assert task in HistoryManager().hashes
+
+    things_db.touch(task, title="Task, edited", modified=T0 + 10)
+    things_db.commit()
+    with patch('sync_service.CHANGED_TASKS', "resend"):
+        service = mocked_service(things_db.path)
+    service.sync_inbox()
+    assert sent_titles(service) == ["Task, edited (updated)"]
@@ -0,0 +1,95 @@
+import json
+import pytest
+from unittest.mock import patch
+from fake_tana_server import FakeTanaServer
+from tag_index import TagIndex, read_tag_mapping
+from things_to_tana import main
+
+T0 = 1_700_000_000.0
+
+TANA_EXPORT = {
+    "formatVersion": 1,
+    "docs": [
+        {"id": "tag-errand", "props": {"name": "Errand", "_docType": "tagDef", "_ownerId": "ws_SCHEMA"}},
+        {"id": "tag-deep", "props": {"name": "deep work", "_docType": "tagDef", "_ownerId": "ws_SCHEMA"}},
+        {"id": "tag-old", "props": {"name": "old", "_docType": "tagDef", "_ownerId": "ws_TRASH"}},
+        {"id": "plain", "props": {"name": "Not a tag"}},
+    ],
+}
+
+
+def test_index_is_seeded_from_a_tana_export(tmp_path):
+    export = tmp_path / "workspace.json"
+    export.write_text(json.dumps(TANA_EXPORT))
+    index = TagIndex(str(tmp_path / "tag_ids.json"))
+
+    assert index.import_file(str(export)) == 2
+    assert index.import_file(str(export)) == 0
+
+    reopened = TagIndex(str(tmp_path / "tag_ids.json"))
+    assert reopened.tags == {"Errand": "tag-errand", "deep work": "tag-deep"}
+    assert reopened.get("errand") == "tag-errand"
+    assert reopened.get("old") is None
+
+
+def test_index_is_seeded_from_a_mapping_file(tmp_path):
+    mapping = tmp_path / "tags.json"
+    mapping.write_text(json.dumps({"errand": "abc"}))
+    assert read_tag_mapping(str(mapping)) == {"errand": "abc"}
+
+    mapping.write_text(json.dumps(["errand"]))
+    with pytest.raises(ValueError):
+        read_tag_mapping(str(mapping))
+
+
+def test_cli_imports_tags(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "workspace.json").write_text(json.dumps(TANA_EXPORT))
+
+    with patch('sys.argv', ['things-to-tana', '--import-tags', 'workspace.json']):
+        main()
+
+    assert "Imported 2 tag IDs" in capsys.readouterr().out
+    assert TagIndex().get("Deep Work") == "tag-deep"
+
+
+def test_mapped_tags_become_supertags_and_others_stay_text(things_db, make_service):
+    TagIndex().update({"errand": "tag-errand"})
+    things_db.add_task("Buy milk", start="Inbox", tags=["Errand", "deep work"], modified=T0)
+    things_db.commit()
+
+    with FakeTanaServer() as server:
+        make_service(things_db.path, server).sync_inbox()
+
+    (node,) = server.requests[0]["nodes"]
+    assert node["name"] == "Buy milk #[[deep work]]"
+    assert node["supertags"] == [{"id": "tag-errand"}]
+
+
+def test_missing_tags_are_created_once_from_api_responses(things_db, make_service):
+    things_db.add_task("One", start="Inbox", tags=["errand", "home"], modified=T0)
+    things_db.add_task("Two", start="Inbox", tags=["Errand"], modified=T0)
+    things_db.commit()
+
+    with FakeTanaServer() as server, patch('sync_service.TANA_CREATE_TAGS', True):
+        make_service(things_db.path, server).sync_inbox()
+
+    schema, inbox = server.requests
+    assert schema["targetNodeId"] == "SCHEMA"
+    assert schema["nodes"] == [
+        {"name": "errand", "supertags": [{"id": "SYS_T01"}]},
+        {"name": "home", "supertags": [{"id": "SYS_T01"}]},
+    ]
+    assert [node["supertags"] for node in inbox["nodes"]] == [
+        [{"id": "node-1"}, {"id": "node-2"}],
+        [{"id": "node-1"}],
+    ]
+    assert TagIndex().tags == {"errand": "node-1", "home": "node-2"}
+
+    # Known tags need no more calls
+    things_db.add_task("Three", start="Inbox", tags=["home"], modified=T0 + 10)
+    things_db.commit()
+    with FakeTanaServer() as server, patch('sync_service.TANA_CREATE_TAGS', True):
+        make_service(things_db.path, server).sync_inbox()
+    assert [request["targetNodeId"] for request in server.requests] == ["INBOX"]
+    assert server.requests[0]["nodes"][0]["supertags"] == [{"id": "node-2"}]
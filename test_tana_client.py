@@ -0,0 +1,217 @@
+import email.utils
+import json
+import time
+import pytest
+import requests
+from unittest.mock import patch
+from fake_tana_server import FakeTanaServer
+from history_manager import HistoryManager
+from models import TanaNode
+from resilience import CircuitBreaker, RetryPolicy, TokenBucket, parse_retry_after
+from sync_service import SyncService
+import payload_encoder
+from payload_encoder import encode_node
+from tana_client import BatchResult, encode_payload, plan_batches
+from things_database import ThingsDatabaseProvider
+from things_fixture import ThingsFixture
+
+
+def make_nodes(count, children=0, name_length=10):
+    nodes = []
+    for i in range(count):
+        node = TanaNode(name=f"Task {i:04d} " + "x" * name_length)
+        node.add_supertag("SUPERTAG")
+        for j in range(children):
+            node.add_child(TanaNode(name=f"[ ] item {j}"))
+        nodes.append(node)
+    return nodes
+
+
+@pytest.fixture
+def server():
+    with FakeTanaServer(max_nodes=20, max_payload_bytes=1000) as server:
+        yield server
+
+
+def test_plan_batches_sizes_are_exact():
+    encoded = [encode_node(node) for node in make_nodes(40, children=2)]
+
+    batches = list(plan_batches(encoded, "INBOX", max_nodes=20, max_bytes=1000))
+
+    assert batches[0].start == 0 and batches[-1].end == 40
+    assert all(batch.end == following.start for batch, following in zip(batches, batches[1:]))
+    for batch in batches:
+        assert batch.size == len(encode_payload("INBOX", encoded[batch.start:batch.end]))
+        assert batch.node_count <= 20 and batch.size <= 1000
+    # Batches are filled: the next tree would not have fit
+    for batch, following in zip(batches, batches[1:]):
+        grown = encode_payload("INBOX", encoded[batch.start:following.start + 1])
+        assert batch.node_count + 3 > 20 or len(grown) > 1000
+
+
+@pytest.mark.parametrize("backend", ["json", pytest.param("orjson", marks=pytest.mark.skipif(
+    payload_encoder.orjson is None, reason="orjson is not installed"))])
+def test_encoder_matches_json_dumps_of_the_payload(backend, monkeypatch):
+    if backend == "json":
+        monkeypatch.setattr(payload_encoder, "orjson", None)
+    node = TanaNode(name='Caf\u00e9 "quoted" \U0001F600', description="line\nbreak", supertags=["a", "b"])
+    node.add_child(TanaNode(name="Item", checked=True).add_child(TanaNode(name="Deep")))
+    node.add_child(TanaNode(name="Note"))
+
+    encoded = encode_node(node)
+    ascii_node = TanaNode(name='Plain "quoted"', description="line\nbreak", supertags=["a"],
+                          children=[TanaNode(name="Item", checked=False)])
+
+    assert json.loads(encoded.json) == node.to_api_payload()
+    assert encoded.node_count == 4
+    # orjson writes non-ASCII text as UTF-8 rather than \u escapes; ASCII-only text is byte for byte the same
+    assert encode_node(ascii_node).json == json.dumps(ascii_node.to_api_payload(), separators=(",", ":")).encode()
+    if backend == "json":
+        assert encoded.json == json.dumps(node.to_api_payload(), separators=(",", ":")).encode()
+    else:
+        assert encoded.json == json.dumps(node.to_api_payload(), separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def test_sends_large_lists_within_the_limits(server, fast_client):
+    client = fast_client(server, max_nodes=20, max_payload_bytes=1000)
+    nodes = make_nodes(100, children=3)
+
+    results = list(client.send_batches(nodes, "INBOX"))
+
+    assert all(result.success for result in results)
+    assert len(results) == len(server.requests) > 1
+    assert server.rejected == []
+    assert server.received_names() == [node.name for node in nodes]
+
+
+def test_oversized_tree_is_skipped_without_a_call(server, fast_client):
+    client = fast_client(server, max_nodes=20, max_payload_bytes=1000)
+    nodes = make_nodes(1) + make_nodes(1, children=25) + make_nodes(1)
+
+    results = list(client.send_batches(nodes, "INBOX"))
+
+    assert results == [BatchResult(0, 1, True), BatchResult(1, 2, False), BatchResult(2, 3, True)]
+    assert server.calls == 2
+
+
+def test_limits_are_enforced_by_the_stand_in(server, fast_client):
+    assert not fast_client(server).send_nodes(make_nodes(30), "INBOX")
+    assert not fast_client(server, token="wrong").send_nodes(make_nodes(1), "INBOX")
+    # Client errors are not retried
+    assert server.requests == [] and server.calls == 2
+
+
+def test_sync_marks_only_tasks_in_successful_batches(tmp_path, monkeypatch, fast_client):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / "main.sqlite")
+    with ThingsFixture(path) as db:
+        for i in range(50):
+            db.add_task(f"Task {i:02d}", start="Inbox", checklist=["a", "b"])
+
+    # The second batch is rejected (a batch Tana can't take is not kept in the outbox)
+    with FakeTanaServer(max_nodes=30, statuses={2: 400}) as server:
+        no_retries = RetryPolicy(max_retries=0, base_delay=0, max_delay=0)
+        with patch('sync_service.create_things_provider', return_value=ThingsDatabaseProvider(path)), \
+             patch('sync_service.TanaClient', lambda: fast_client(server, max_nodes=30, retry_policy=no_retries)):
+            service = SyncService()
+        service.sync_inbox()
+
+        # 3 nodes per task: batches of 10 tasks, the second of which failed
+        delivered = server.received_names()
+        assert len(server.requests) == 4 and len(delivered) == 40
+        assert len(HistoryManager()) == 40
+        assert service.sync_state.get_watermark("inbox") is None
+
+        service.sync_inbox()
+
+    assert sorted(server.received_names()) == [f"Task {i:02d}" for i in range(50)]
+    assert len(HistoryManager()) == 50
+
+
+def test_keeps_the_connection_alive(server, fast_client):
+    client = fast_client(server)
+
+    for node in make_nodes(5):
+        assert client.send_nodes([node], "INBOX")
+
+    assert server.calls == 5 and server.connections == 1
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retries_transient_failures(status, fast_client):
+    with FakeTanaServer(statuses={1: status, 2: status}) as server:
+        assert fast_client(server).send_nodes(make_nodes(1), "INBOX")
+
+    assert server.calls == 3 and len(server.requests) == 1
+
+
+def test_gives_up_after_max_retries(fast_client):
+    with FakeTanaServer(error_rate=1.0) as server:
+        assert not fast_client(server).send_nodes(make_nodes(1), "INBOX")
+
+    assert server.calls == 4
+
+
+def test_honours_retry_after(fast_client):
+    with FakeTanaServer(statuses={1: 429}, retry_after="0.3") as server:
+        client = fast_client(server)
+        started = time.monotonic()
+        assert client.send_nodes(make_nodes(1), "INBOX")
+
+    assert time.monotonic() - started >= 0.3
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(email.utils.formatdate(time.time() + 30, usegmt=True)) == pytest.approx(30, abs=2)
+
+
+def test_rate_limiter_spaces_calls(server, fast_client):
+    client = fast_client(server, rate_limiter=TokenBucket(rate=20))
+    started = time.monotonic()
+
+    for node in make_nodes(5):
+        client.send_nodes([node], "INBOX")
+
+    # The first call uses the initial token; the other four wait 1/20s each
+    assert time.monotonic() - started >= 0.2
+
+
+def test_circuit_breaker_stops_calls_during_an_outage(fast_client):
+    breaker = CircuitBreaker(threshold=3, cooldown=0.2)
+    no_retries = RetryPolicy(max_retries=0, base_delay=0, max_delay=0)
+    with FakeTanaServer(statuses={1: 503, 2: 503, 3: 503}) as server:
+        client = fast_client(server, circuit_breaker=breaker, retry_policy=no_retries)
+        for node in make_nodes(5):
+            assert not client.send_nodes([node], "INBOX")
+        assert server.calls == 3 and breaker.is_open
+
+        # After the cooldown one trial call goes through and closes the circuit
+        time.sleep(0.2)
+        assert client.send_nodes(make_nodes(1), "INBOX")
+        assert server.calls == 4 and not breaker.is_open
+
+
+@pytest.mark.parametrize("trial", [400, 429, "error"])
+def test_a_trial_call_without_a_verdict_does_not_keep_the_circuit_open(trial, fast_client):
+    breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+    no_retries = RetryPolicy(max_retries=0, base_delay=0, max_delay=0)
+    statuses = {1: 503} if trial == "error" else {1: 503, 2: trial}
+    with FakeTanaServer(statuses=statuses) as server:
+        client = fast_client(server, circuit_breaker=breaker, retry_policy=no_retries)
+        assert not client.send_nodes(make_nodes(1), "INBOX")
+        assert breaker.is_open
+
+        time.sleep(0.05)
+        if trial == "error":
+            with patch.object(client, "_request", side_effect=requests.exceptions.InvalidURL("bad")):
+                assert not client.send_nodes(make_nodes(1), "INBOX")
+        else:
+            assert not client.send_nodes(make_nodes(1), "INBOX")
+
+        # The next call is let through (as a trial, or with the circuit closed) and succeeds
+        time.sleep(0.05)
+        assert client.send_nodes(make_nodes(1), "INBOX")
+        assert not breaker.is_open
@@ -1,5 +1,6 @@
+import io
 import pytest
-from tana_formatter import TanaNode, to_tana_paste, tana_date, tana_tag, tana_field
+from tana_formatter import TanaNode, to_tana_paste, to_tana_paste_stream, tana_date, tana_tag, tana_field
 
 def test_tana_node_structure():
     node = TanaNode(text="Parent")
@@ -155,3 +156,30 @@ def test_supertag_complex():
     assert "[x]" in output  # From child
     assert "Subtask 1" in output
     assert "Subtask 2" in output
+
+def test_paste_stream_matches_to_tana_paste():
+    """Streaming from a generator writes the same text as to_tana_paste()"""
+    def nodes():
+        for i in range(3):
+            node = TanaNode(text=f"Task {i}", checked=i == 1).add_supertag("deep work")
+            node.add_child(TanaNode(text="Note").add_child(TanaNode(text="Item", checked=False)))
+            yield node
+
+    stream = io.StringIO()
+    to_tana_paste_stream(nodes(), stream)
+
+    assert stream.getvalue() == to_tana_paste(list(nodes()))
+    assert stream.getvalue().splitlines()[1:4] == ["- [ ] Task 0 #[[deep work]]", "  - Note", "    - [ ] Item"]
+
+def test_deep_trees_render_without_recursion():
+    root = node = TanaNode(text="0")
+    for depth in range(1, 5000):
+        child = TanaNode(text=str(depth))
+        node.add_child(child)
+        node = child
+
+    lines = to_tana_paste([root]).splitlines()
+
+    assert len(lines) == 5001
+    assert lines[-1] == "  " * 4999 + "- 4999"
+
@@ -0,0 +1,111 @@
+import argparse
+import datetime
+import pytest
+import things
+from unittest.mock import patch
+from task_filter import TaskFilter, add_filter_arguments, filter_from_args
+from things_database import ThingsDatabaseProvider
+from things_provider import ThingsProvider, _things_kwargs
+
+
+@pytest.fixture
+def things_db(things_db):
+    """The path of a database with tasks across areas, projects, tags and dates."""
+    today = datetime.date.today()
+    db = things_db
+    work = db.add_area("Work")
+    home = db.add_area("Home")
+    launch = db.add_project("Launch", area=work)
+    db.add_task("Errand", start="Inbox", tags=["errand"])
+    db.add_task("Deep work", tags=["deep work"], area=work, deadline="2024-05-01")
+    db.add_task("Launch prep", project=launch, deadline="2024-06-15",
+                start_date=today.isoformat())
+    db.add_task("Chores", area=home, tags=["errand"], start_date="2024-01-10")
+    db.add_task("Shipped", status="completed", project=launch)
+    db.add_task("Dropped", start="Inbox", status="canceled", tags=["errand"])
+    db.commit()
+    return db.path
+
+
+def _titles(tasks):
+    return sorted(t['title'] for t in tasks)
+
+
+def test_default_filter_selects_active_todos():
+    task_filter = TaskFilter()
+
+    assert task_filter.matches({'type': 'to-do', 'status': 'incomplete'})
+    assert not task_filter.matches({'type': 'to-do', 'status': 'completed'})
+    assert not task_filter.matches({'type': 'project', 'status': 'incomplete'})
+
+
+@pytest.mark.parametrize("task_filter,expected", [
+    (TaskFilter(), ["Chores", "Deep work", "Errand", "Launch prep"]),
+    (TaskFilter(tags=frozenset({"errand"})), ["Chores", "Errand"]),
+    (TaskFilter(statuses=frozenset({"completed", "canceled"})), ["Dropped", "Shipped"]),
+    (TaskFilter(types=frozenset({"project"})), ["Launch"]),
+    (TaskFilter(area="Work"), ["Deep work"]),
+    (TaskFilter(project="Launch", statuses=frozenset()), ["Launch prep", "Shipped"]),
+    (TaskFilter(deadline_after="2024-05-01", deadline_before="2024-05-31"), ["Deep work"]),
+    (TaskFilter(start_before="2024-02-01"), ["Chores"]),
+])
+def test_sql_pushdown_matches_python_fallback(things_db, task_filter, expected):
+    """compile_filter() selects exactly what TaskFilter.matches() accepts"""
+    native = list(ThingsDatabaseProvider(things_db).get_all_tasks(task_filter=task_filter))
+    every_task = ThingsDatabaseProvider(things_db).get_all_tasks(
+        task_filter=TaskFilter(statuses=frozenset(), types=frozenset())
+    )
+
+    assert _titles(native) == expected
+    assert _titles(native) == _titles(t for t in every_task if task_filter.matches(t))
+
+
+def test_inbox_and_today_leave_out_logbook_rows(things_db):
+    provider = ThingsDatabaseProvider(things_db)
+
+    assert _titles(provider.get_inbox_tasks()) == ["Errand"]
+    # Past start dates and overdue deadlines count as Today; "Shipped" does not
+    assert _titles(provider.get_today_tasks()) == ["Chores", "Deep work", "Launch prep"]
+
+
+def test_things_provider_pushes_supported_fields(things_db):
+    task_filter = TaskFilter(tags=frozenset({"errand"}), deadline_after="2024-01-01")
+
+    assert _things_kwargs(task_filter) == {
+        'status': 'incomplete', 'type': 'to-do', 'deadline': '>=2024-01-01',
+    }
+    assert _things_kwargs(TaskFilter(statuses=frozenset({"completed", "canceled"})), dates=False) == {
+        'status': None, 'type': 'to-do',
+    }
+
+    real_tasks = things.tasks
+    with patch('things_provider.things.tasks',
+               side_effect=lambda **kwargs: real_tasks(filepath=things_db, **kwargs)) as tasks:
+        ThingsProvider().get_inbox_tasks(task_filter=TaskFilter(statuses=frozenset({"canceled"})))
+
+    tasks.assert_called_once_with(start="Inbox", status="canceled", type="to-do")
+
+
+def test_filter_from_args():
+    parser = argparse.ArgumentParser()
+    add_filter_arguments(parser)
+
+    assert filter_from_args(parser.parse_args([])) == TaskFilter()
+    args = parser.parse_args([
+        "--status", "incomplete", "--status", "completed", "--tag", "errand",
+        "--area", "Work", "--deadline-before", "2024-06-30",
+    ])
+    assert filter_from_args(args) == TaskFilter(
+        statuses=frozenset({"incomplete", "completed"}),
+        tags=frozenset({"errand"}),
+        area="Work",
+        deadline_before="2024-06-30",
+    )
+    with pytest.raises(SystemExit):
+        parser.parse_args(["--start-after", "next week"])
+
+
+def test_fingerprint_names_what_differs_from_the_default():
+    assert TaskFilter().fingerprint() == ""
+    assert TaskFilter(tags=frozenset({"work", "errand"}), area="Home").fingerprint() == "tags=errand,work&area=Home"
+    assert TaskFilter(statuses=frozenset()).fingerprint() == "statuses="
@@ -0,0 +1,155 @@
+import datetime
+import sqlite3
+import pytest
+import things
+from things_database import ThingsDatabaseProvider, things_date_to_iso
+from things_fixture import LibraryProfile, generate_library
+from things_provider import ThingsProvider, create_things_provider
+
+
+@pytest.fixture
+def things_db(things_db):
+    """The path of a database with tasks in every list, plus trashed, completed and repeating ones."""
+    today = datetime.date.today()
+    yesterday = (today - datetime.timedelta(days=1)).isoformat()
+    tomorrow = (today + datetime.timedelta(days=1)).isoformat()
+    db = things_db
+    area = db.add_area("Work")
+    project = db.add_project("Launch", area=area)
+    trashed_project = db.add_project("Old", trashed=True)
+    db.add_task("Inbox task", start="Inbox", tags=["errand", "deep work"],
+                checklist=["one", ("two", "completed")], notes="line 1\nline 2")
+    db.add_task("Scheduled today", start_date=today.isoformat(), today_index=2)
+    db.add_task("Someday due", start="Someday", start_date=yesterday, today_index=1)
+    db.add_task("Overdue", deadline=yesterday, project=project)
+    db.add_task("Future", start="Someday", start_date=tomorrow)
+    db.add_task("Anytime", area=area, tags=["errand"])
+    db.add_task("Done", start="Inbox", status="completed")
+    db.add_task("Trashed", start="Inbox", trashed=True)
+    db.add_task("Repeating", start="Inbox", recurring=True)
+    db.add_task("In trashed project", project=trashed_project)
+    db.commit()
+    return db.path
+
+
+def _summary(tasks):
+    return [
+        (t['uuid'], t['title'], t.get('tags') or [], [(i['title'], i['status']) for i in t.get('checklist') or []])
+        for t in tasks
+    ]
+
+
+@pytest.mark.parametrize("scope,things_call", [
+    ("inbox", things.inbox),
+    ("today", things.today),
+    ("upcoming", things.upcoming),
+    ("anytime", lambda **kwargs: things.anytime(type="to-do", **kwargs)),
+    ("someday", things.someday),
+    ("tag:errand", lambda **kwargs: things.tasks(tag="errand", **kwargs)),
+    ("all", things.todos),
+])
+def test_matches_things_py(things_db, scope, things_call):
+    """The native reader returns the same tasks, order, tags and checklists as things.py"""
+    provider = ThingsDatabaseProvider(things_db)
+    native = list(provider._iter_scope(scope))
+    expected = things_call(filepath=things_db, include_items=True)
+
+    assert _summary(native) == _summary(expected)
+
+
+def test_scopes_are_read_in_one_query(things_db, monkeypatch):
+    """The union of scopes comes in one pass, like things.py's per-scope reads merged by UUID"""
+    monkeypatch.setenv("THINGSDB", things_db)
+    scopes = {"inbox": None, "today": None, "tag:errand": None, "project:Launch": None}
+    connect = sqlite3.connect
+    connections = []
+    monkeypatch.setattr("things_database.sqlite3.connect", lambda *a, **k: connections.append(a) or connect(*a, **k))
+
+    native = list(ThingsDatabaseProvider(things_db).get_tasks_in_scopes(scopes))
+    assert len(connections) == 1
+
+    expected = ThingsProvider().get_tasks_in_scopes(scopes)
+    assert [(t['title'], t['scopes']) for t in native] == [(t['title'], t['scopes']) for t in expected]
+    assert ("Anytime", ["tag:errand"]) in [(t['title'], t['scopes']) for t in native]
+
+
+def test_matches_things_py_on_generated_library(tmp_path):
+    path = str(tmp_path / "main.sqlite")
+    generate_library(path, 500)
+    provider = ThingsDatabaseProvider(path)
+
+    assert _summary(provider.get_all_tasks()) == _summary(things.todos(filepath=path, include_items=True))
+    assert _summary(provider.get_today_tasks()) == _summary(things.today(filepath=path, include_items=True))
+
+
+def test_generated_library_follows_its_profile(tmp_path):
+    path = str(tmp_path / "main.sqlite")
+    profile = LibraryProfile(note_words=5, max_checklist_items=6, tag_count=3, max_tags=3,
+                             projects=4, areas=2, deadline_share=0.5)
+    generate_library(path, 300, profile=profile)
+    tasks = list(ThingsDatabaseProvider(path).get_all_tasks())
+
+    assert {tag for task in tasks for tag in task['tags']} <= {"tag 0", "tag 1", "tag 2"}
+    assert max(len(task['checklist']) for task in tasks) == 6
+    assert max(len(line.split()) for task in tasks for line in task['notes'].splitlines()) == 3 + 5
+    assert {task['project_title'] for task in tasks} == {None, "Project 0", "Project 1", "Project 2", "Project 3"}
+    assert not any(task['project_title'] for task in tasks if task['start'] == "Inbox")
+    assert 0.3 < sum(bool(task['deadline']) for task in tasks) / len(tasks) < 0.7
+
+
+def test_records_are_compact_and_complete(things_db):
+    provider = ThingsDatabaseProvider(things_db)
+    task = next(t for t in provider.get_inbox_tasks() if t['title'] == "Inbox task")
+
+    assert task == {
+        'uuid': task['uuid'],
+        'type': 'to-do',
+        'title': 'Inbox task',
+        'status': 'incomplete',
+        'notes': 'line 1\nline 2',
+        'start': 'Inbox',
+        'start_date': None,
+        'deadline': None,
+        'tags': ['errand', 'deep work'],
+        'checklist': [
+            {'title': 'one', 'status': 'incomplete'},
+            {'title': 'two', 'status': 'completed'},
+        ],
+        'area_title': None,
+        'project_title': None,
+        'modified_at': task['modified_at'],
+    }
+    assert isinstance(task['modified_at'], float)
+
+
+def test_tasks_are_streamed_lazily(things_db):
+    provider = ThingsDatabaseProvider(things_db)
+    tasks = provider.get_all_tasks()
+
+    # Nothing is read until the generator is consumed
+    assert not isinstance(tasks, list)
+    assert next(tasks)["title"] == "Inbox task"
+    tasks.close()
+
+
+def test_database_is_opened_read_only(things_db):
+    conn = ThingsDatabaseProvider(things_db)._connect()
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM TMTask")
+    conn.close()
+
+
+def test_things_date_to_iso():
+    assert things_date_to_iso(132464128) == "2021-03-28"
+    assert things_date_to_iso(None) is None
+
+
+def test_create_things_provider(things_db, monkeypatch):
+    monkeypatch.setenv("THINGSDB", things_db)
+
+    assert isinstance(create_things_provider("things"), ThingsProvider)
+    native = create_things_provider("sqlite")
+    assert isinstance(native, ThingsDatabaseProvider)
+    assert native.db_path == things_db
+    with pytest.raises(ValueError):
+        create_things_provider("omnifocus")
@@ -2,6 +2,13 @@ import pytest
 from unittest.mock import patch, MagicMock, call
 import sys
 from things_to_tana import is_api_token_valid, main, convert_task_to_node
+from task_filter import TaskFilter
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    """Keeps state files the CLI writes (e.g. the conversion cache) out of the repo"""
+    monkeypatch.chdir(tmp_path)
 
 
 # --- Tests for is_api_token_valid() ---
@@ -33,7 +40,7 @@ def test_is_api_token_valid_with_none():
 # --- Tests for main() - API Sync Mode ---
 
 @patch('things_to_tana.is_api_token_valid')
-@patch('things_to_tana.SyncService')
+@patch('sync_service.SyncService')
 def test_main_api_mode_today(mock_sync_service, mock_is_valid):
     """Test main() uses API sync for 'today' scope when token is valid"""
     mock_is_valid.return_value = True
@@ -51,7 +58,7 @@ def test_main_api_mode_today(mock_sync_service, mock_is_valid):
 
 
 @patch('things_to_tana.is_api_token_valid')
-@patch('things_to_tana.SyncService')
+@patch('sync_service.SyncService')
 def test_main_api_mode_inbox(mock_sync_service, mock_is_valid):
     """Test main() uses API sync for 'inbox' scope when token is valid"""
     mock_is_valid.return_value = True
@@ -66,7 +73,7 @@ def test_main_api_mode_inbox(mock_sync_service, mock_is_valid):
 
 
 @patch('things_to_tana.is_api_token_valid')
-@patch('things_to_tana.SyncService')
+@patch('sync_service.SyncService')
 def test_main_api_mode_all(mock_sync_service, mock_is_valid):
     """Test main() uses API sync for 'all' scope when token is valid"""
     mock_is_valid.return_value = True
@@ -76,13 +83,12 @@ def test_main_api_mode_all(mock_sync_service, mock_is_valid):
     with patch.object(sys, 'argv', ['things_to_tana.py', 'all']):
         main()
 
-    # Both inbox and today should be called for 'all'
-    mock_service_instance.sync_inbox.assert_called_once()
-    mock_service_instance.sync_today.assert_called_once()
+    # Both inbox and today should be synced, concurrently, for 'all'
+    mock_service_instance.sync_scopes.assert_called_once_with(["inbox", "today"])
 
 
 @patch('things_to_tana.is_api_token_valid')
-@patch('things_to_tana.SyncService')
+@patch('sync_service.SyncService')
 def test_main_api_mode_default_scope(mock_sync_service, mock_is_valid):
     """Test main() defaults to 'today' scope when no arg provided"""
     mock_is_valid.return_value = True
@@ -95,12 +101,78 @@ def test_main_api_mode_default_scope(mock_sync_service, mock_is_valid):
     mock_service_instance.sync_today.assert_called_once()
 
 
+@patch('things_to_tana.is_api_token_valid')
+@patch('sync_service.SyncService')
+@patch('things_to_tana.run_watch')
+def test_main_api_mode_watch(mock_run_watch, mock_sync_service, mock_is_valid):
+    """Test main() starts the watch daemon with a single warm SyncService"""
+    mock_is_valid.return_value = True
+
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'watch', '--debounce', '1.5', '--poll']):
+        main()
+
+    mock_run_watch.assert_called_once_with(mock_sync_service.return_value, 1.5, True, None)
+
+
+@patch('things_to_tana.is_api_token_valid')
+@patch('things_to_tana.run_watch')
+def test_main_watch_requires_api_mode(mock_run_watch, mock_is_valid, capsys):
+    """Test watch mode is refused without a valid API token"""
+    mock_is_valid.return_value = False
+
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'watch']):
+        main()
+
+    mock_run_watch.assert_not_called()
+    assert "requires API sync" in capsys.readouterr().out
+
+
+@patch('things_to_tana.is_api_token_valid')
+@patch('sync_service.SyncService')
+def test_main_api_mode_flush(mock_sync_service, mock_is_valid):
+    """Test main() 'flush' only drains the outbox"""
+    mock_is_valid.return_value = True
+    mock_service_instance = MagicMock()
+    mock_sync_service.return_value = mock_service_instance
+
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'flush']):
+        main()
+
+    mock_service_instance.flush_outbox.assert_called_once()
+    mock_service_instance.sync_scopes.assert_not_called()
+
+
+@patch('things_to_tana.is_api_token_valid')
+@patch('sync_service.SyncService')
+def test_main_api_mode_several_scopes(mock_sync_service, mock_is_valid):
+    """Test main() syncs several scopes, aliases expanded, in one pass"""
+    mock_is_valid.return_value = True
+
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'all', 'upcoming', 'tag:errand', 'today']):
+        main()
+
+    mock_sync_service.return_value.sync_scopes.assert_called_once_with(["inbox", "today", "upcoming", "tag:errand"])
+
+
+@patch('things_to_tana.is_api_token_valid')
+@patch('sync_service.SyncService')
+def test_main_unknown_scope(mock_sync_service, mock_is_valid, capsys):
+    """Test main() rejects unknown scopes before doing anything"""
+    mock_is_valid.return_value = True
+
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'tomorrow']):
+        main()
+
+    mock_sync_service.assert_not_called()
+    assert "Unknown scope: tomorrow" in capsys.readouterr().out
+
+
 # --- Tests for main() - Clipboard Sync Mode ---
 
 @patch('things_to_tana.is_api_token_valid')
 @patch('things_to_tana.get_things_tasks')
 @patch('things_to_tana.to_tana_paste')
-@patch('things_to_tana.pyperclip.copy')
+@patch('pyperclip.copy')
 def test_main_clipboard_mode_success(mock_copy, mock_to_tana_paste, mock_get_tasks, mock_is_valid):
     """Test main() uses clipboard sync when no valid token"""
     mock_is_valid.return_value = False
@@ -114,7 +186,7 @@ def test_main_clipboard_mode_success(mock_copy, mock_to_tana_paste, mock_get_tas
         main()
 
     # Verify clipboard flow
-    mock_get_tasks.assert_called_once_with("today")
+    mock_get_tasks.assert_called_once_with(["today"], TaskFilter())
     mock_to_tana_paste.assert_called_once()
     mock_copy.assert_called_once_with("%%tana%%\n- Task 1\n- Task 2")
 
@@ -130,7 +202,7 @@ def test_main_clipboard_mode_no_tasks(mock_get_tasks, mock_is_valid):
         main()
 
     # Should return early, no clipboard copy
-    mock_get_tasks.assert_called_once_with("today")
+    mock_get_tasks.assert_called_once_with(["today"], TaskFilter())
 
 
 @patch('things_to_tana.is_api_token_valid')
@@ -143,20 +215,20 @@ def test_main_clipboard_mode_error_handling(mock_get_tasks, mock_is_valid):
     with patch.object(sys, 'argv', ['things_to_tana.py', 'today']):
         main()  # Should not raise, just print error
 
-    mock_get_tasks.assert_called_once_with("today")
+    mock_get_tasks.assert_called_once_with(["today"], TaskFilter())
 
 
 @patch('things_to_tana.is_api_token_valid')
 @patch('things_to_tana.get_things_tasks')
 @patch('things_to_tana.to_tana_paste')
-@patch('things_to_tana.pyperclip.copy')
+@patch('pyperclip.copy')
 def test_main_clipboard_mode_filters_projects(mock_copy, mock_to_tana_paste, mock_get_tasks, mock_is_valid):
     """Test main() filters out projects in clipboard mode"""
     mock_is_valid.return_value = False
     mock_get_tasks.return_value = [
-        {'title': 'Task 1', 'type': 'to-do', 'uuid': '123'},
-        {'title': 'Project 1', 'type': 'project', 'uuid': '456'},
-        {'title': 'Task 2', 'type': 'to-do', 'uuid': '789'}
+        {'title': 'Task 1', 'type': 'to-do', 'status': 'incomplete', 'uuid': '123'},
+        {'title': 'Project 1', 'type': 'project', 'status': 'incomplete', 'uuid': '456'},
+        {'title': 'Task 2', 'type': 'to-do', 'status': 'incomplete', 'uuid': '789'}
     ]
     mock_to_tana_paste.return_value = "%%tana%%\n- Task 1\n- Task 2"
 
@@ -168,6 +240,78 @@ def test_main_clipboard_mode_filters_projects(mock_copy, mock_to_tana_paste, moc
     assert len(call_args) == 2
 
 
+TASKS = [{'title': f'Task {i}', 'type': 'to-do', 'status': 'incomplete', 'uuid': f'uuid-{i}'} for i in range(20)]
+
+
+@patch('things_to_tana.is_api_token_valid', return_value=True)
+@patch('things_to_tana.get_things_tasks', return_value=iter(TASKS))
+@patch('pyperclip.copy')
+def test_main_output_writes_shards_instead_of_syncing(mock_copy, mock_get_tasks, mock_is_valid, tmp_path, capsys):
+    """--output writes Tana Paste even with a token, in shards of --shard-size bytes"""
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'today', '--output', 'tana.txt', '--shard-size', '100']), \
+         patch('sync_service.SyncService') as mock_sync_service:
+        main()
+
+    mock_sync_service.assert_not_called()
+    mock_copy.assert_not_called()
+    shards = sorted(tmp_path.glob("tana-*.txt"))
+    assert len(shards) > 1
+    texts = [shard.read_text() for shard in shards]
+    assert all(text.startswith("%%tana%%\n") and len(text) <= 100 for text in texts)
+    assert sum(text.count("\n- [ ] Task") for text in texts) == 20
+    assert f"Wrote 20 tasks to {len(shards)} files" in capsys.readouterr().out
+
+
+@patch('things_to_tana.is_api_token_valid', return_value=False)
+@patch('things_to_tana.get_things_tasks', return_value=iter(TASKS[:2]))
+@patch('things_to_tana.SUPERTAG_NAME', 'task')
+def test_main_output_to_stdout_prints_messages_to_stderr(mock_get_tasks, mock_is_valid, capsys):
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'today', '-o', '-']):
+        main()
+
+    captured = capsys.readouterr()
+    assert captured.out == "%%tana%%\n- [ ] Task 0 #task\n- [ ] Task 1 #task\n"
+    assert "Wrote 2 tasks to stdout." in captured.err
+
+
+@patch('things_to_tana.is_api_token_valid', return_value=False)
+@patch('things_to_tana.get_things_tasks', return_value=iter(TASKS))
+@patch('things_to_tana.CLIPBOARD_MAX_BYTES', 100)
+@patch('pyperclip.copy')
+def test_main_clipboard_mode_writes_files_past_the_threshold(mock_copy, mock_get_tasks, mock_is_valid, tmp_path, capsys):
+    """Output over CLIPBOARD_MAX_BYTES goes to PASTE_FILE in shards of that size, not the clipboard"""
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'today']):
+        main()
+
+    mock_copy.assert_not_called()
+    shards = sorted(tmp_path.glob("tana_paste-*.txt"))
+    assert len(shards) > 1
+    assert all(len(shard.read_text()) <= 100 for shard in shards)
+    assert sum(shard.read_text().count("\n- [ ] Task") for shard in shards) == 20
+    assert "too large to copy" in capsys.readouterr().out
+
+
+def failing_read():
+    yield TASKS[0]
+    raise OSError("disk I/O error")
+
+
+@patch('things_to_tana.is_api_token_valid', return_value=False)
+@patch('things_to_tana.get_things_tasks')
+def test_main_output_tells_read_errors_from_write_errors(mock_get_tasks, mock_is_valid, tmp_path, capsys):
+    """An OSError reading Things while writing --output is a fetch error, not a write error"""
+    mock_get_tasks.side_effect = lambda *args: failing_read()
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'today', '--output', 'tana.txt']):
+        main()
+    out = capsys.readouterr().out
+    assert "Error fetching tasks: disk I/O error" in out and "Could not write" not in out
+
+    mock_get_tasks.side_effect = lambda *args: iter(TASKS)
+    with patch.object(sys, 'argv', ['things_to_tana.py', 'today', '--output', str(tmp_path / "missing" / "tana.txt")]):
+        main()
+    out = capsys.readouterr().out
+    assert "Could not write Tana Paste" in out and "Error fetching" not in out
+
 # --- Tests for convert_task_to_node() ---
 
 def test_convert_task_to_node_basic():
@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from sync_service import SyncService
+from things_database import ThingsDatabaseProvider
+from tana_client import SENT
+from watcher import ThingsWatcher, watch, watched_database_path
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture
+def things_db(things_db):
+    things_db.add_task("Existing", start="Inbox", modified=T0)
+    things_db.commit()
+    return things_db
+
+
+def later(delay, action):
+    thread = threading.Thread(target=lambda: (time.sleep(delay), action()))
+    thread.start()
+    return thread
+
+
+def add_inbox_task(db, title, modified=T0 + 10):
+    def action():
+        db.add_task(title, start="Inbox", modified=modified)
+        db.commit()
+    return action
+
+
+@pytest.mark.parametrize("polling", [False, True])
+def test_wakes_up_on_database_write(things_db, polling):
+    with ThingsWatcher(things_db.path, debounce=0.05, poll_interval=0.02, polling=polling) as watcher:
+        assert watcher.backend.name == ("polling" if polling else "inotify")
+        assert not watcher.wait(timeout=0.1)
+
+        writer = later(0.05, add_inbox_task(things_db, "New"))
+        started = time.monotonic()
+        assert watcher.wait(timeout=5)
+        writer.join()
+
+    assert time.monotonic() - started < 1
+
+
+def test_sees_writes_to_the_wal(things_db):
+    things_db.conn.execute("PRAGMA journal_mode=WAL")
+    with ThingsWatcher(things_db.path, debounce=0.05) as watcher:
+        writer = later(0.05, add_inbox_task(things_db, "New"))
+        assert watcher.wait(timeout=5)
+        writer.join()
+
+
+def test_debounces_a_burst_of_writes(things_db):
+    def burst():
+        for i in range(5):
+            add_inbox_task(things_db, f"Burst {i}")()
+            time.sleep(0.02)
+
+    with ThingsWatcher(things_db.path, debounce=0.2) as watcher:
+        writer = later(0.05, burst)
+        assert watcher.wait(timeout=5)
+        writer.join()
+        # The whole burst was absorbed by the first wake-up
+        assert not watcher.wait(timeout=0.1)
+
+
+def test_ignores_other_files_in_the_directory(things_db, tmp_path):
+    with ThingsWatcher(things_db.path, debounce=0.05) as watcher:
+        writer = later(0.05, lambda: (tmp_path / "history.json").write_text("[]"))
+        assert not watcher.wait(timeout=0.3)
+        writer.join()
+
+
+def test_watch_syncs_only_the_delta_after_a_change(things_db):
+    with patch('sync_service.create_things_provider', return_value=ThingsDatabaseProvider(things_db.path)):
+        service = SyncService()
+    service.tana_client.post = MagicMock(return_value=SENT)
+
+    assert watched_database_path(service) == things_db.path
+    with ThingsWatcher(things_db.path, debounce=0.05) as watcher:
+        writer = later(0.2, add_inbox_task(things_db, "New"))
+        watch(service, watcher, max_syncs=2)
+        writer.join()
+
+    batches = [[node['name'] for node in json.loads(call.args[0])['nodes']] for call in service.tana_client.post.call_args_list]
+    assert batches == [["Existing"], ["New"]]
@@ -0,0 +1,323 @@
+import datetime
+import glob
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from scopes import split_scope
+from task_filter import TaskFilter
+
+# Same lookup order as things.py: $THINGSDB, then the 3.15.16+ location, then the legacy one
+DEFAULT_DB_GLOB = (
+    "~/Library/Group Containers/JLMPQHK86H.com.culturedcode.ThingsMac"
+    "/ThingsData-*/Things Database.thingsdatabase/main.sqlite"
+)
+LEGACY_DB_PATH = (
+    "~/Library/Group Containers/JLMPQHK86H.com.culturedcode.ThingsMac"
+    "/Things Database.thingsdatabase/main.sqlite"
+)
+
+# Task rows read at a time; each chunk's tags and checklist items are looked up together,
+# so a reader holds one chunk of them, not the whole library's
+ROW_CHUNK = 500
+
+TYPES = {0: 'to-do', 1: 'project', 2: 'heading'}
+STATUSES = {0: 'incomplete', 2: 'canceled', 3: 'completed'}
+STARTS = {0: 'Inbox', 1: 'Anytime', 2: 'Someday'}
+
+STATUS_CODES = {name: code for code, name in STATUSES.items()}
+TYPE_CODES = {name: code for code, name in TYPES.items()}
+
+TASK_FROM = """
+    FROM TMTask AS TASK
+    LEFT OUTER JOIN TMTask AS PROJECT ON TASK.project = PROJECT.uuid
+    LEFT OUTER JOIN TMTask AS HEADING ON TASK.heading = HEADING.uuid
+    LEFT OUTER JOIN TMTask AS PROJECT_OF_HEADING ON HEADING.project = PROJECT_OF_HEADING.uuid
+    LEFT OUTER JOIN TMArea AS AREA ON TASK.area = AREA.uuid
+"""
+
+# Visible, non-recurring tasks whose project isn't trashed (as things.py)
+VISIBLE_TASK = """
+    TASK.trashed = 0
+    AND TASK.rt1_recurrenceRule IS NULL
+    AND NOT IFNULL(PROJECT.trashed, 0)
+    AND NOT IFNULL(PROJECT_OF_HEADING.trashed, 0)
+"""
+
+# Scope predicates and orderings, mirroring things.inbox()/today()/upcoming()/anytime()/someday()/todos()
+SCOPES = {
+    "inbox": ("TASK.start = 0", 'TASK."index"'),
+    "today": (
+        """(
+            (TASK.start = 1 AND TASK.startDate IS NOT NULL)
+            OR (TASK.start = 2 AND TASK.startDate <= :today)
+            OR (TASK.startDate IS NULL AND TASK.deadline <= :today
+                AND TASK.deadlineSuppressionDate IS NULL)
+        )""",
+        "TASK.todayIndex, TASK.startDate",
+    ),
+    "upcoming": ("(TASK.start = 2 AND TASK.startDate > :today)", 'TASK."index"'),
+    "anytime": ("TASK.start = 1", 'TASK."index"'),
+    "someday": ("(TASK.start = 2 AND TASK.startDate IS NULL)", 'TASK."index"'),
+    "all": ("1", 'TASK."index"'),
+}
+# Scopes with a value (tag:NAME, project:TITLE); {key} names the value's parameter
+VALUE_SCOPES = {
+    "tag": (
+        "EXISTS (SELECT 1 FROM TMTaskTag AS SCOPE_TAG"
+        " JOIN TMTag AS SCOPE_TAG_TITLE ON SCOPE_TAG_TITLE.uuid = SCOPE_TAG.tags"
+        " WHERE SCOPE_TAG.tasks = TASK.uuid AND SCOPE_TAG_TITLE.title = :{key})",
+        'TASK."index"',
+    ),
+    "project": ("IFNULL(PROJECT.title, PROJECT_OF_HEADING.title) = :{key}", 'TASK."index"'),
+}
+
+
+def default_database_path() -> str:
+    path = os.getenv("THINGSDB")
+    if path:
+        return path
+    return next(glob.iglob(os.path.expanduser(DEFAULT_DB_GLOB)), os.path.expanduser(LEGACY_DB_PATH))
+
+
+def compile_filter(task_filter: TaskFilter) -> Tuple[str, Dict[str, Any]]:
+    """
+    Translates a TaskFilter into a SQL predicate over TASK_FROM and its parameters.
+    Every TaskFilter field can be expressed in SQL, so nothing is left for Python.
+    """
+    clauses = []
+    params: Dict[str, Any] = {}
+
+    def in_clause(column: str, name: str, values):
+        keys = []
+        for i, value in enumerate(sorted(values)):
+            params[f"{name}{i}"] = value
+            keys.append(f":{name}{i}")
+        clauses.append(f"{column} IN ({', '.join(keys)})")
+
+    if task_filter.statuses:
+        in_clause("TASK.status", "status", [STATUS_CODES[s] for s in task_filter.statuses])
+    if task_filter.types:
+        in_clause("TASK.type", "type", [TYPE_CODES[t] for t in task_filter.types])
+    if task_filter.tags:
+        tag_keys = []
+        for i, tag in enumerate(sorted(task_filter.tags)):
+            params[f"tag{i}"] = tag
+            tag_keys.append(f":tag{i}")
+        clauses.append(
+            "EXISTS (SELECT 1 FROM TMTaskTag AS FILTER_TAG"
+            " JOIN TMTag AS FILTER_TAG_TITLE ON FILTER_TAG_TITLE.uuid = FILTER_TAG.tags"
+            f" WHERE FILTER_TAG.tasks = TASK.uuid AND FILTER_TAG_TITLE.title IN ({', '.join(tag_keys)}))"
+        )
+    if task_filter.area is not None:
+        params["area"] = task_filter.area
+        clauses.append("AREA.title = :area")
+    if task_filter.project is not None:
+        params["project"] = task_filter.project
+        clauses.append("IFNULL(PROJECT.title, PROJECT_OF_HEADING.title) = :project")
+    for column, after, before in (
+        ("TASK.deadline", task_filter.deadline_after, task_filter.deadline_before),
+        ("TASK.startDate", task_filter.start_after, task_filter.start_before),
+    ):
+        name = column.split(".")[1]
+        if after is not None:
+            params[f"{name}_after"] = iso_to_things_date(after)
+            clauses.append(f"{column} >= :{name}_after")
+        if before is not None:
+            params[f"{name}_before"] = iso_to_things_date(before)
+            clauses.append(f"{column} <= :{name}_before")
+
+    return " AND ".join(clauses) or "1", params
+
+
+def scope_predicate(scope: str, key: str, params: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Returns a scope's SQL predicate over TASK_FROM and its ORDER BY columns.
+    The value of a tag:/project: scope is bound to params[key].
+    """
+    if scope in SCOPES:
+        return SCOPES[scope]
+    kind, value = split_scope(scope)
+    predicate, order_by = VALUE_SCOPES[kind]
+    params[key] = value
+    return predicate.format(key=key), order_by
+
+
+def things_date_to_iso(value: Optional[int]) -> Optional[str]:
+    """
+    Decodes a Things date integer (YYYYYYYYYYYMMMMDDDDD0000000 in binary) to YYYY-MM-DD.
+    """
+    if not value:
+        return None
+    return f"{value >> 16:04d}-{(value >> 12) & 0xF:02d}-{(value >> 7) & 0x1F:02d}"
+
+
+def iso_to_things_date(iso_date: str) -> int:
+    date = datetime.date.fromisoformat(iso_date)
+    return (date.year << 16) | (date.month << 12) | (date.day << 7)
+
+
+class ThingsDatabaseProvider:
+    """
+    Reads tasks straight from the Things main.sqlite, opened read-only.
+
+    The scopes of a run are resolved together, once, into a temporary table
+    and then fetched with three set-based queries (tasks, their tags, their
+    checklist items) instead of the per-task queries things.py issues. Tasks are yielded one at a time
+    as compact dicts with the keys things.py uses: uuid, type, title, status,
+    notes, start, start_date, deadline, tags, checklist, area_title and
+    project_title, plus modified_at (the raw userModificationDate as a Unix
+    timestamp).
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or default_database_path()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+
+    def get_inbox_tasks(
+        self, modified_since: Optional[float] = None, task_filter: Optional[TaskFilter] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields tasks from the Things 3 Inbox.
+        """
+        return self._iter_scope("inbox", modified_since, task_filter)
+
+    def get_today_tasks(
+        self, modified_since: Optional[float] = None, task_filter: Optional[TaskFilter] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields tasks from the Things 3 Today list.
+        """
+        return self._iter_scope("today", modified_since, task_filter)
+
+    def get_all_tasks(
+        self, modified_since: Optional[float] = None, task_filter: Optional[TaskFilter] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields tasks from every list (active to-dos unless task_filter says otherwise).
+        """
+        return self._iter_scope("all", modified_since, task_filter)
+
+    def get_tasks_in_scopes(
+        self, watermarks: Dict[str, Optional[float]], task_filter: Optional[TaskFilter] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the tasks of several scopes with a single query. `watermarks`
+        maps each scope to the Unix timestamp its tasks must have been
+        modified after (None for all of them). Each task comes once, with a
+        'scopes' key listing the scopes it is in, in the order given; tasks
+        are ordered by their first scope.
+        """
+        scopes = list(watermarks)
+        for task, membership in self._iter_scopes(watermarks, task_filter):
+            task['scopes'] = [scope for i, scope in enumerate(scopes) if membership >> i & 1]
+            yield task
+
+    def _iter_scope(
+        self, scope: str, modified_since: Optional[float] = None, task_filter: Optional[TaskFilter] = None
+    ) -> Iterator[Dict[str, Any]]:
+        return (task for task, _ in self._iter_scopes({scope: modified_since}, task_filter))
+
+    def _iter_scopes(
+        self, watermarks: Dict[str, Optional[float]], task_filter: Optional[TaskFilter] = None
+    ) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """
+        Yields (task, membership) for the tasks matching task_filter (active
+        to-dos by default) in any of the scopes, where bit i of membership is
+        set if the task is in the i-th scope and its userModificationDate is
+        later than that scope's watermark.
+        """
+        filter_predicate, params = compile_filter(task_filter or TaskFilter())
+        params["today"] = iso_to_things_date(datetime.date.today().isoformat())
+        members, orders = [], []
+        for i, (scope, since) in enumerate(watermarks.items()):
+            predicate, order_by = scope_predicate(scope, f"scope{i}", params)
+            if since is not None:
+                params[f"since{i}"] = since
+                predicate = f"({predicate} AND TASK.userModificationDate > :since{i})"
+            members.append(f"CASE WHEN {predicate} THEN 1 ELSE 0 END")
+            orders.extend(f"CASE SCOPE.first WHEN {i} THEN {column.strip()} END" for column in order_by.split(","))
+        membership = " | ".join(f"({member} << {i})" for i, member in enumerate(members))
+        first = "CASE " + " ".join(f"WHEN {member} THEN {i}" for i, member in enumerate(members)) + " END"
+        conn = self._connect()
+        try:
+            # Resolve the scopes once; the task rows join against it
+            conn.execute(
+                "CREATE TEMP TABLE scope_tasks (uuid TEXT PRIMARY KEY, membership INTEGER, first INTEGER) WITHOUT ROWID"
+            )
+            conn.execute(
+                f"""
+                INSERT INTO scope_tasks
+                SELECT * FROM (SELECT TASK.uuid, {membership} AS membership, {first}
+                               {TASK_FROM} WHERE {VISIBLE_TASK} AND {filter_predicate})
+                WHERE membership != 0
+                """,
+                params,
+            )
+            cursor = conn.execute(
+                f"""
+                SELECT TASK.uuid, TASK.type, TASK.title, TASK.status, TASK.notes,
+                       TASK.start, TASK.startDate, TASK.deadline, TASK.userModificationDate,
+                       AREA.title, IFNULL(PROJECT.title, PROJECT_OF_HEADING.title), SCOPE.membership
+                {TASK_FROM}
+                JOIN temp.scope_tasks AS SCOPE ON SCOPE.uuid = TASK.uuid
+                ORDER BY SCOPE.first, {", ".join(orders)}
+                """
+            )
+            for rows in iter(lambda: cursor.fetchmany(ROW_CHUNK), []):
+                uuids = [row[0] for row in rows]
+                tags = self._fetch_tags(conn, uuids)
+                checklists = self._fetch_checklists(conn, uuids)
+                for (uuid, type_, title, status, notes, start, start_date, deadline, modified,
+                     area_title, project_title, membership_bits) in rows:
+                    yield {
+                        'uuid': uuid,
+                        'type': TYPES.get(type_),
+                        'title': title,
+                        'status': STATUSES.get(status),
+                        'notes': notes or '',
+                        'start': STARTS.get(start),
+                        'start_date': things_date_to_iso(start_date),
+                        'deadline': things_date_to_iso(deadline),
+                        'tags': tags.get(uuid, []),
+                        'checklist': checklists.get(uuid, []),
+                        'area_title': area_title,
+                        'project_title': project_title,
+                        'modified_at': modified,
+                    }, membership_bits
+        finally:
+            conn.close()
+
+    def _fetch_tags(self, conn: sqlite3.Connection, uuids: List[str]) -> Dict[str, List[str]]:
+        tags: Dict[str, List[str]] = {}
+        rows = conn.execute(
+            f"""
+            SELECT TASK_TAG.tasks, TAG.title
+            FROM TMTaskTag AS TASK_TAG
+            JOIN TMTag AS TAG ON TAG.uuid = TASK_TAG.tags
+            WHERE TASK_TAG.tasks IN ({", ".join("?" * len(uuids))})
+            ORDER BY TAG."index"
+            """,
+            uuids,
+        )
+        for task_uuid, title in rows:
+            tags.setdefault(task_uuid, []).append(title)
+        return tags
+
+    def _fetch_checklists(self, conn: sqlite3.Connection, uuids: List[str]) -> Dict[str, List[Dict[str, str]]]:
+        checklists: Dict[str, List[Dict[str, str]]] = {}
+        rows: Iterable[Tuple[str, str, int]] = conn.execute(
+            f"""
+            SELECT ITEM.task, ITEM.title, ITEM.status
+            FROM TMChecklistItem AS ITEM
+            WHERE ITEM.task IN ({", ".join("?" * len(uuids))})
+            ORDER BY ITEM."index"
+            """,
+            uuids,
+        )
+        for task_uuid, title, status in rows:
+            checklists.setdefault(task_uuid, []).append(
+                {'title': title, 'status': STATUSES.get(status)}
+            )
+        return checklists
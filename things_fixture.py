@@ -0,0 +1,297 @@
+"""
+Synthetic Things 3 databases for tests and benchmarks.
+
+Creates a SQLite file with the subset of the Things schema (TMTask, TMTag,
+TMTaskTag, TMChecklistItem, TMArea, Meta) that both things.py and
+ThingsDatabaseProvider read, so both can be pointed at it.
+"""
+import datetime
+import plistlib
+import random
+import sqlite3
+import string
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional
+from things_database import iso_to_things_date
+
+# Values used by Things in TMTask / TMChecklistItem
+TYPE_CODES = {'to-do': 0, 'project': 1, 'heading': 2}
+STATUS_CODES = {'incomplete': 0, 'canceled': 2, 'completed': 3}
+START_CODES = {'Inbox': 0, 'Anytime': 1, 'Someday': 2}
+
+SCHEMA = """
+CREATE TABLE Meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE TMArea (uuid TEXT PRIMARY KEY, title TEXT, visible INTEGER, "index" INTEGER);
+CREATE TABLE TMAreaTag (areas TEXT, tags TEXT);
+CREATE TABLE TMTag (uuid TEXT PRIMARY KEY, title TEXT, shortcut TEXT, parent TEXT, "index" INTEGER);
+CREATE TABLE TMTask (
+    uuid TEXT PRIMARY KEY,
+    type INTEGER,
+    trashed INTEGER,
+    title TEXT,
+    notes TEXT,
+    status INTEGER,
+    stopDate REAL,
+    creationDate REAL,
+    userModificationDate REAL,
+    start INTEGER,
+    startDate INTEGER,
+    deadline INTEGER,
+    deadlineSuppressionDate INTEGER,
+    reminderTime INTEGER,
+    "index" INTEGER,
+    todayIndex INTEGER,
+    area TEXT,
+    project TEXT,
+    heading TEXT,
+    rt1_recurrenceRule BLOB
+);
+CREATE TABLE TMTaskTag (tasks TEXT, tags TEXT);
+CREATE TABLE TMChecklistItem (
+    uuid TEXT PRIMARY KEY,
+    title TEXT,
+    status INTEGER,
+    stopDate REAL,
+    creationDate REAL,
+    userModificationDate REAL,
+    task TEXT,
+    "index" INTEGER
+);
+CREATE INDEX index_TMTask_project ON TMTask(project);
+CREATE INDEX index_TMTask_area ON TMTask(area);
+CREATE INDEX index_TMTask_heading ON TMTask(heading);
+CREATE INDEX index_TMTask_stopDate ON TMTask(stopDate);
+CREATE INDEX index_TMTaskTag_tasks ON TMTaskTag(tasks);
+CREATE INDEX index_TMChecklistItem_task ON TMChecklistItem(task);
+"""
+
+ALPHABET = string.ascii_letters + string.digits
+WORDS = "plan call review draft buy email fix book write read send check update meeting report".split()
+
+
+class ThingsFixture:
+    """
+    Builder for a synthetic Things database.
+
+    Example:
+        with ThingsFixture(path) as db:
+            db.add_task("Buy milk", start="Inbox", tags=["errand"])
+    """
+
+    def __init__(self, path: str, database_version: int = 26, seed: int = 0):
+        self.path = path
+        # Tests write from a background thread to simulate the Things app
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(
+            "INSERT INTO Meta (key, value) VALUES ('databaseVersion', ?)",
+            (plistlib.dumps(database_version).decode(),),
+        )
+        self._rng = random.Random(seed)
+        self._tags = {}
+        self._index = 0
+        self._now = time.time()
+
+    def __enter__(self) -> 'ThingsFixture':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def new_uuid(self) -> str:
+        return "".join(self._rng.choices(ALPHABET, k=22))
+
+    def add_tag(self, title: str) -> str:
+        if title not in self._tags:
+            tag_uuid = self.new_uuid()
+            self.conn.execute(
+                'INSERT INTO TMTag (uuid, title, "index") VALUES (?, ?, ?)',
+                (tag_uuid, title, len(self._tags)),
+            )
+            self._tags[title] = tag_uuid
+        return self._tags[title]
+
+    def add_area(self, title: str) -> str:
+        area_uuid = self.new_uuid()
+        self.conn.execute(
+            'INSERT INTO TMArea (uuid, title, visible, "index") VALUES (?, ?, 1, ?)',
+            (area_uuid, title, self._next_index()),
+        )
+        return area_uuid
+
+    def add_project(self, title: str, **kwargs) -> str:
+        return self.add_task(title, type='project', **kwargs)
+
+    def add_task(
+        self,
+        title: str,
+        type: str = 'to-do',
+        status: str = 'incomplete',
+        start: str = 'Anytime',
+        notes: str = '',
+        tags: Iterable[str] = (),
+        checklist: Iterable = (),
+        start_date: Optional[str] = None,
+        deadline: Optional[str] = None,
+        area: Optional[str] = None,
+        project: Optional[str] = None,
+        heading: Optional[str] = None,
+        trashed: bool = False,
+        today_index: int = 0,
+        modified: Optional[float] = None,
+        recurring: bool = False,
+        uuid: Optional[str] = None,
+    ) -> str:
+        """
+        Inserts a task and returns its UUID. Checklist items are titles, or
+        (title, status) tuples.
+        """
+        task_uuid = uuid or self.new_uuid()
+        modified = self._now if modified is None else modified
+        self.conn.execute(
+            """
+            INSERT INTO TMTask (
+                uuid, type, trashed, title, notes, status, stopDate, creationDate,
+                userModificationDate, start, startDate, deadline, "index", todayIndex,
+                area, project, heading, rt1_recurrenceRule
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                task_uuid,
+                TYPE_CODES[type],
+                int(trashed),
+                title,
+                notes,
+                STATUS_CODES[status],
+                modified if status != 'incomplete' else None,
+                modified,
+                modified,
+                START_CODES[start],
+                iso_to_things_date(start_date) if start_date else None,
+                iso_to_things_date(deadline) if deadline else None,
+                self._next_index(),
+                today_index,
+                area,
+                project,
+                heading,
+                b"rule" if recurring else None,
+            ),
+        )
+        for tag in tags:
+            self.conn.execute(
+                "INSERT INTO TMTaskTag (tasks, tags) VALUES (?, ?)", (task_uuid, self.add_tag(tag))
+            )
+        for position, item in enumerate(checklist):
+            item_title, item_status = (item, 'incomplete') if isinstance(item, str) else item
+            self.conn.execute(
+                """
+                INSERT INTO TMChecklistItem (
+                    uuid, title, status, creationDate, userModificationDate, task, "index"
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (self.new_uuid(), item_title, STATUS_CODES[item_status], modified, modified,
+                 task_uuid, position),
+            )
+        return task_uuid
+
+    def touch(self, task_uuid: str, title: Optional[str] = None, modified: Optional[float] = None):
+        """
+        Simulates an edit in Things: bumps userModificationDate (and optionally the title).
+        """
+        modified = time.time() if modified is None else modified
+        if title is None:
+            self.conn.execute(
+                "UPDATE TMTask SET userModificationDate = ? WHERE uuid = ?", (modified, task_uuid)
+            )
+        else:
+            self.conn.execute(
+                "UPDATE TMTask SET title = ?, userModificationDate = ? WHERE uuid = ?",
+                (title, modified, task_uuid),
+            )
+        self.conn.commit()
+
+    def _next_index(self) -> int:
+        self._index += 1
+        return self._index
+
+
+@dataclass(frozen=True)
+class LibraryProfile:
+    """
+    Shape of a generated library. Counts are maxima: each task draws its
+    note lines, tags and checklist items uniformly from 0 to the maximum.
+    The defaults are the library the benchmarks have always used.
+    """
+    max_note_lines: int = 3
+    # Random words added to each note line, for larger notes
+    note_words: int = 0
+    max_checklist_items: int = 3
+    # Distinct tags in the library, and the most one task has
+    tag_count: int = 20
+    max_tags: int = 2
+    # Projects (each holding a share of the non-Inbox tasks) and areas (holding the projects)
+    projects: int = 0
+    areas: int = 0
+    # Share of tasks with a deadline
+    deadline_share: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def generate_library(
+    path: str, task_count: int, seed: int = 0, profile: Optional[LibraryProfile] = None
+) -> List[str]:
+    """
+    Fills a new fixture database with task_count to-dos spread over the
+    Inbox, Today, Anytime and Someday lists, shaped by profile. Returns the
+    to-do UUIDs.
+    """
+    profile = profile or LibraryProfile()
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    task_uuids = []
+    with ThingsFixture(path, seed=seed) as db:
+        tags = [f"tag {i}" for i in range(profile.tag_count)]
+        areas = [db.add_area(f"Area {i}") for i in range(profile.areas)]
+        projects = [
+            db.add_project(f"Project {i}", area=areas[i % len(areas)] if areas else None)
+            for i in range(profile.projects)
+        ]
+        for i in range(task_count):
+            roll = rng.random()
+            kwargs = {}
+            if roll < 0.2:
+                kwargs['start'] = 'Inbox'
+            elif roll < 0.4:
+                kwargs['start_date'] = today.isoformat()
+            elif roll < 0.9:
+                kwargs['start'] = 'Anytime'
+            else:
+                kwargs['start'] = 'Someday'
+            if rng.random() < 0.1:
+                kwargs['status'] = 'completed'
+            if projects and kwargs.get('start') != 'Inbox' and rng.random() < 0.5:
+                kwargs['project'] = rng.choice(projects)
+            if profile.deadline_share and rng.random() < profile.deadline_share:
+                kwargs['deadline'] = (today + datetime.timedelta(days=rng.randint(0, 60))).isoformat()
+            task_uuids.append(db.add_task(
+                f"Task {i}",
+                notes="\n".join(
+                    f"Note line {n}" + "".join(" " + rng.choice(WORDS) for _ in range(profile.note_words))
+                    for n in range(rng.randint(0, profile.max_note_lines))
+                ),
+                tags=rng.sample(tags, rng.randint(0, min(profile.max_tags, len(tags)))),
+                checklist=[f"Step {n}" for n in range(rng.randint(0, profile.max_checklist_items))],
+                today_index=i,
+                **kwargs,
+            ))
+    return task_uuids
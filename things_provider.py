@@ -1,21 +1,129 @@
 import things
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
+from config import THINGS_PROVIDER
+from scopes import split_scope
+from task_filter import TaskFilter
 
 class ThingsProvider:
-    def get_inbox_tasks(self) -> List[Dict[str, Any]]:
+    def get_inbox_tasks(
+        self, modified_since: Optional[float] = None, task_filter: Optional[TaskFilter] = None
+    ) -> List[Dict[str, Any]]:
         """
         Fetches tasks from Things 3 Inbox.
         """
-        return things.inbox()
+        tasks = things.tasks(start="Inbox", **_things_kwargs(task_filter))
+        return _modified_after(tasks, modified_since)
 
-    def get_today_tasks(self) -> List[Dict[str, Any]]:
+    def get_today_tasks(
+        self, modified_since: Optional[float] = None, task_filter: Optional[TaskFilter] = None
+    ) -> List[Dict[str, Any]]:
         """
         Fetches tasks from Things 3 Today list.
         """
-        return things.today()
+        # things.today() sets its own start/start_date/deadline filters
+        tasks = things.today(**_things_kwargs(task_filter, dates=False))
+        return _modified_after(tasks, modified_since)
 
-    def get_all_tasks(self) -> List[Dict[str, Any]]:
+    def get_all_tasks(
+        self, modified_since: Optional[float] = None, task_filter: Optional[TaskFilter] = None
+    ) -> List[Dict[str, Any]]:
         """
-        Fetches all tasks.
+        Fetches all tasks (active to-dos unless task_filter says otherwise).
         """
-        return things.todos()
+        tasks = things.tasks(**_things_kwargs(task_filter))
+        return _modified_after(tasks, modified_since)
+
+    def get_tasks_in_scopes(
+        self, watermarks: Dict[str, Optional[float]], task_filter: Optional[TaskFilter] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetches the tasks of several scopes, each task once, with a 'scopes'
+        key listing the scopes it is in (see ThingsDatabaseProvider).
+        things.py has no query for a union of lists, so this reads each scope
+        in turn and merges them by UUID.
+        """
+        merged: Dict[str, Dict[str, Any]] = {}
+        for scope, since in watermarks.items():
+            for task in _modified_after(self._scope_tasks(scope, task_filter), since):
+                merged.setdefault(task['uuid'], dict(task, scopes=[]))['scopes'].append(scope)
+        return list(merged.values())
+
+    def _scope_tasks(self, scope: str, task_filter: Optional[TaskFilter]) -> List[Dict[str, Any]]:
+        kind, value = split_scope(scope)
+        if kind == "inbox":
+            return things.tasks(start="Inbox", **_things_kwargs(task_filter))
+        if kind == "tag":
+            return things.tasks(tag=value, **_things_kwargs(task_filter))
+        if kind == "project":
+            # things.py selects projects by UUID
+            return [
+                task
+                for project in things.projects(status=None)
+                if project['title'] == value
+                for task in things.tasks(project=project['uuid'], **_things_kwargs(task_filter))
+            ]
+        if kind == "anytime":
+            return things.anytime(**_things_kwargs(task_filter))
+        # today(), upcoming() and someday() set their own start date filters
+        return getattr(things, kind)(**_things_kwargs(task_filter, dates=False))
+
+
+def _things_kwargs(task_filter: Optional[TaskFilter], dates: bool = True) -> Dict[str, Any]:
+    """
+    Pushes the parts of a TaskFilter that things.py can express into its SQL.
+    things.py takes a single status/type and one bound per date, so anything
+    else is left to TaskFilter.matches() in the caller.
+    """
+    task_filter = task_filter or TaskFilter()
+    kwargs: Dict[str, Any] = {
+        # things.py defaults to incomplete; None means any status
+        "status": next(iter(task_filter.statuses)) if len(task_filter.statuses) == 1 else None,
+    }
+    if len(task_filter.types) == 1:
+        kwargs["type"] = next(iter(task_filter.types))
+    if dates:
+        for name, after, before in (
+            ("deadline", task_filter.deadline_after, task_filter.deadline_before),
+            ("start_date", task_filter.start_after, task_filter.start_before),
+        ):
+            if after and not before:
+                kwargs[name] = f">={after}"
+            elif before and not after:
+                kwargs[name] = f"<={before}"
+    return kwargs
+
+
+def modification_time(task: Dict[str, Any]) -> Optional[float]:
+    """
+    Returns when a task was last modified in Things, as a Unix timestamp.
+    Uses the raw 'modified_at' of ThingsDatabaseProvider records, or parses the
+    local-time 'modified' string that things.py returns.
+    """
+    if task.get('modified_at') is not None:
+        return task['modified_at']
+    modified = task.get('modified')
+    if not modified:
+        return None
+    return time.mktime(time.strptime(modified, "%Y-%m-%d %H:%M:%S"))
+
+
+def _modified_after(tasks: List[Dict[str, Any]], modified_since: Optional[float]) -> List[Dict[str, Any]]:
+    # things.py has no modification-date filter and only reports whole seconds,
+    # so this is a Python-side filter that keeps tasks from the watermark's second
+    if modified_since is None:
+        return tasks
+    threshold = int(modified_since)
+    return [task for task in tasks if (modification_time(task) or threshold) >= threshold]
+
+
+def create_things_provider(provider: str = THINGS_PROVIDER):
+    """
+    Returns the Things data source selected by THINGS_PROVIDER ('things' or 'sqlite').
+    """
+    if provider == "things":
+        return ThingsProvider()
+    if provider == "sqlite":
+        from things_database import ThingsDatabaseProvider
+        return ThingsDatabaseProvider()
+    raise ValueError(f"Unknown Things provider: {provider}. Use 'things' or 'sqlite'.")
@@ -1,9 +1,21 @@
-import pyperclip
+import argparse
+import contextlib
+import itertools
 import sys
-from tana_formatter import TanaNode, to_tana_paste, tana_date
-from things_provider import ThingsProvider
-from config import SUPERTAG_NAME, TANA_API_TOKEN
-from sync_service import SyncService
+from typing import Iterator, List, Optional, TextIO, Tuple
+import instrumentation
+from models import TanaNode, task_to_node
+from paste_output import HEADER, PasteWriteError, write_paste
+from tana_formatter import node_to_paste, to_tana_paste
+from things_provider import create_things_provider
+from config import CLIPBOARD_MAX_BYTES, DEBUG, PASTE_FILE, SUPERTAG_NAME, TANA_API_TOKEN, WATCH_DEBOUNCE
+from conversion_cache import ConversionCache
+from history_manager import content_hash, create_history_manager
+from task_filter import STATUSES, TaskFilter, add_filter_arguments, filter_from_args
+from scopes import expand_scopes
+
+# Each mode imports what only it needs when it runs (sync_service and requests for API
+# sync, pyperclip for clipboard sync), so neither pays for the other at startup.
 
 
 def is_api_token_valid():
@@ -18,125 +30,292 @@ def is_api_token_valid():
     return True
 
 
-def get_things_tasks(scope="today"):
+def get_things_tasks(scopes=("today",), task_filter=None):
     """
-    Fetches tasks from Things 3 based on scope.
-    Scope can be 'today', 'inbox', or 'all'.
+    Fetches the tasks of the given scopes from Things 3 in one pass, each task
+    once (see scopes.py for what a scope can be; 'all' is Inbox and Today).
+    task_filter is pushed down to the provider's query where possible. Tasks
+    are yielded as the provider reads them.
     """
-    provider = ThingsProvider()
-    if scope == "today":
-        return provider.get_today_tasks()
-    elif scope == "inbox":
-        return provider.get_inbox_tasks()
-    else:
-        # For 'all', we might want to be careful. get_all_tasks() returns all.
-        return provider.get_all_tasks()
+    provider = create_things_provider()
+    watermarks = dict.fromkeys(expand_scopes(scopes))
+    return provider.get_tasks_in_scopes(watermarks, task_filter=task_filter)
 
 
 def convert_task_to_node(task) -> TanaNode:
     """
-    Converts a Things 3 task dictionary to a TanaNode.
+    Converts a Things 3 task dictionary to a TanaNode for Tana Paste: the
+    configured supertag and the task's tags by name, due date, and checkboxes.
     """
-    title = task.get('title', 'Untitled Task')
-    notes = task.get('notes', '')
-    tags = task.get('tags', [])
-    due_date = task.get('due_date')
-    checklist = task.get('checklist', [])
-    status = task.get('status', '')
+    return task_to_node(task, supertags=[SUPERTAG_NAME] if SUPERTAG_NAME else ())
 
-    # Create the main node
-    node_text = title
 
-    # Add due date to text if present
-    if due_date:
-        node_text += f" {tana_date(due_date)}"
+def paste_fragment(task, cache: ConversionCache) -> str:
+    """
+    The task as Tana Paste lines, from the conversion cache when the same
+    content was rendered before with the same supertag and status.
+    """
+    if not cache.enabled:
+        return node_to_paste(convert_task_to_node(task))
+    key = cache.key(task['uuid'], content_hash(task), "paste", SUPERTAG_NAME or "", task.get('status') or "")
+    cached = cache.get(key)
+    if cached is not None:
+        return cached[0]
+    node = convert_task_to_node(task)
+    text = node_to_paste(node)
+    cache.put(key, text, 1 + text.count("\n"))
+    return text
 
-    # Determine checkbox state
-    checked = False
-    if status == 'completed':
-        checked = True
-    elif status == 'canceled':
-        # Tana doesn't have a 'canceled' state for checkboxes natively in paste,
-        # but we can mark it checked or add a tag. Let's just mark checked for now.
-        checked = True
-        node_text += " #canceled"
 
-    node = TanaNode(text=node_text, checked=checked)
+def take_clipboard_paste(fragments: Iterator[str]) -> Tuple[List[str], bool]:
+    """
+    Reads fragments while their Tana Paste fits in CLIPBOARD_MAX_BYTES.
+    Returns the fragments read, with the first that didn't fit, and whether all fit.
+    """
+    taken = []
+    size = len(HEADER)
+    for fragment in fragments:
+        taken.append(fragment)
+        size += 1 + len(fragment.encode("utf-8"))
+        if size > CLIPBOARD_MAX_BYTES:
+            return taken, False
+    return taken, True
 
-    # Add configured supertag
-    if SUPERTAG_NAME:
-        node.add_supertag(SUPERTAG_NAME)
 
-    # Add tags as supertags (proper Tana format)
-    for tag in tags:
-        node.add_supertag(tag)
+def report_written(writer):
+    """Prints where a write_paste() put the tasks."""
+    if not writer.fragments:
+        print("No tasks matched the filter; nothing written.")
+    elif writer.path == "-":
+        print(f"Wrote {writer.fragments:,} tasks to stdout.")
+    elif len(writer.paths) == 1:
+        print(f"Wrote {writer.fragments:,} tasks to {writer.paths[0]}.")
+    else:
+        print(f"Wrote {writer.fragments:,} tasks to {len(writer.paths)} files, "
+              f"{writer.paths[0]} to {writer.paths[-1]}; paste them into Tana one at a time.")
 
-    # Add notes as a child node if they exist
-    if notes:
-        # Split notes by line to preserve structure
-        for line in notes.split('\n'):
-            if line.strip():
-                node.add_child(TanaNode(text=line))
 
-    # Add checklist items as children
-    for item in checklist:
-        item_title = item.get('title', '')
-        item_status = item.get('status', '')
-        item_checked = (item_status == 'completed')
-        node.add_child(TanaNode(text=item_title, checked=item_checked))
+def import_tags(path):
+    """
+    Adds the tag name -> supertag node ID pairs of a mapping file or Tana
+    export to the tag index used by API sync.
+    """
+    from tag_index import TagIndex
+    index = TagIndex()
+    try:
+        count = index.import_file(path)
+    except (OSError, ValueError) as e:
+        print(f"Could not import tags from {path}: {e}")
+        return
+    print(f"Imported {count} tag IDs into {index.file_path} ({len(index)} tags in total).")
 
-    return node
+
+def import_history(path):
+    """
+    Records the Things tasks that a Tana JSON export or a saved Tana Paste
+    file already holds as synced, so the first API sync doesn't send them again.
+    """
+    from history_import import import_file
+    history = create_history_manager()
+    try:
+        # Completed and canceled tasks too: they may have been pasted while still open
+        tasks = create_things_provider().get_all_tasks(task_filter=TaskFilter(statuses=frozenset(STATUSES)))
+        result = import_file(path, tasks, history)
+    except (OSError, ValueError) as e:
+        print(f"Could not import history from {path}: {e}")
+        return
+    print(f"Read {result.nodes} nodes from {path}: {result.matched} Things tasks marked as synced.")
+    if result.ambiguous:
+        print(f"{result.ambiguous} nodes were skipped: they matched several Things tasks by title, "
+              f"or another node matched the same task.")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sync tasks from Things 3 to Tana.")
+    parser.add_argument("scopes", nargs="*", default=["today"], metavar="scope",
+                        help="Scopes to sync, in one pass: inbox, today, upcoming, anytime, someday, "
+                             "tag:NAME, project:TITLE or all (inbox and today; default: today). "
+                             "Or 'watch' to keep syncing Inbox and Today as Things changes, "
+                             "or 'flush' to send what the outbox holds from offline runs (API mode)")
+    parser.add_argument("--full", action="store_true",
+                        help="API mode: ignore the stored modification watermark and re-read every task in scope")
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE, metavar="SECONDS",
+                        help=f"watch: quiet period after a change before syncing (default: {WATCH_DEBOUNCE})")
+    parser.add_argument("--poll", action="store_true",
+                        help="watch: poll the database files instead of using inotify")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="watch: serve Prometheus metrics at http://METRICS_HOST:PORT/metrics")
+    parser.add_argument("--output", "-o", metavar="FILE",
+                        help="Write Tana Paste to FILE ('-' for stdout) instead of the clipboard, "
+                             "even with TANA_API_TOKEN set")
+    parser.add_argument("--shard-size", type=int, metavar="BYTES",
+                        help="Split the Tana Paste into files of at most BYTES, FILE-001, FILE-002, ..., "
+                             "each a complete document to paste on its own (default for output too "
+                             f"large for the clipboard: CLIPBOARD_MAX_BYTES, {CLIPBOARD_MAX_BYTES:,})")
+    parser.add_argument("--import-tags", metavar="FILE",
+                        help="Save the supertag node IDs of Things tags for API sync, from a Tana workspace "
+                             "export (JSON) or a JSON object of tag names to node IDs, then exit")
+    parser.add_argument("--import-history", metavar="FILE",
+                        help="Mark the Things tasks already in Tana as synced, from a Tana workspace export "
+                             "(JSON) or a saved Tana Paste file, so API sync doesn't send them again, then exit")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time each stage of the run (Things reads, conversion, history, Tana calls) "
+                             "and print a summary table at the end")
+    parser.add_argument("--profile-trace", metavar="FILE",
+                        help="With --profile (implied), also write the timings as a Chrome trace "
+                             "(chrome://tracing, ui.perfetto.dev)")
+    add_filter_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def run_watch(service, debounce, polling=False, metrics_port=None):
+    """
+    Runs the watch daemon until interrupted, serving the service's metrics
+    on metrics_port if one is given.
+    """
+    from watcher import ThingsWatcher, watch, watched_database_path
+    db_path = watched_database_path(service)
+    server = None
+    if metrics_port is not None:
+        try:
+            server = service.metrics.serve(metrics_port)
+        except OSError as e:
+            print(f"Could not serve metrics on port {metrics_port}: {e}")
+            return
+        host, port = server.server_address[:2]
+        print(f"Serving metrics at http://{host}:{port}/metrics")
+    try:
+        with ThingsWatcher(db_path, debounce=debounce, polling=polling) as watcher:
+            print(f"Watching {db_path} ({watcher.backend.name}). Press Ctrl+C to stop.")
+            try:
+                watch(service, watcher)
+            except KeyboardInterrupt:
+                print("Stopped watching.")
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
 
 
 def main():
-    scope = "today"
-    if len(sys.argv) > 1:
-        scope = sys.argv[1]
+    args = parse_args()
+    stdout = sys.stdout
+    with contextlib.ExitStack() as stack:
+        if args.output == "-":
+            # The Tana Paste goes to stdout, so everything else is printed to stderr
+            stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        if args.profile or args.profile_trace:
+            stack.enter_context(instrumentation.profiling(args.profile_trace))
+        run(args, stdout)
+
+
+def run(args: argparse.Namespace, stdout: Optional[TextIO] = None):
+    """
+    Runs the command parsed from the command line; `--output -` writes to
+    stdout (sys.stdout if not given).
+    """
+    if args.import_tags:
+        import_tags(args.import_tags)
+        return
+    if args.import_history:
+        import_history(args.import_history)
+        return
+    scope = " ".join(args.scopes)
+    task_filter = filter_from_args(args)
+    if scope not in ("watch", "flush"):
+        try:
+            scopes = expand_scopes(args.scopes)
+        except ValueError as e:
+            print(e)
+            return
+    elif args.output:
+        print(f"--output writes Tana Paste; it can't be used with '{scope}'.")
+        return
+    if args.shard_size is not None and args.shard_size <= 0:
+        print("--shard-size must be a positive number of bytes.")
+        return
+    if args.output == "-" and args.shard_size is not None:
+        print("--shard-size needs --output FILE; stdout can't be split into files.")
+        return
 
-    # Check if API token is configured
-    if is_api_token_valid():
+    # Check if API token is configured (--output asks for Tana Paste whatever the mode)
+    if is_api_token_valid() and not args.output:
         # API Sync Mode
         print(f"Using API sync mode (TANA_API_TOKEN configured)")
         print(f"Syncing '{scope}' tasks from Things 3 to Tana...")
 
-        service = SyncService()
+        from sync_service import SyncService
+        service = SyncService(full=args.full, task_filter=task_filter)
 
-        if scope == "inbox":
-            service.sync_inbox()
-        elif scope == "today":
-            service.sync_today()
-        elif scope == "all":
+        if scope == "watch":
+            run_watch(service, args.debounce, args.poll, args.metrics_port)
+        elif scope == "flush":
+            if service.flush_outbox():
+                print("Outbox is empty.")
+        elif scopes == ["inbox"]:
             service.sync_inbox()
+        elif scopes == ["today"]:
             service.sync_today()
         else:
-            print(f"Unknown scope: {scope}. Use 'inbox', 'today', or 'all'.")
+            service.sync_scopes(scopes)
+    elif scope in ("watch", "flush"):
+        print(f"'{scope}' requires API sync. Set TANA_API_TOKEN first.")
     else:
         # Clipboard Sync Mode
-        print(f"Using clipboard sync mode (no valid TANA_API_TOKEN)")
+        if args.output:
+            print(f"Writing Tana Paste to {'stdout' if args.output == '-' else args.output}")
+        else:
+            print(f"Using clipboard sync mode (no valid TANA_API_TOKEN)")
         print(f"Fetching '{scope}' tasks from Things 3...")
 
+        cache = ConversionCache()
+        fragment = instrumentation.wrap("convert.paste", paste_fragment)
+        progress = sys.stderr if sys.stderr.isatty() else None
+        writer = tana_paste_text = None
         try:
-            tasks = get_things_tasks(scope)
+            tasks = iter(get_things_tasks(scopes, task_filter))
+            first = next(tasks, None)
+            if first is None:
+                print("No tasks found.")
+                return
+            tasks = itertools.chain([first], tasks)
+            # Python fallback for filter parts the provider couldn't push into its query
+            # (by default: filters out projects and completed/canceled tasks)
+            fragments = (fragment(task, cache) for task in instrumentation.timed("things.fetch", tasks)
+                         if task_filter.matches(task))
+            with instrumentation.span("paste.render"):
+                if args.output:
+                    writer = write_paste(fragments, args.output, args.shard_size, stdout, progress)
+                else:
+                    taken, fits = take_clipboard_paste(fragments)
+                    if fits:
+                        tana_paste_text = to_tana_paste(taken)
+                    else:
+                        print(f"Tana Paste is over CLIPBOARD_MAX_BYTES ({CLIPBOARD_MAX_BYTES:,} bytes), "
+                              f"too large to copy; writing it to {PASTE_FILE} instead.")
+                        writer = write_paste(itertools.chain(taken, fragments), PASTE_FILE,
+                                             args.shard_size or CLIPBOARD_MAX_BYTES, progress=progress)
+        except PasteWriteError as e:
+            print(f"Could not write Tana Paste: {e}")
+            return
         except Exception as e:
             print(f"Error fetching tasks: {e}")
             print("Make sure Things 3 is running and you have permissions.")
             return
+        cache.save()
+        if DEBUG and cache.enabled:
+            print(f"Conversion cache: {cache.stats()}")
 
-        if not tasks:
-            print("No tasks found.")
+        if writer is not None:
+            instrumentation.count("paste.bytes", writer.bytes)
+            report_written(writer)
             return
-
-        tana_nodes = []
-        for task in tasks:
-            # Filter out projects if they appear in the list (things3-api might return them)
-            if task.get('type') == 'project':
-                continue
-            tana_nodes.append(convert_task_to_node(task))
-
-        tana_paste_text = to_tana_paste(tana_nodes)
+        instrumentation.count("paste.bytes", len(tana_paste_text.encode("utf-8")))
 
         try:
-            pyperclip.copy(tana_paste_text)
+            import pyperclip
+            with instrumentation.span("clipboard.copy"):
+                pyperclip.copy(tana_paste_text)
             print("Successfully copied Tana Paste format to clipboard!")
             print("Go to Tana and paste (Cmd+V).")
         except Exception as e:
@@ -144,6 +323,5 @@ def main():
             print("Here is the output:\n")
             print(tana_paste_text)
 
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,180 @@
+import bisect
+import hashlib
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Optional, Tuple
+from storage import atomic_write_bytes
+
+MAGIC = b"TTTIDX1\0"
+HEADER = struct.Struct("<8sI4x")
+KEY_SIZE = 16
+
+
+def uuid_key(task_id: str) -> bytes:
+    """
+    Returns the fixed 16-byte key stored for a task ID.
+
+    Things IDs are 22-character base62 strings rather than RFC 4122 UUIDs, so
+    they can't be packed losslessly into 16 bytes; a 128-bit BLAKE2b digest is
+    used instead (collision odds at a million IDs are around 2**-88).
+    """
+    return hashlib.blake2b(task_id.encode('utf-8'), digest_size=KEY_SIZE).digest()
+
+
+class _Records:
+    """
+    Read-only sequence view over the sorted fixed-size records of a mapped file,
+    so the bisect module can search it without copying.
+    """
+
+    def __init__(self, buffer, count: int, record_size: int = KEY_SIZE):
+        self._buffer = buffer
+        self._count = count
+        self._record_size = record_size
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def record_size(self) -> int:
+        return self._record_size
+
+    def __getitem__(self, index: int) -> bytes:
+        start = HEADER.size + index * self._record_size
+        return self._buffer[start:start + KEY_SIZE]
+
+    def value(self, index: int) -> bytes:
+        start = HEADER.size + index * self._record_size
+        return self._buffer[start + KEY_SIZE:start + self._record_size]
+
+
+class UUIDIndex:
+    """
+    Compact on-disk set of task IDs, optionally mapping each to a small value.
+
+    Keys are 16-byte digests kept sorted in a flat file behind a small header,
+    each followed by `value_size` bytes (all zero until a value is set).
+    The file is mmap'd, so opening it costs the same at a thousand or a
+    million entries and only the pages touched by bisect become resident.
+    New keys and values are held in memory until commit(), which merges them
+    in a single pass and atomically replaces the file. A file written with
+    another value size is read as is and rewritten in this one on commit.
+    """
+
+    def __init__(self, file_path: str, value_size: int = 0):
+        self.file_path = file_path
+        self.value_size = value_size
+        self._empty = bytes(value_size)
+        self._pending: Dict[bytes, bytes] = {}
+        self._mm: Optional[mmap.mmap] = None
+        self._records = _Records(b"", 0)
+        self._open()
+
+    def _open(self):
+        if not os.path.exists(self.file_path):
+            return
+        with open(self.file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= HEADER.size:
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, record_size = HEADER.unpack_from(mm)
+        if magic != MAGIC or record_size < KEY_SIZE or (size - HEADER.size) % record_size:
+            mm.close()
+            raise ValueError(f"{self.file_path} is not a valid UUID index")
+        self._mm = mm
+        self._records = _Records(mm, (size - HEADER.size) // record_size, record_size)
+
+    def _find(self, key: bytes) -> Optional[int]:
+        records = self._records
+        position = bisect.bisect_left(records, key)
+        if position < len(records) and records[position] == key:
+            return position
+        return None
+
+    def _stored(self, key: bytes) -> bool:
+        return self._find(key) is not None
+
+    def _value(self, position: int) -> bytes:
+        return self._records.value(position)[:self.value_size].ljust(self.value_size, b"\0")
+
+    def __contains__(self, task_id: str) -> bool:
+        key = uuid_key(task_id)
+        return key in self._pending or self._stored(key)
+
+    def __len__(self) -> int:
+        return len(self._records) + sum(1 for key in self._pending if not self._stored(key))
+
+    def get(self, task_id: str) -> Optional[bytes]:
+        """
+        Returns the value stored for a task ID (zero bytes if none was set),
+        or None if the ID is not in the index.
+        """
+        key = uuid_key(task_id)
+        if key in self._pending:
+            return self._pending[key]
+        position = self._find(key)
+        return None if position is None else self._value(position)
+
+    def add_many(self, task_ids: Iterable[str]):
+        for task_id in task_ids:
+            key = uuid_key(task_id)
+            if key not in self._pending and not self._stored(key):
+                self._pending[key] = self._empty
+
+    def set_many(self, items: Iterable[Tuple[str, bytes]]):
+        """
+        Adds task IDs with their values, replacing the values of stored IDs.
+        """
+        for task_id, value in items:
+            if len(value) != self.value_size:
+                raise ValueError(f"Expected a {self.value_size}-byte value, got {len(value)}")
+            key = uuid_key(task_id)
+            position = self._find(key)
+            if position is None or self._value(position) != value:
+                self._pending[key] = value
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._pending)
+
+    def commit(self):
+        """
+        Merges pending keys into the sorted file and atomically replaces it.
+        Existing records are copied as contiguous slices between insertion
+        points; a stored key with a new value is replaced in place.
+        """
+        if not self._pending:
+            return
+        records = self._records
+        parts = [HEADER.pack(MAGIC, KEY_SIZE + self.value_size)]
+        previous = 0
+        for key in sorted(self._pending):
+            position = bisect.bisect_left(records, key)
+            if position > previous:
+                parts.append(self._slice(previous, position))
+            parts.append(key + self._pending[key])
+            previous = position
+            if position < len(records) and records[position] == key:
+                previous += 1
+        if previous < len(records):
+            parts.append(self._slice(previous, len(records)))
+
+        atomic_write_bytes(self.file_path, b"".join(parts))
+        self.close()
+        self._pending.clear()
+        self._open()
+
+    def _slice(self, start: int, stop: int) -> bytes:
+        record_size = self._records.record_size
+        if record_size == KEY_SIZE + self.value_size:
+            return self._mm[HEADER.size + start * record_size:HEADER.size + stop * record_size]
+        # Written with another value size: repack record by record
+        return b"".join(self._records[i] + self._value(i) for i in range(start, stop))
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._records = _Records(b"", 0)
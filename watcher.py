@@ -0,0 +1,199 @@
+import ctypes
+import ctypes.util
+import datetime
+import os
+import select
+import struct
+import time
+from typing import Dict, Optional, Tuple
+from config import WATCH_DEBOUNCE
+from things_database import default_database_path
+
+# Upper bound on how long a steady stream of writes can postpone a sync
+DEFAULT_MAX_DELAY = 2.0
+# How often the polling fallback stats the database files
+DEFAULT_POLL_INTERVAL = 0.5
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _database_files(db_path: str) -> Tuple[str, ...]:
+    # Writes land in the WAL first and in main.sqlite at checkpoints. The -shm
+    # file is left out: readers (including us) touch it.
+    return (db_path, db_path + "-wal")
+
+
+class _InotifyBackend:
+    """
+    Linux inotify through ctypes, watching the database's directory so the WAL
+    being created, truncated or replaced is seen too.
+    """
+    name = "inotify"
+
+    def __init__(self, db_path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(db_path))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+        self.names = {os.fsencode(os.path.basename(path)) for path in _database_files(db_path)}
+
+    def poll(self, timeout: Optional[float]) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return False
+            if self._drain():
+                return True
+
+    def _drain(self) -> bool:
+        changed = False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name in self.names:
+                changed = True
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingBackend:
+    """
+    Portable fallback (e.g. macOS): compares the files' stat signatures.
+    """
+    name = "polling"
+
+    def __init__(self, db_path: str, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.paths = _database_files(db_path)
+        self.poll_interval = poll_interval
+        self.signature = self._signature()
+
+    def _signature(self) -> Dict[str, Optional[Tuple[int, int, int]]]:
+        signature = {}
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                signature[path] = (st.st_ino, st.st_size, st.st_mtime_ns)
+            except FileNotFoundError:
+                signature[path] = None
+        return signature
+
+    def poll(self, timeout: Optional[float]) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            signature = self._signature()
+            if signature != self.signature:
+                self.signature = signature
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+
+    def close(self):
+        pass
+
+
+class ThingsWatcher:
+    """
+    Waits for writes to the Things database (main.sqlite or its WAL) and
+    debounces bursts of them into a single wake-up.
+
+    Uses inotify where available and falls back to polling file stats.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        debounce: float = WATCH_DEBOUNCE,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        polling: bool = False,
+    ):
+        self.db_path = db_path
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.backend = None
+        if not polling:
+            try:
+                self.backend = _InotifyBackend(db_path)
+            except (OSError, AttributeError):
+                # No inotify on this platform (AttributeError: libc lacks the symbols)
+                pass
+        if self.backend is None:
+            self.backend = _PollingBackend(db_path, poll_interval)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until the database changes and then stays quiet for `debounce`
+        seconds (or `max_delay` passes). Returns False if nothing changed
+        within `timeout` seconds.
+        """
+        if not self.backend.poll(timeout):
+            return False
+        deadline = time.monotonic() + self.max_delay
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.backend.poll(min(self.debounce, remaining)):
+                return True
+
+    def close(self):
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _seconds_until_midnight() -> float:
+    now = datetime.datetime.now()
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return (midnight - now).total_seconds()
+
+
+def watched_database_path(service) -> str:
+    return getattr(service.things_provider, "db_path", None) or default_database_path()
+
+
+def watch(service, watcher: ThingsWatcher, max_syncs: Optional[int] = None):
+    """
+    Keeps one SyncService (history, watermarks, HTTP session) warm and syncs
+    Inbox and Today after every change to the Things database. The watermarks
+    make each run fetch only the delta. Also syncs at midnight, when Today
+    changes without any write. max_syncs stops the loop (for tests).
+    """
+    syncs = 0
+    while True:
+        try:
+            service.sync_scopes(["inbox", "today"])
+        except Exception as e:
+            # Keep watching: the next change gets another attempt
+            print(f"Error during sync: {e}")
+        syncs += 1
+        if max_syncs is not None and syncs >= max_syncs:
+            return
+        watcher.wait(timeout=_seconds_until_midnight())